@@ -1,11 +1,12 @@
 import json
 import sys
 import uuid
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional
 
-from .constants import CONFIG_FILENAME
+from .constants import CONFIG_FILENAME, MAX_SCAN_DEPTH
+from .rules import DEFAULT_RULE_TYPE, normalize_rule_type
 from .utils import now_iso
 
 
@@ -23,6 +24,40 @@ def config_path() -> Path:
     return app_base_dir() / CONFIG_FILENAME
 
 
+@dataclass
+class FilterSettings:
+    """
+    事前フィルタ（全体設定 / 監視対象ごと）。空は「指定なし」。
+    サイズは 0 = 制限なし、None = 全体設定に従う（監視対象ごとの設定で 0 を指定すると全体のサイズ条件を外せる）。
+    """
+    allow_exts: List[str] = field(default_factory=list)
+    deny_exts: List[str] = field(default_factory=list)
+    ignore_globs: List[str] = field(default_factory=list)
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+
+
+def _load_log_levels(d) -> Dict[str, str]:
+    if not isinstance(d, dict):
+        return {}
+    return {str(k): str(v).upper() for k, v in d.items() if v}
+
+
+def _load_filters(d) -> FilterSettings:
+    d = d or {}
+    return FilterSettings(
+        allow_exts=[str(x) for x in (d.get("allow_exts") or []) if str(x).strip()],
+        deny_exts=[str(x) for x in (d.get("deny_exts") or []) if str(x).strip()],
+        ignore_globs=[str(x) for x in (d.get("ignore_globs") or []) if str(x).strip()],
+        min_size=_load_size(d.get("min_size")),
+        max_size=_load_size(d.get("max_size")),
+    )
+
+
+def _load_size(v) -> Optional[int]:
+    return None if v is None else max(0, int(v))
+
+
 @dataclass
 class WatchItem:
     id: str
@@ -32,6 +67,15 @@ class WatchItem:
     is_deleted: bool = False
     created_at: str = ""
     updated_at: str = ""
+    rule_type: str = DEFAULT_RULE_TYPE
+    # サブフォルダ監視（既定はVBA互換でフォルダ直下のみ）
+    recursive: bool = False
+    max_depth: int = 1
+    exclude_globs: List[str] = field(default_factory=list)
+    # 監視対象ごとの事前フィルタ（全体設定と合成される）
+    filters: FilterSettings = field(default_factory=FilterSettings)
+    # ピン留め：走査予算のあるサイクルで、最近ヒットのあったフォルダより先に走査する
+    pinned: bool = False
 
     def touch(self) -> None:
         self.updated_at = now_iso()
@@ -44,6 +88,40 @@ class AppSettings:
     popup_seconds: int = 60
     last_browse_dir: str = ""
     notify_folder_access_error: bool = True
+    filters: FilterSettings = field(default_factory=FilterSettings)
+    # プロファイル（WATCHER_PROFILE=N でも有効化できる）
+    profile_enabled: bool = False
+    profile_cycles: int = 3
+    profile_tk_threshold_ms: int = 200
+    # メモリ監視（起動直後からの RSS 増加が予算を超えたら警告）
+    memory_budget_mb: int = 100
+    memory_sample_minutes: int = 10
+    memory_tracemalloc: bool = False
+    # スキャンハブ（"host:port"。空欄ならこのPCで直接監視する）
+    hub_address: str = ""
+    hub_token: str = ""
+    # 通知履歴（最終検出からこの日数を過ぎた行は削除する）
+    history_retention_days: int = 365
+    # ディレクトリ一覧の I/O 予算（0 は無制限）。分散は周期の走査を間隔全体に均す
+    io_listings_per_second: float = 0.0
+    io_concurrent_per_share: int = 0
+    io_spread_cycles: bool = False
+    # 周期走査の時刻：ホストごとの位相で間隔全体にばらす / 揺らぎ(%) / 初回の遅延上限(秒、0 は即時)。
+    # 既定はどれも無効（従来通り、走査の終了から間隔後）
+    scan_phase_spread: bool = False
+    scan_jitter_percent: float = 0.0
+    scan_initial_delay_seconds: int = 0
+    # Prometheus 形式のメトリクスを http://127.0.0.1:このポート/metrics で公開する（0 は無効、起動時に反映）
+    metrics_port: int = 0
+    # ログ（設定ファイルの隣の watch_log.jsonl）。全体のレベルと、サブシステムごとの上書き {"monitor": "DEBUG"}
+    log_level: str = "INFO"
+    log_levels: Dict[str, str] = field(default_factory=dict)
+    # 走査を別プロセスで行う（止まった共有で監視スレッドごと固まらない）。監視フォルダ1つの上限(秒、0 は無制限)。起動時に反映
+    scan_isolated: bool = False
+    scan_folder_timeout_seconds: int = 300
+    # 周期走査1回の時間予算(秒、0 は無制限)。超えたら残りのフォルダは次のサイクルで続きから走査する
+    scan_cycle_budget_seconds: int = 0
+
 
 @dataclass
 class AppConfig:
@@ -56,6 +134,57 @@ def default_config() -> AppConfig:
     return AppConfig(version=1, settings=AppSettings(), items=[])
 
 
+def settings_from_dict(s: dict) -> AppSettings:
+    s = s or {}
+    return AppSettings(
+        interval_seconds=int(s.get("interval_seconds", 900)),
+        popup_persistent=bool(s.get("popup_persistent", True)),
+        popup_seconds=int(s.get("popup_seconds", 60)),
+        last_browse_dir=str(s.get("last_browse_dir", "") or ""),
+        notify_folder_access_error=bool(s.get("notify_folder_access_error", True)),
+        filters=_load_filters(s.get("filters")),
+        profile_enabled=bool(s.get("profile_enabled", False)),
+        profile_cycles=max(1, int(s.get("profile_cycles", 3))),
+        profile_tk_threshold_ms=max(1, int(s.get("profile_tk_threshold_ms", 200))),
+        memory_budget_mb=max(1, int(s.get("memory_budget_mb", 100))),
+        memory_sample_minutes=max(1, int(s.get("memory_sample_minutes", 10))),
+        memory_tracemalloc=bool(s.get("memory_tracemalloc", False)),
+        hub_address=str(s.get("hub_address", "") or "").strip(),
+        hub_token=str(s.get("hub_token", "") or ""),
+        history_retention_days=max(1, int(s.get("history_retention_days", 365))),
+        io_listings_per_second=max(0.0, float(s.get("io_listings_per_second", 0.0))),
+        io_concurrent_per_share=max(0, int(s.get("io_concurrent_per_share", 0))),
+        io_spread_cycles=bool(s.get("io_spread_cycles", False)),
+        scan_phase_spread=bool(s.get("scan_phase_spread", False)),
+        scan_jitter_percent=min(50.0, max(0.0, float(s.get("scan_jitter_percent", 0.0)))),
+        scan_initial_delay_seconds=max(0, int(s.get("scan_initial_delay_seconds", 0))),
+        metrics_port=min(65535, max(0, int(s.get("metrics_port", 0)))),
+        log_level=str(s.get("log_level", "INFO") or "INFO").upper(),
+        log_levels=_load_log_levels(s.get("log_levels")),
+        scan_isolated=bool(s.get("scan_isolated", False)),
+        scan_folder_timeout_seconds=max(0, int(s.get("scan_folder_timeout_seconds", 300))),
+        scan_cycle_budget_seconds=max(0, int(s.get("scan_cycle_budget_seconds", 0))),
+    )
+
+
+def item_from_dict(it: dict) -> WatchItem:
+    return WatchItem(
+        id=str(it.get("id") or uuid.uuid4()),
+        code=str(it.get("code") or "000"),
+        folder=str(it.get("folder") or ""),
+        is_active=bool(it.get("is_active", True)),
+        is_deleted=bool(it.get("is_deleted", False)),
+        created_at=str(it.get("created_at") or ""),
+        updated_at=str(it.get("updated_at") or ""),
+        rule_type=normalize_rule_type(it.get("rule_type")),
+        recursive=bool(it.get("recursive", False)),
+        max_depth=min(MAX_SCAN_DEPTH, max(1, int(it.get("max_depth", 1)))),
+        exclude_globs=[str(g) for g in (it.get("exclude_globs") or []) if str(g).strip()],
+        filters=_load_filters(it.get("filters")),
+        pinned=bool(it.get("pinned", False)),
+    )
+
+
 def load_config() -> AppConfig:
     p = config_path()
     if not p.exists():
@@ -66,28 +195,12 @@ def load_config() -> AppConfig:
     except Exception:
         return default_config()
 
-    s = data.get("settings", {}) or {}
-    settings = AppSettings(
-        interval_seconds=int(s.get("interval_seconds", 900)),
-        popup_persistent=bool(s.get("popup_persistent", True)),
-        popup_seconds=int(s.get("popup_seconds", 60)),
-        last_browse_dir=str(s.get("last_browse_dir", "") or ""),
-    )
+    settings = settings_from_dict(data.get("settings", {}) or {})
 
     items: List[WatchItem] = []
     for it in (data.get("items", []) or []):
         try:
-            items.append(
-                WatchItem(
-                    id=str(it.get("id") or uuid.uuid4()),
-                    code=str(it.get("code") or "000"),
-                    folder=str(it.get("folder") or ""),
-                    is_active=bool(it.get("is_active", True)),
-                    is_deleted=bool(it.get("is_deleted", False)),
-                    created_at=str(it.get("created_at") or ""),
-                    updated_at=str(it.get("updated_at") or ""),
-                )
-            )
+            items.append(item_from_dict(it))
         except Exception:
             continue
 
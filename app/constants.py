@@ -6,3 +6,6 @@ STABLE_WAIT_SECONDS = 2
 
 # 追加：スタートアップ登録名（レジストリの値名）
 STARTUP_ENTRY_NAME = "TantoCodeWatcher"
+
+# サブフォルダ監視の最大階層（設定値の上限）
+MAX_SCAN_DEPTH = 10
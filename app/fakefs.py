@@ -0,0 +1,228 @@
+import dataclasses
+import errno
+import os
+import random
+import re
+import stat
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Type
+
+from .fsio import FileSystem
+
+
+class FakeStat(NamedTuple):
+    st_mode: int
+    st_size: int
+    st_mtime: float
+    st_mtime_ns: int
+
+
+@dataclass(frozen=True)
+class FakeFolder:
+    """
+    偽のフォルダ1つ分の形と振る舞い。ファイルは名前を生成するだけで保持しないので、数百万件でもメモリを食わない。
+      - files / hit_every / codes : ファイル数と、そのうち hit_every 件に1件を「コード_docNNNNNNN.txt」にする
+      - subdirs / depth / sub_files : サブフォルダを subdirs 個ずつ depth 階層まで作り、各サブフォルダに sub_files 件
+      - latency / jitter     : 一覧1回あたりの遅延（秒）と、その揺らぎ（±秒）
+      - stat_latency         : stat 1回あたりの遅延（秒）
+      - fail_rate / error    : 一覧がこの確率で error（PermissionError / OSError など）になる
+      - hang_rate / hang_seconds : 一覧がこの確率で hang_seconds だけ止まる（応答しない共有の再現）
+    """
+
+    files: int = 0
+    hit_every: int = 0
+    codes: Tuple[str, ...] = ("123",)
+    subdirs: int = 0
+    depth: int = 0
+    sub_files: int = 0
+    latency: float = 0.0
+    jitter: float = 0.0
+    stat_latency: float = 0.0
+    fail_rate: float = 0.0
+    error: Type[OSError] = PermissionError
+    hang_rate: float = 0.0
+    hang_seconds: float = 30.0
+
+
+# 生成したファイル名から番号を取り出す（stat の答えを作るため）
+_VIRTUAL_NAME = re.compile(r"^(?:\w+_doc|file)(\d{7})\.(?:txt|dat)$")
+
+
+class _Dir:
+    __slots__ = ("spec", "mtime_ns", "created_ns", "subdirs", "extra", "removed")
+
+    def __init__(self, spec: FakeFolder, mtime_ns: int):
+        self.spec = spec
+        self.mtime_ns = mtime_ns
+        self.created_ns = mtime_ns  # 生成ファイルの更新日時
+        self.subdirs: List[str] = []
+        self.extra: Dict[str, FakeStat] = {}  # 後から追加したファイル
+        self.removed: set = set()  # 消した生成ファイル
+
+    def virtual_name(self, i: int) -> str:
+        spec = self.spec
+        if spec.hit_every and i % spec.hit_every == 0:
+            return f"{spec.codes[(i // spec.hit_every) % len(spec.codes)]}_doc{i:07d}.txt"
+        return f"file{i:07d}.dat"
+
+
+class _FakeEntry:
+    __slots__ = ("name", "path", "_is_dir", "_stat")
+
+    def __init__(self, path: str, name: str, is_dir: bool, st: FakeStat):
+        self.path = path
+        self.name = name
+        self._is_dir = is_dir
+        self._stat = st
+
+    def is_dir(self, follow_symlinks: bool = True) -> bool:
+        return self._is_dir
+
+    def is_file(self, follow_symlinks: bool = True) -> bool:
+        return not self._is_dir
+
+    def is_symlink(self) -> bool:
+        return False
+
+    def stat(self, follow_symlinks: bool = True) -> FakeStat:
+        # Windows の DirEntry と同じく、一覧時の情報を返す（追加の遅延なし）
+        return self._stat
+
+
+class FakeFileSystem(FileSystem):
+    """
+    負荷試験用のファイルシステム。add_tree() で作ったフォルダだけが存在する。
+    遅延・揺らぎ・エラー・ハングはフォルダごとに FakeFolder で指定し、走行中に set_behavior() で変えられる。
+    add_file() / remove_file() はフォルダ更新日時も進める（実物と同じく、枝刈りキャッシュが効かなくなる）。
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self._lock = threading.Lock()
+        self._dirs: Dict[str, _Dir] = {}
+        self._rng = random.Random(seed)
+        # 一覧 / stat の回数（試験の集計用）
+        self.listings = 0
+        self.stats = 0
+
+    # ---- 組み立て ----
+    def add_tree(self, root: str, spec: FakeFolder, mtime: Optional[float] = None) -> int:
+        """root 以下を spec の形で作る。作ったフォルダ数を返す。"""
+        # 既定は1時間前（一覧時刻との差が十分あるので、キャッシュが最初から信用される）
+        mtime_ns = int((time.time() - 3600 if mtime is None else mtime) * 1e9)
+        count = 0
+        stack = [(os.path.normpath(root), spec)]
+        with self._lock:
+            while stack:
+                path, sp = stack.pop()
+                d = _Dir(sp, mtime_ns)
+                self._dirs[path] = d
+                count += 1
+                if sp.depth > 0:
+                    child = dataclasses.replace(sp, files=sp.sub_files, depth=sp.depth - 1)
+                    for j in range(sp.subdirs):
+                        name = f"sub{j:03d}"
+                        d.subdirs.append(name)
+                        stack.append((os.path.join(path, name), child))
+        return count
+
+    def add_file(self, folder: str, name: str, size: int = 1) -> None:
+        now = time.time()
+        with self._lock:
+            d = self._dirs[os.path.normpath(folder)]
+            d.extra[name] = FakeStat(stat.S_IFREG, size, now, int(now * 1e9))
+            d.removed.discard(name)
+            d.mtime_ns = time.time_ns()
+
+    def remove_file(self, folder: str, name: str) -> None:
+        with self._lock:
+            d = self._dirs[os.path.normpath(folder)]
+            if d.extra.pop(name, None) is None:
+                d.removed.add(name)
+            d.mtime_ns = time.time_ns()
+
+    def set_behavior(self, folder: str, **changes) -> None:
+        """遅延やエラーを走行中に変える（例：set_behavior(root, fail_rate=1.0, error=OSError)）"""
+        with self._lock:
+            d = self._dirs[os.path.normpath(folder)]
+            d.spec = dataclasses.replace(d.spec, **changes)
+
+    def folders(self) -> List[str]:
+        with self._lock:
+            return list(self._dirs)
+
+    # ---- FileSystem ----
+    def is_dir(self, path: str) -> bool:
+        return os.path.normpath(path) in self._dirs
+
+    def stat(self, path: str) -> FakeStat:
+        path = os.path.normpath(path)
+        with self._lock:
+            self.stats += 1
+            d = self._dirs.get(path)
+            if d is not None:
+                delay = d.spec.stat_latency
+                st = FakeStat(stat.S_IFDIR, 0, d.mtime_ns / 1e9, d.mtime_ns)
+            else:
+                parent = self._dirs.get(os.path.dirname(path))
+                if parent is None:
+                    raise FileNotFoundError(errno.ENOENT, "No such file or directory", path)
+                delay = parent.spec.stat_latency
+                st = self._file_stat(parent, os.path.basename(path))
+        if delay:
+            time.sleep(delay)
+        if st is None:
+            raise FileNotFoundError(errno.ENOENT, "No such file or directory", path)
+        return st
+
+    @contextmanager
+    def scandir(self, path: str) -> Iterator[Iterator[_FakeEntry]]:
+        path = os.path.normpath(path)
+        with self._lock:
+            self.listings += 1
+            d = self._dirs.get(path)
+            if d is None:
+                raise FileNotFoundError(errno.ENOENT, "No such file or directory", path)
+            spec = d.spec
+            r_fail, r_hang, r_jitter = self._rng.random(), self._rng.random(), self._rng.uniform(-1.0, 1.0)
+            subdirs = [(name, self._dirs.get(os.path.join(path, name))) for name in d.subdirs]
+            extra = dict(d.extra)
+            removed = set(d.removed)
+        if spec.hang_rate and r_hang < spec.hang_rate:
+            time.sleep(spec.hang_seconds)
+        delay = spec.latency + spec.jitter * r_jitter
+        if delay > 0:
+            time.sleep(delay)
+        if spec.fail_rate and r_fail < spec.fail_rate:
+            raise spec.error(errno.EACCES if spec.error is PermissionError else errno.EIO, "injected failure", path)
+        yield self._entries(d, path, subdirs, extra, removed)
+
+    def _entries(
+        self, d: _Dir, path: str, subdirs: List[Tuple[str, Optional[_Dir]]], extra: Dict[str, FakeStat], removed: set
+    ) -> Iterator[_FakeEntry]:
+        for name, sub in subdirs:
+            if sub is not None:
+                yield _FakeEntry(os.path.join(path, name), name, True, FakeStat(stat.S_IFDIR, 0, sub.mtime_ns / 1e9, sub.mtime_ns))
+        base = d.created_ns
+        for i in range(d.spec.files):
+            name = d.virtual_name(i)
+            if removed and name in removed:
+                continue
+            yield _FakeEntry(os.path.join(path, name), name, False, FakeStat(stat.S_IFREG, 1000 + i % 5000, base / 1e9, base))
+        for name, st in extra.items():
+            yield _FakeEntry(os.path.join(path, name), name, False, st)
+
+    def _file_stat(self, d: _Dir, name: str) -> Optional[FakeStat]:
+        if name in d.extra:
+            return d.extra[name]
+        if name in d.removed:
+            return None
+        m = _VIRTUAL_NAME.match(name)
+        if m is None:
+            return None
+        i = int(m.group(1))
+        if i >= d.spec.files or d.virtual_name(i) != name:
+            return None
+        return FakeStat(stat.S_IFREG, 1000 + i % 5000, d.created_ns / 1e9, d.created_ns)
@@ -0,0 +1,112 @@
+import fnmatch
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+
+from .config import FilterSettings
+
+
+@dataclass(frozen=True)
+class FilterSpec:
+    """
+    全体設定と監視対象ごとの設定を合成した、走査用のフィルタ定義（ハッシュ可能）。
+    拡張子は小文字・先頭ドット付きに正規化済み。
+    """
+
+    allow_exts: Tuple[str, ...] = ()
+    deny_exts: Tuple[str, ...] = ()
+    ignore_globs: Tuple[str, ...] = ()
+    min_size: int = 0  # 0 = 下限なし
+    max_size: int = 0  # 0 = 上限なし
+
+    @property
+    def needs_stat(self) -> bool:
+        return self.min_size > 0 or self.max_size > 0
+
+
+def _norm_exts(exts: List[str]) -> Tuple[str, ...]:
+    out = set()
+    for e in exts:
+        e = (e or "").strip().lower()
+        if not e:
+            continue
+        out.add(e if e.startswith(".") else "." + e)
+    return tuple(sorted(out))
+
+
+def build_filter_spec(global_settings: FilterSettings, item_settings: Optional[FilterSettings] = None) -> FilterSpec:
+    """
+    合成ルール：
+      - 許可拡張子：監視対象側に指定があればそれ、なければ全体設定
+      - 拒否拡張子・無視パターン：両方の和
+      - サイズ上下限：監視対象側が None 以外ならそれ（0 = 制限なし）、None なら全体設定
+    """
+    g = global_settings
+    i = item_settings or FilterSettings()
+    return FilterSpec(
+        allow_exts=_norm_exts(i.allow_exts or g.allow_exts),
+        deny_exts=_norm_exts(list(g.deny_exts) + list(i.deny_exts)),
+        ignore_globs=tuple(sorted({p.strip() for p in list(g.ignore_globs) + list(i.ignore_globs) if p.strip()})),
+        min_size=_pick_size(i.min_size, g.min_size),
+        max_size=_pick_size(i.max_size, g.max_size),
+    )
+
+
+def _pick_size(item_value: Optional[int], global_value: Optional[int]) -> int:
+    v = item_value if item_value is not None else global_value
+    return max(0, int(v or 0))
+
+
+class EntryFilter:
+    """
+    FilterSpec をコンパイルした述語チェーン。
+      - accept_name  : 名前だけで判定できるもの（拡張子 → 無視パターンの順、安い順）
+      - accept_size  : サイズ判定。accept_name を通過したエントリにだけ使う
+    """
+
+    __slots__ = ("spec", "_name_checks", "needs_stat")
+
+    def __init__(self, spec: FilterSpec):
+        self.spec = spec
+        self.needs_stat = spec.needs_stat
+        checks: List[Callable[[str], bool]] = []
+
+        if spec.allow_exts or spec.deny_exts:
+            allow = frozenset(spec.allow_exts)
+            deny = frozenset(spec.deny_exts)
+
+            def ext_ok(name: str) -> bool:
+                ext = os.path.splitext(name)[1].lower()
+                if ext in deny:
+                    return False
+                return not allow or ext in allow
+
+            checks.append(ext_ok)
+
+        if spec.ignore_globs:
+            # 全パターンを1本の正規表現にまとめる（大文字小文字は区別しない）
+            rx = re.compile("|".join(fnmatch.translate(p) for p in spec.ignore_globs), re.IGNORECASE)
+            checks.append(lambda name: rx.match(name) is None)
+
+        self._name_checks = tuple(checks)
+
+    def accept_name(self, name: str) -> bool:
+        for check in self._name_checks:
+            if not check(name):
+                return False
+        return True
+
+    def accept_size(self, size: int) -> bool:
+        spec = self.spec
+        if spec.min_size and size < spec.min_size:
+            return False
+        if spec.max_size and size > spec.max_size:
+            return False
+        return True
+
+
+@lru_cache(maxsize=256)
+def compile_filter(spec: FilterSpec) -> EntryFilter:
+    return EntryFilter(spec)
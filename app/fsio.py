@@ -0,0 +1,44 @@
+import os
+import time
+from typing import ContextManager, Iterator
+
+from .utils import is_valid_dir
+
+
+class FileSystem:
+    """
+    走査エンジンが使うファイルシステム操作（一覧と stat だけ）。
+    実運用は OsFileSystem。負荷試験や再現には同じ形の偽物（fakefs.FakeFileSystem など）を差し込む。
+
+    scandir() の要素は os.DirEntry と同じく name / is_dir() / is_symlink() / stat(follow_symlinks=...) を持つこと。
+    stat() の戻り値は st_mode / st_size / st_mtime / st_mtime_ns を持つこと。
+    失敗は実物と同じ例外（FileNotFoundError / PermissionError / OSError）で知らせる。
+    time_ns() は一覧した時刻（枝刈りで更新日時と比べる）。トレースの再生では記録時の時刻を返す。
+    """
+
+    def time_ns(self) -> int:
+        return time.time_ns()
+
+    def stat(self, path: str) -> os.stat_result:
+        raise NotImplementedError
+
+    def scandir(self, path: str) -> ContextManager[Iterator[os.DirEntry]]:
+        raise NotImplementedError
+
+    def is_dir(self, path: str) -> bool:
+        """監視対象として有効なフォルダか（例外は出さない）"""
+        raise NotImplementedError
+
+
+class OsFileSystem(FileSystem):
+    def stat(self, path: str) -> os.stat_result:
+        return os.stat(path)
+
+    def scandir(self, path: str) -> ContextManager[Iterator[os.DirEntry]]:
+        return os.scandir(path)
+
+    def is_dir(self, path: str) -> bool:
+        return is_valid_dir(path)
+
+
+LOCAL_FS = OsFileSystem()
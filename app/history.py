@@ -0,0 +1,286 @@
+import heapq
+import sqlite3
+import time
+from collections import deque
+from itertools import islice
+from pathlib import Path
+from typing import Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from .logs import fields, get_logger
+
+_log = get_logger("history")
+
+HISTORY_FILENAME = "watch_history.sqlite3"
+
+# 画面の「最近の通知」に使う件数（メモリ上に保持するのはこれだけ）
+HISTORY_RECENT_ROWS = 1000
+
+# 検索結果の最大表示件数
+HISTORY_QUERY_LIMIT = 500
+
+# フォルダの前方一致をフォルダごとの完全一致に展開する上限（これを超えたら範囲条件で1回に検索する）
+HISTORY_PREFIX_FOLDERS_MAX = 200
+
+# 続けて検出しているファイルの最終検出・検出回数は、この間隔でまとめて書く（毎サイクル全件を UPDATE しない）
+HISTORY_SEEN_FLUSH_SECONDS = 600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id          INTEGER PRIMARY KEY,
+    folder      TEXT    NOT NULL,
+    file        TEXT    NOT NULL,
+    code        TEXT    NOT NULL,
+    first_seen  REAL    NOT NULL,
+    last_seen   REAL    NOT NULL,
+    seen_count  INTEGER NOT NULL DEFAULT 1,
+    UNIQUE (folder, file, code)
+);
+CREATE INDEX IF NOT EXISTS ix_history_first_seen ON history (first_seen);
+CREATE INDEX IF NOT EXISTS ix_history_code_first_seen ON history (code, first_seen);
+CREATE INDEX IF NOT EXISTS ix_history_folder_first_seen ON history (folder, first_seen);
+CREATE INDEX IF NOT EXISTS ix_history_last_seen ON history (last_seen);
+"""
+
+# (フォルダ, ファイル, コード)
+HistoryKey = Tuple[str, str, str]
+
+
+class HistoryEntry(NamedTuple):
+    folder: str
+    file: str
+    code: str
+    first_seen: float
+    last_seen: float
+    seen_count: int
+
+
+def iter_hit_keys(hits: Dict[str, List[str]], codes: Dict[str, Dict[str, List[str]]]) -> Iterable[HistoryKey]:
+    """scan_result の hits / codes から (フォルダ, ファイル, コード) を列挙する（codes が無い古い形式は空コード）"""
+    for folder, names in hits.items():
+        per_file = codes.get(folder) or {}
+        for name in names:
+            for code in per_file.get(name) or [""]:
+                yield folder, name, code
+
+
+class HistoryStore:
+    """
+    通知履歴。(フォルダ, ファイル, コード) ごとに初回検出・最終検出・検出回数を1行で持つ。
+      - 毎サイクル同じファイルが検出されても行は増えない（最終検出の更新だけ。HISTORY_SEEN_FLUSH_SECONDS ごとにまとめて書く）
+      - メモリ上には新規検出の直近 HISTORY_RECENT_ROWS 件だけを保持する
+      - 検索は索引つきの列（コード / フォルダ前方一致 / 初回検出日時）で行い、件数は HISTORY_QUERY_LIMIT で打ち切る
+    DB を開けない環境（読み取り専用フォルダ等）ではメモリ上の直近分だけで動く。
+    Tk スレッドからだけ使うこと。
+    """
+
+    def __init__(self, path: Path, retention_days: int = 365):
+        self.path = path
+        self.retention_days = max(1, int(retention_days))
+        self.recent: Deque[HistoryEntry] = deque(maxlen=HISTORY_RECENT_ROWS)
+        # 前回サイクルで検出済みのキー（今回も出ていれば UPDATE だけで済ませる）
+        self._previous: Set[HistoryKey] = set()
+        # まだ書いていない最終検出：キー -> (最終検出, 検出回数の増分)
+        self._pending_seen: Dict[HistoryKey, Tuple[float, int]] = {}
+        self._last_flush = 0.0
+        self._last_prune = 0.0
+        self._db: Optional[sqlite3.Connection] = None
+        try:
+            self._db = self._open(path)
+        except sqlite3.Error as e:
+            _log.warning("history_unavailable", extra=fields(path=str(path), error=str(e)))
+            self._db = None
+
+    @property
+    def available(self) -> bool:
+        return self._db is not None
+
+    @staticmethod
+    def _open(path: Path) -> sqlite3.Connection:
+        db = sqlite3.connect(str(path))
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(_SCHEMA)
+        return db
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._flush_seen(time.time())
+            try:
+                self._db.close()
+            except sqlite3.Error:
+                pass
+            self._db = None
+
+    # ---- 記録 ----
+    def record(self, keys: Iterable[HistoryKey], ts: Optional[float] = None) -> int:
+        """1サイクル分の検出を記録する。新規に記録した件数を返す。"""
+        ts = time.time() if ts is None else ts
+        current = set(keys)
+        fresh = [k for k in current if k not in self._previous]
+        seen = [k for k in current if k in self._previous]
+        self._previous = current
+
+        new_entries: List[HistoryEntry] = []
+        if self._db is None:
+            new_entries = [HistoryEntry(f, n, c, ts, ts, 1) for f, n, c in fresh]
+        else:
+            try:
+                with self._db:
+                    for f, n, c in fresh:
+                        cur = self._db.execute(
+                            "INSERT OR IGNORE INTO history (folder, file, code, first_seen, last_seen)"
+                            " VALUES (?, ?, ?, ?, ?)",
+                            (f, n, c, ts, ts),
+                        )
+                        if cur.rowcount == 1:
+                            # 初めて見たファイルだけ直近一覧に載せる
+                            new_entries.append(HistoryEntry(f, n, c, ts, ts, 1))
+                        else:
+                            # 前回サイクルには無かったが過去に記録済み（消えて戻った / 再起動後）
+                            seen.append((f, n, c))
+            except sqlite3.Error:
+                _log.exception("history_record_failed")
+                self._previous = set()
+                return 0
+            for key in seen:
+                count = self._pending_seen[key][1] if key in self._pending_seen else 0
+                self._pending_seen[key] = (ts, count + 1)
+            if ts - self._last_flush >= HISTORY_SEEN_FLUSH_SECONDS:
+                self._flush_seen(ts)
+            self._prune_if_due(ts)
+
+        for e in sorted(new_entries):
+            self.recent.append(e)
+        return len(new_entries)
+
+    def _flush_seen(self, now: float) -> None:
+        self._last_flush = now
+        if not self._pending_seen or self._db is None:
+            return
+        rows = [(ts, count, f, n, c) for (f, n, c), (ts, count) in self._pending_seen.items()]
+        self._pending_seen = {}
+        try:
+            with self._db:
+                self._db.executemany(
+                    "UPDATE history SET last_seen = ?, seen_count = seen_count + ?"
+                    " WHERE folder = ? AND file = ? AND code = ?",
+                    rows,
+                )
+        except sqlite3.Error:
+            _log.exception("history_record_failed")
+
+    def _prune_if_due(self, now: float) -> None:
+        # 保持期間を過ぎた行（最終検出が古いもの）を1日1回削除する
+        if now - self._last_prune < 86400:
+            return
+        self._last_prune = now
+        # 書いていない最終検出を先に反映する（続けて検出している行を消さないため）
+        self._flush_seen(now)
+        cutoff = now - self.retention_days * 86400
+        try:
+            with self._db:
+                self._db.execute("DELETE FROM history WHERE last_seen < ?", (cutoff,))
+        except sqlite3.Error:
+            _log.exception("history_prune_failed")
+
+    # ---- 検索 ----
+    def query(
+        self,
+        code: str = "",
+        folder: str = "",
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = HISTORY_QUERY_LIMIT,
+    ) -> List[HistoryEntry]:
+        """
+        初回検出の新しい順に返す。
+          code   : 完全一致（空なら条件なし）
+          folder : 前方一致（空なら条件なし）
+          since / until : 初回検出日時の範囲（until は含まない）
+        """
+        if self._db is None:
+            return self._query_recent(code, folder, since, until, limit)
+        self._flush_seen(time.time())
+
+        try:
+            if not folder:
+                return list(self._select(code, None, since, until, limit))
+            # 前方一致（範囲条件）では (folder, first_seen) の索引で並べ替えを省けず、一致した全行を並べ替える。
+            # 記録されるフォルダは監視フォルダなので種類は少ない：フォルダごとの完全一致で新しい順に limit 件ずつ取り、併合する
+            folders = self._folders_with_prefix(folder)
+            if folders is None:
+                return list(self._select(code, (folder, folder + "\U0010ffff"), since, until, limit))
+            # カーソルは必要な分だけ進むので、読む行は全体で limit 件程度
+            per_folder = [self._select(code, f, since, until, limit) for f in folders]
+            return list(islice(heapq.merge(*per_folder, key=lambda e: -e.first_seen), limit))
+        except sqlite3.Error:
+            _log.exception("history_query_failed")
+            return self._query_recent(code, folder, since, until, limit)
+
+    def _folders_with_prefix(self, prefix: str) -> Optional[List[str]]:
+        """prefix で始まるフォルダの一覧（索引を1回ずつ引いて次のフォルダへ進む）。多すぎれば None"""
+        out: List[str] = []
+        lower, upper = prefix, prefix + "\U0010ffff"
+        while True:
+            row = self._db.execute("SELECT MIN(folder) FROM history WHERE folder >= ? AND folder < ?", (lower, upper)).fetchone()
+            if row is None or row[0] is None:
+                return out
+            if len(out) >= HISTORY_PREFIX_FOLDERS_MAX:
+                return None
+            out.append(row[0])
+            # 次のフォルダ（この値より大きい最小の文字列）
+            lower = row[0] + "\x00"
+
+    def _select(self, code: str, folder, since: Optional[float], until: Optional[float], limit: int) -> Iterator[HistoryEntry]:
+        """folder は完全一致の文字列 / 範囲 (下限, 上限) / None（条件なし）"""
+        where: List[str] = []
+        params: List[object] = []
+        if code:
+            where.append("code = ?")
+            params.append(code)
+        if isinstance(folder, tuple):
+            # LIKE は索引が効かないので範囲比較で前方一致にする
+            where.append("folder >= ? AND folder < ?")
+            params.extend(folder)
+        elif folder is not None:
+            where.append("folder = ?")
+            params.append(folder)
+        if since is not None:
+            where.append("first_seen >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("first_seen < ?")
+            params.append(until)
+
+        sql = "SELECT folder, file, code, first_seen, last_seen, seen_count FROM history"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY first_seen DESC LIMIT ?"
+        params.append(int(limit))
+        return map(HistoryEntry._make, self._db.execute(sql, params))
+
+    def _query_recent(
+        self, code: str, folder: str, since: Optional[float], until: Optional[float], limit: int
+    ) -> List[HistoryEntry]:
+        out: List[HistoryEntry] = []
+        for e in reversed(self.recent):
+            if code and e.code != code:
+                continue
+            if folder and not e.folder.startswith(folder):
+                continue
+            if since is not None and e.first_seen < since:
+                continue
+            if until is not None and e.first_seen >= until:
+                continue
+            out.append(e)
+            if len(out) >= limit:
+                break
+        return out
+
+    def count(self) -> int:
+        if self._db is None:
+            return len(self.recent)
+        try:
+            return int(self._db.execute("SELECT COUNT(*) FROM history").fetchone()[0])
+        except sqlite3.Error:
+            return len(self.recent)
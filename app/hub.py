@@ -0,0 +1,578 @@
+from __future__ import annotations
+
+import ipaddress
+import json
+import queue
+import socket
+import threading
+import time
+from dataclasses import asdict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .config import AppConfig, AppSettings, WatchItem, item_from_dict, settings_from_dict
+from .iobudget import IO_BUDGET
+from .logs import fields, get_logger
+from .metrics import HITS, QUEUE_DEPTH, SCAN_CYCLE_SECONDS, SCAN_CYCLES, SCHEDULE_LAG_SECONDS, MetricsServer
+from .latency import LATENCY, STAGE_ENQUEUED
+from .monitor import (
+    AppearanceEstimator,
+    FirstSeen,
+    HitInfo,
+    RawHit,
+    ScanEngine,
+    ScanPlan,
+    UnitKey,
+    build_scan_plan,
+    collapse_appeared,
+    collapse_hit_codes,
+    collapse_hit_info,
+    collapse_hits,
+)
+
+_log = get_logger("hub")
+
+HUB_DEFAULT_HOST = "127.0.0.1"
+HUB_DEFAULT_PORT = 47810
+
+# ハブの最短サイクル（購読者の interval_seconds がこれより短くても守る）
+HUB_MIN_INTERVAL = 10
+
+_MAX_LINE = 16 * 1024 * 1024
+
+# 購読者ごとの送信待ちの上限。読まない購読者はこれを超えた時点で切断する（走査と他の購読者を止めない）
+_SEND_QUEUE_MAX = 4
+
+
+def parse_host_port(text: str, default_host: str = HUB_DEFAULT_HOST, default_port: int = HUB_DEFAULT_PORT) -> Tuple[str, int]:
+    s = (text or "").strip()
+    if not s:
+        return default_host, default_port
+    host, sep, port = s.rpartition(":")
+    if not sep:
+        return s, default_port
+    return (host or default_host), int(port)
+
+
+def is_loopback_host(host: str) -> bool:
+    """このPCからしか接続できない待ち受けアドレスか（空 = 全アドレスは False）"""
+    host = (host or "").strip().strip("[]")
+    if host.lower() == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class _LineConn:
+    """JSON 1行 = 1メッセージ の双方向接続（送信はロックで直列化）"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self._buf = b""
+        self._send_lock = threading.Lock()
+
+    def send(self, msg: dict) -> None:
+        data = json.dumps(msg, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self._send_lock:
+            self.sock.sendall(data)
+
+    def recv(self) -> Optional[dict]:
+        """1メッセージ受信。タイムアウトは socket.timeout を送出、切断は None。"""
+        while b"\n" not in self._buf:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                return None
+            self._buf += chunk
+            if len(self._buf) > _MAX_LINE:
+                raise ValueError("message too large")
+        line, self._buf = self._buf.split(b"\n", 1)
+        return json.loads(line.decode("utf-8"))
+
+    def close(self) -> None:
+        # 別スレッドで送受信中でも抜けるよう、先に shutdown する
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class _Subscriber:
+    """
+    購読者1つ。走査結果は送信待ち（上限つき）に積み、購読者ごとの送信スレッドが送る。
+    """
+
+    def __init__(self, sid: int, conn: _LineConn):
+        self.sid = sid
+        self.conn = conn
+        self.plan = ScanPlan()
+        self.interval = 900
+        self.next_due = 0.0
+        self._outbox: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=_SEND_QUEUE_MAX)
+        self._closed = False
+        threading.Thread(target=self._write_loop, daemon=True).start()
+
+    def post(self, msg: dict) -> bool:
+        """送信待ちに積む。前の結果を読まずに溜めている購読者なら False"""
+        if self._closed:
+            return False
+        try:
+            self._outbox.put_nowait(msg)
+        except queue.Full:
+            return False
+        return True
+
+    def close(self) -> None:
+        self._closed = True
+        self.conn.close()
+        try:
+            self._outbox.put_nowait(None)
+        except queue.Full:
+            pass  # 送信スレッドは送信中（shutdown で OSError になって抜ける）
+
+    def _write_loop(self) -> None:
+        while True:
+            msg = self._outbox.get()
+            if msg is None or self._closed:
+                return
+            try:
+                self.conn.send(msg)
+            except OSError as e:
+                _log.info("hub_send_failed", extra=fields(sid=self.sid, error=str(e)))
+                self.close()
+                return
+
+
+def _subscriber_results(
+    plan: ScanPlan,
+    unit_hits: Dict[UnitKey, List[RawHit]],
+    errors: Dict[str, str],
+    first_seen: FirstSeen,
+    appeared: Dict[str, Dict[str, float]],
+) -> dict:
+    """共有の走査結果から、購読者自身のルールに一致したものだけを取り出す（scan_result の中身）"""
+    own_hits: Dict[UnitKey, List[RawHit]] = {}
+    for ukey, rules in plan.units.items():
+        found = unit_hits.get(ukey)
+        if not found:
+            continue
+        mine = []
+        for hit in found:
+            own = tuple(r for r in hit.rules if r in rules)
+            if own:
+                mine.append(hit._replace(rules=own))
+        own_hits[ukey] = mine
+
+    return {
+        "hits": collapse_hits(plan, own_hits),
+        "errors": {plan.display(fkey): reason for fkey, reason in errors.items() if fkey in plan.folder_original},
+        "codes": collapse_hit_codes(plan, own_hits),
+        "info": collapse_hit_info(plan, own_hits, first_seen),
+        "appeared": collapse_appeared(plan, own_hits, appeared),
+    }
+
+
+class ScanHub:
+    """
+    スキャンハブ。複数クライアントの監視対象の和集合を1つのエンジンで走査し、
+    各クライアントには自分のルールに一致したヒットだけを返す。
+    同じフォルダ（同じ走査オプション）は購読者数に関係なく1サイクル1回だけ一覧する。
+
+    プロトコル（JSON 1行ずつ、1接続を使い続ける）
+      client -> hub : {"cmd": "subscribe", "token": "...", "items": [...], "settings": {...}}
+                      {"cmd": "run_once"}
+      hub -> client : {"type": "subscribed"} / {"type": "error", "error": "..."}
+                      {"type": "scan_result", "hits": {...}, "errors": {...}, "codes": {...}, "info": {...}, "appeared": {...}, "show_nohit": bool, "elapsed": 秒}
+    """
+
+    def __init__(
+        self,
+        host: str = HUB_DEFAULT_HOST,
+        port: int = HUB_DEFAULT_PORT,
+        token: str = "",
+        log: Callable[[str], None] = print,
+        io_listings_per_second: float = 0.0,
+        io_concurrent_per_share: int = 0,
+        metrics_port: int = 0,
+    ):
+        self.host = host
+        self.port = port
+        self.token = token
+        # ハブは購読者の設定ではなく起動オプションの I/O 予算に従う
+        IO_BUDGET.configure(io_listings_per_second, io_concurrent_per_share)
+        self._log = log
+        self._engine = ScanEngine()
+        self._first_seen = FirstSeen()
+        self._appearance = AppearanceEstimator()
+        self._lock = threading.Lock()
+        self._subs: Dict[int, _Subscriber] = {}
+        self._next_sid = 1
+        self._immediate: Set[int] = set()  # 即時結果を待っている購読者（購読直後 / run_once）
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._listener: Optional[socket.socket] = None
+        # 直近サイクルの統計（一覧したユニット数 / 購読者数）
+        self.last_cycle: Tuple[int, int] = (0, 0)
+        # Prometheus 形式のメトリクス（0 は無効）
+        self._metrics = MetricsServer(metrics_port) if metrics_port else None
+
+    # ---- lifecycle ----
+    def start(self) -> None:
+        # 合言葉なしでは、他のPCから任意のフォルダを一覧させられてしまう
+        if not self.token and not is_loopback_host(self.host):
+            raise ValueError(f"ループバック以外（{self.host}）で待ち受けるには合言葉（--hub-token）が必要です")
+        ls = socket.create_server((self.host, self.port))
+        self.port = ls.getsockname()[1]
+        self._listener = ls
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        threading.Thread(target=self._scan_loop, daemon=True).start()
+        self._log(f"[hub] listening on {self.host}:{self.port}")
+        if self._metrics is not None:
+            QUEUE_DEPTH.set_function(lambda: len(self._immediate))
+            if self._metrics.start():
+                self._log(f"[hub] metrics on http://{self._metrics.host}:{self._metrics.port}/metrics")
+            else:
+                self._log(f"[hub] metrics port {self._metrics.port} is not available")
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._metrics is not None:
+            self._metrics.stop()
+        if self._listener is not None:
+            try:
+                self._listener.close()
+            except OSError:
+                pass
+        with self._lock:
+            subs = list(self._subs.values())
+            self._subs.clear()
+        for sub in subs:
+            sub.close()
+
+    def serve_forever(self) -> None:
+        self.start()
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    # ---- connections ----
+    def _accept_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                sock, _addr = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._client_loop, args=(sock,), daemon=True).start()
+
+    def _client_loop(self, sock: socket.socket) -> None:
+        conn = _LineConn(sock)
+        with self._lock:
+            sid = self._next_sid
+            self._next_sid += 1
+            sub = _Subscriber(sid, conn)
+        try:
+            while not self._stop.is_set():
+                msg = conn.recv()
+                if msg is None:
+                    break
+                cmd = msg.get("cmd")
+                if cmd == "subscribe":
+                    if self.token and msg.get("token") != self.token:
+                        _log.warning("hub_unauthorized", extra=fields(sid=sid))
+                        conn.send({"type": "error", "error": "unauthorized"})
+                        break
+                    self._subscribe(sub, msg)
+                    conn.send({"type": "subscribed"})
+                elif cmd == "run_once" and sid in self._subs:
+                    self._request_immediate(sid)
+                else:
+                    conn.send({"type": "error", "error": "unknown command"})
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._lock:
+                self._subs.pop(sid, None)
+                self._immediate.discard(sid)
+            sub.close()
+
+    def _subscribe(self, sub: _Subscriber, msg: dict) -> None:
+        settings: AppSettings = settings_from_dict(msg.get("settings") or {})
+        items: List[WatchItem] = []
+        for d in msg.get("items") or []:
+            try:
+                items.append(item_from_dict(d))
+            except Exception:
+                _log.info("hub_bad_item", extra=fields(sid=sub.sid), exc_info=True)
+                continue
+        plan = build_scan_plan(items, settings)
+        with self._lock:
+            sub.plan = plan
+            sub.interval = max(HUB_MIN_INTERVAL, int(settings.interval_seconds))
+            sub.next_due = time.monotonic() + sub.interval
+            self._subs[sub.sid] = sub
+        _log.info("hub_subscribed", extra=fields(sid=sub.sid, items=len(items), units=len(plan.units), interval=sub.interval))
+        self._request_immediate(sub.sid)
+
+    def _request_immediate(self, sid: int) -> None:
+        with self._lock:
+            self._immediate.add(sid)
+        self._wake.set()
+
+    # ---- scanning ----
+    def _scan_loop(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                immediate = set(self._immediate)
+                self._immediate.clear()
+                subs = list(self._subs.values())
+            now = time.monotonic()
+            due = [s for s in subs if s.sid not in immediate and s.next_due <= now]
+            urgent = [s for s in subs if s.sid in immediate]
+            if due:
+                SCHEDULE_LAG_SECONDS.observe(now - min(s.next_due for s in due))
+
+            try:
+                if urgent and not due:
+                    # 臨時走査：要求した購読者のユニットだけ
+                    self._deliver(urgent, [], partial=True)
+                elif due or urgent:
+                    self._deliver(urgent, due, partial=False)
+            except Exception:
+                # 想定外の失敗でも走査のスレッドは止めない（MonitorWorker と同じ）。次の走査は各購読者の間隔後
+                trigger = "periodic" if due else "manual"
+                _log.exception("hub_cycle_failed", extra=fields(trigger=trigger))
+                SCAN_CYCLES.inc(trigger=trigger, result="failed")
+                now = time.monotonic()
+                for s in urgent + due:
+                    s.next_due = now + s.interval
+                    s.post({"type": "error", "error": "走査に失敗しました（詳細はハブのログ）"})
+
+            with self._lock:
+                nexts = [s.next_due for s in self._subs.values()]
+            wait = (min(nexts) - time.monotonic()) if nexts else 60.0
+            self._wake.wait(timeout=max(0.05, wait))
+            self._wake.clear()
+
+    def _deliver(self, urgent: List[_Subscriber], due: List[_Subscriber], partial: bool) -> None:
+        plan = ScanPlan()
+        targets = urgent + due
+        if partial:
+            sources = urgent
+        else:
+            # 通常サイクルは全購読者の和集合を1回で走査する（キャッシュ整理も兼ねる）
+            with self._lock:
+                sources = list(self._subs.values())
+            # 間隔の半分以内に予定のある購読者にもこの結果を送り、次の予定をそろえる
+            # （購読した時刻がばらばらでも、同じ間隔の購読者は1サイクル1回の走査に集まる）
+            soon = time.monotonic()
+            listed = {s.sid for s in targets}
+            targets += [s for s in sources if s.sid not in listed and s.next_due - soon <= s.interval / 2]
+        for s in sources:
+            for ukey, rules in s.plan.units.items():
+                plan.units.setdefault(ukey, set()).update(rules)
+            for fkey, folder in s.plan.folder_original.items():
+                plan.folder_original.setdefault(fkey, folder)
+
+        started = time.time()
+        t0 = time.perf_counter()
+        unit_hits, errors = self._engine.scan(plan, partial=partial)
+        elapsed = time.perf_counter() - t0
+        trigger = "manual" if partial else "periodic"
+        SCAN_CYCLE_SECONDS.observe(elapsed, trigger=trigger)
+        SCAN_CYCLES.inc(trigger=trigger, result="ok")
+        if not partial:
+            HITS.set(sum(len(found) for found in unit_hits.values()))
+        self.last_cycle = (len(plan.units), len(sources))
+        now = time.time()
+        self._first_seen.update(unit_hits, now)
+        if not partial:
+            self._first_seen.forget_except(plan.folder_original)
+        appeared = self._appearance.estimate(plan, unit_hits, errors, self._first_seen, started, now, partial=partial)
+        _log.info(
+            "hub_cycle",
+            extra=fields(
+                trigger=trigger,
+                elapsed_ms=round(elapsed * 1000, 1),
+                units=len(plan.units),
+                subscribers=len(sources),
+                listings=self._engine.last_listings,
+                entries=self._engine.last_entries,
+                errors=len(errors),
+            ),
+        )
+
+        now = time.monotonic()
+        urgent_ids = {s.sid for s in urgent}
+        for s in targets:
+            msg = _subscriber_results(s.plan, unit_hits, errors, self._first_seen, appeared)
+            msg.update({"type": "scan_result", "show_nohit": s.sid in urgent_ids, "elapsed": elapsed})
+            if not s.post(msg):
+                # 読まない購読者を待つと全員の走査が止まるので切断する（再接続すれば購読し直す）
+                _log.warning("hub_slow_subscriber", extra=fields(sid=s.sid))
+                s.close()
+                continue
+            if not partial or s.sid in urgent_ids:
+                s.next_due = now + s.interval
+
+
+class HubClient:
+    """
+    MonitorWorker の代わりに使うクライアント（start / stop / run_once は同じ）。
+    自分の監視対象をハブに登録し、届いた scan_result をそのまま UI の queue に渡す。
+    設定が変わったら登録し直す。切断時は一定間隔で再接続する。
+    """
+
+    RECONNECT_SECONDS = 10
+    CONFIG_CHECK_SECONDS = 2
+    # 走査はハブ側で他の購読者と共有しているので、クライアントからは止めない（UI はキャンセルを出さない）
+    can_cancel = False
+
+    def __init__(self, get_config_callable, event_queue, address: str, token: str = ""):
+        self._get_config = get_config_callable
+        self._q = event_queue
+        self.host, self.port = parse_host_port(address)
+        self.token = token
+        self._stop = threading.Event()
+        self._stop.set()
+        self._thread: Optional[threading.Thread] = None
+        self._conn: Optional[_LineConn] = None
+        self._reported_down = False
+        self.profiler = None  # MonitorWorker と同じ属性（ハブ側で走査するので未使用）
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive() and not self._stop.is_set():
+            return
+        # 停止中の古いスレッドとは別のイベントを使う（MonitorWorker と同じ）
+        stop = threading.Event()
+        self._stop = stop
+        self._thread = threading.Thread(target=self._run, args=(stop,), daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        conn = self._conn
+        if conn is not None:
+            conn.close()
+
+    def join(self, timeout: float) -> bool:
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        return not (self._thread is not None and self._thread.is_alive())
+
+    def run_once(self, show_nohit: bool = True) -> bool:
+        conn = self._conn
+        if conn is None:
+            self._put_down_notice(force=True)
+            return False
+        try:
+            conn.send({"cmd": "run_once"})
+        except OSError:
+            self._put_down_notice(force=True)
+            return False
+        return True
+
+    def cancel_scan(self) -> None:
+        # can_cancel = False（UI からは呼ばれない）
+        pass
+
+    def save_snapshot(self) -> bool:
+        # 一覧はハブ側が持つので、クライアントには保存するものがない
+        return False
+
+    def _subscription(self, cfg: AppConfig) -> dict:
+        items = [asdict(it) for it in cfg.items if (not it.is_deleted) and it.is_active]
+        return {"cmd": "subscribe", "token": self.token, "items": items, "settings": asdict(cfg.settings)}
+
+    def _signature(self, cfg: AppConfig) -> str:
+        sub = self._subscription(cfg)
+        sub["settings"].pop("last_browse_dir", None)
+        return json.dumps(sub, sort_keys=True, ensure_ascii=False)
+
+    def _put_down_notice(self, force: bool = False) -> None:
+        if self._reported_down and not force:
+            return
+        self._reported_down = True
+        _log.warning("hub_unreachable", extra=fields(host=self.host, port=self.port))
+        self._q.put(
+            {
+                "type": "scan_result",
+                "hits": {},
+                "errors": {f"(スキャンハブ {self.host}:{self.port})": "接続できません"},
+                "show_nohit": False,
+                "elapsed": 0.0,
+            }
+        )
+
+    def _run(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=5)
+            except OSError:
+                self._put_down_notice()
+                stop.wait(self.RECONNECT_SECONDS)
+                continue
+
+            conn = _LineConn(sock)
+            self._conn = conn
+            self._reported_down = False
+            try:
+                self._session(conn, stop)
+            except (OSError, ValueError):
+                pass
+            finally:
+                if self._conn is conn:
+                    self._conn = None
+                conn.close()
+            if not stop.is_set():
+                self._put_down_notice()
+                stop.wait(self.RECONNECT_SECONDS)
+
+    def _session(self, conn: _LineConn, stop: threading.Event) -> None:
+        cfg = self._get_config()
+        signature = self._signature(cfg)
+        conn.send(self._subscription(cfg))
+        conn.sock.settimeout(self.CONFIG_CHECK_SECONDS)
+        while not stop.is_set():
+            try:
+                msg = conn.recv()
+            except socket.timeout:
+                # 設定変更の確認（変わっていれば登録し直す）
+                cfg = self._get_config()
+                new_sig = self._signature(cfg)
+                if new_sig != signature:
+                    signature = new_sig
+                    conn.send(self._subscription(cfg))
+                continue
+            if msg is None:
+                return
+            if msg.get("type") == "scan_result":
+                if stop.is_set():
+                    return
+                # JSON では配列になるので、ローカルの走査結果と同じ HitInfo に戻す
+                msg["info"] = {
+                    folder: {name: HitInfo(*v) for name, v in per_file.items()}
+                    for folder, per_file in (msg.get("info") or {}).items()
+                }
+                self._q.put(msg)
+                # 現れた時刻はハブ側の推定（ハブとの時計のずれはそのまま乗る）
+                LATENCY.observe_result(msg, STAGE_ENQUEUED)
+            elif msg.get("type") == "error":
+                _log.warning("hub_error", extra=fields(host=self.host, port=self.port, error=str(msg.get("error"))))
+                self._q.put(
+                    {
+                        "type": "scan_result",
+                        "hits": {},
+                        "errors": {f"(スキャンハブ {self.host}:{self.port})": str(msg.get("error"))},
+                        "show_nohit": False,
+                        "elapsed": 0.0,
+                    }
+                )
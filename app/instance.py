@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import json
+import os
+import secrets
+import socket
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+IPC_HOST = "127.0.0.1"
+_MAX_LINE = 64 * 1024
+
+
+class SingleInstance:
+    """
+    多重起動防止とローカルIPC。
+
+    - watch_config.json と同じフォルダに <設定ファイル名>.lock を作り、プロセス生存中は排他ロックを保持する
+    - 1つ目のプロセスは 127.0.0.1 の空きポートで待ち受け、ポートと合言葉（token）を <設定ファイル名>.ipc に書く
+    - 2つ目以降はロックを取れないので、.ipc を読んで 1つ目へコマンド（show / run_once など）を送って終了する
+
+    プロトコル：1接続1往復、UTF-8 の JSON 1行。
+      要求: {"token": "...", "cmd": "show", ...}
+      応答: {"ok": true, ...} / {"ok": false, "error": "..."}
+    """
+
+    def __init__(self, config_file: Path):
+        self.lock_path = config_file.with_name(config_file.name + ".lock")
+        self.ipc_path = config_file.with_name(config_file.name + ".ipc")
+        self._fh = None
+        self._server: Optional[IpcServer] = None
+
+    # ---- lock ----
+    def acquire(self) -> bool:
+        """ロックを取れたら True（自分が1つ目）。取れなければ False。"""
+        try:
+            fh = open(self.lock_path, "a+b")
+        except OSError:
+            # ロックファイルが作れない環境（読み取り専用フォルダ等）では多重起動防止を諦めて起動する
+            return True
+        try:
+            if sys.platform == "win32":
+                import msvcrt
+
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        self._fh = fh
+        return True
+
+    def release(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+            try:
+                self.ipc_path.unlink()
+            except OSError:
+                pass
+        if self._fh is not None:
+            try:
+                self._fh.close()  # クローズでロックも解放される
+            except OSError:
+                pass
+            self._fh = None
+
+    # ---- server side ----
+    def serve(self, handler: Callable[[dict], dict]) -> None:
+        """IPC の待ち受けを開始する（ロック取得済みのプロセスだけが呼ぶ）"""
+        if self._server is not None:
+            return
+        token = secrets.token_hex(16)
+        server = IpcServer(token, handler)
+        server.start()
+        self._server = server
+        tmp = self.ipc_path.with_name(self.ipc_path.name + ".tmp")
+        try:
+            tmp.write_text(
+                json.dumps({"port": server.port, "token": token, "pid": os.getpid()}),
+                encoding="utf-8",
+            )
+            os.replace(tmp, self.ipc_path)
+        except OSError:
+            pass
+
+    # ---- client side ----
+    def forward(self, cmd: str, wait_seconds: float = 5.0, **params) -> Optional[dict]:
+        """
+        起動済みプロセスへコマンドを送る。相手が起動途中で .ipc がまだ無い場合は少し待つ。
+        応答が得られなければ None。
+        """
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            reply = send_command(self.ipc_path, cmd, **params)
+            if reply is not None or time.monotonic() >= deadline:
+                return reply
+            time.sleep(0.2)
+
+
+def send_command(ipc_path: Path, cmd: str, timeout: float = 3.0, **params) -> Optional[dict]:
+    try:
+        info = json.loads(ipc_path.read_text(encoding="utf-8"))
+        port = int(info["port"])
+        token = str(info["token"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    payload = dict(params)
+    payload.update({"token": token, "cmd": cmd})
+    try:
+        with socket.create_connection((IPC_HOST, port), timeout=timeout) as sock:
+            sock.sendall(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as f:
+                line = f.readline(_MAX_LINE)
+        return json.loads(line.decode("utf-8")) if line else None
+    except (OSError, ValueError):
+        return None
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    timeout = 5
+
+    def handle(self) -> None:
+        server: IpcServer = self.server  # type: ignore[assignment]
+        try:
+            line = self.rfile.readline(_MAX_LINE)
+            msg = json.loads(line.decode("utf-8"))
+            if not isinstance(msg, dict) or not secrets.compare_digest(str(msg.get("token", "")), server.token):
+                reply = {"ok": False, "error": "unauthorized"}
+            else:
+                msg.pop("token", None)
+                reply = server.handler(msg)
+        except Exception as e:
+            reply = {"ok": False, "error": e.__class__.__name__}
+        try:
+            self.wfile.write(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+        except OSError:
+            pass
+
+
+class IpcServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = False
+
+    def __init__(self, token: str, handler: Callable[[dict], dict]):
+        super().__init__((IPC_HOST, 0), _Handler)
+        self.token = token
+        self.handler = handler
+        self.port = self.server_address[1]
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.5}, daemon=True)
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        super().shutdown()
+        self.server_close()
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class BudgetCancelled(Exception):
+    """I/O 予算の待ち中にキャンセルされた"""
+
+
+@lru_cache(maxsize=1024)
+def share_root(path: str) -> str:
+    """
+    同時一覧数を数える単位（サーバ / 共有）。監視フォルダごとに1回だけ求める。
+      - UNC（\\\\server\\share\\...）: \\\\SERVER\\SHARE
+      - ドライブ文字: C:
+      - それ以外: マウントポイント（/mnt/nas など）
+    """
+    drive, _rest = os.path.splitdrive(path)
+    if drive:
+        return drive.upper()
+    p = os.path.abspath(path)
+    while True:
+        try:
+            if os.path.ismount(p):
+                return p
+        except OSError:
+            return p
+        parent = os.path.dirname(p)
+        if parent == p:
+            return p
+        p = parent
+
+
+class TokenBucket:
+    """rate 個/秒、最大 burst 個まで貯まるトークンバケット（rate <= 0 は無制限）"""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self._lock = threading.Lock()
+        self.rate = 0.0
+        self.burst = 1.0
+        self._tokens = 0.0
+        self._stamp = time.monotonic()
+        self.configure(rate, burst)
+        # 最初の1回は待たない
+        self._tokens = self.burst
+
+    def configure(self, rate: float, burst: float = 1.0) -> None:
+        with self._lock:
+            self.rate = max(0.0, float(rate))
+            self.burst = max(1.0, float(burst))
+            self._tokens = min(self._tokens, self.burst)
+
+    def acquire(self, cancel: Optional[threading.Event] = None) -> float:
+        """トークンを1つ取る。待った秒数を返す。cancel がセットされたら BudgetCancelled。"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                if self.rate <= 0:
+                    return waited
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                delay = (1.0 - self._tokens) / self.rate
+            if cancel is not None:
+                if cancel.wait(delay):
+                    raise BudgetCancelled()
+            else:
+                time.sleep(delay)
+            waited += delay
+
+
+class IoBudget:
+    """
+    プロセス全体で共有するディレクトリ一覧の予算。
+      - listings_per_second : 1秒あたりの一覧回数の上限（0 は無制限）
+      - per_share           : 同じサーバ / 共有に対する同時一覧数の上限（0 は無制限）
+    走査エンジンは os.scandir の前後を listing() で囲む（root は share_root() の値）。
+    """
+
+    def __init__(self, listings_per_second: float = 0.0, per_share: int = 0):
+        self._bucket = TokenBucket(listings_per_second)
+        self._cond = threading.Condition()
+        self._per_share = 0
+        self._active: Dict[str, int] = {}
+        self.configure(listings_per_second, per_share)
+
+    def configure(self, listings_per_second: float, per_share: int) -> None:
+        self._bucket.configure(listings_per_second)
+        with self._cond:
+            self._per_share = max(0, int(per_share))
+            self._cond.notify_all()
+
+    def limits(self) -> Tuple[float, int]:
+        """現在の設定 (1秒あたりの一覧回数, 共有ごとの同時一覧数)。別プロセスの走査に同じ予算を渡すのに使う"""
+        with self._cond:
+            return self._bucket.rate, self._per_share
+
+    @contextmanager
+    def listing(self, root: str, cancel: Optional[threading.Event] = None) -> Iterator[None]:
+        # 先にトークンを取る（待っている間に共有の枠を塞がない）
+        self._bucket.acquire(cancel)
+        self._enter(root, cancel)
+        try:
+            yield
+        finally:
+            self._leave(root)
+
+    def _enter(self, root: str, cancel: Optional[threading.Event]) -> None:
+        with self._cond:
+            while self._per_share and self._active.get(root, 0) >= self._per_share:
+                if cancel is not None and cancel.is_set():
+                    raise BudgetCancelled()
+                # キャンセルを見逃さないよう短い間隔で起きる
+                self._cond.wait(0.1)
+            self._active[root] = self._active.get(root, 0) + 1
+
+    def _leave(self, root: str) -> None:
+        with self._cond:
+            n = self._active.get(root, 0) - 1
+            if n > 0:
+                self._active[root] = n
+            else:
+                self._active.pop(root, None)
+            self._cond.notify_all()
+
+
+# プロセス全体の予算（設定は MonitorWorker / ScanHub が走査前に反映する）
+IO_BUDGET = IoBudget()
@@ -0,0 +1,456 @@
+import logging
+import os
+import pickle
+import queue
+import struct
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, List, Mapping, Optional, Set, Tuple
+
+from .fsio import LOCAL_FS, FileSystem
+from .iobudget import IO_BUDGET, TokenBucket
+from .logs import LOGGER_ROOT, apply_levels, fields, get_logger
+from .metrics import DIRECTORIES_LISTED, ENTRIES_LISTED, FOLDER_LAST_SCAN_SECONDS, FOLDER_SCAN_SECONDS
+from .monitor import ScanCancelled, ScanEngine, ScanPlan, UnitKey, UnitResult
+from .rules import Rule
+
+_log = get_logger("monitor")
+
+# 凍結ビルド（PyInstaller）では同じ exe をこの引数で起動する（main.py が受け取る）
+SCANNER_FLAG = "--scanner"
+
+# 監視フォルダ1つの走査がこれを超えたら走査プロセスを止めて作り直す（秒、0 は無制限）
+DEFAULT_FOLDER_TIMEOUT_SECONDS = 300
+
+TIMEOUT_MESSAGE = "応答がありません（{seconds}秒で打ち切り）"
+CRASHED_MESSAGE = "走査プロセスが異常終了しました"
+
+# キャンセルを伝えてから、走査プロセスが応じるのを待つ時間（秒）。応じなければ止めて作り直す
+_CANCEL_GRACE_SECONDS = 2.0
+# スナップショットの取り出しを待つ時間（秒）
+_EXPORT_TIMEOUT_SECONDS = 30.0
+
+# 1通 = 4バイトの長さ + pickle。中身はタプル（先頭が種類）
+#   親 -> 子 : ("config", 一覧/秒, 共有ごとの同時一覧数, ログレベル, {サブシステム: レベル})
+#             ("import", スナップショットのユニット) / ("retain", ScanPlan)
+#             ("unit", 番号, ユニットキー, ルール, フォルダ, 速度制限/秒) / ("cancel", 番号) / ("export", 番号)
+#   子 -> 親 : ("unit", 番号, None（フォルダではない）| (ヒット, エラー, 理由, 一覧数, エントリ数))
+#             ("cancelled", 番号) / ("export", 番号, ユニット) / ("log", ロガー名, レベル, メッセージ, 項目)
+_HEADER = struct.Struct("<I")
+
+
+def _write_frame(stream: BinaryIO, msg: tuple) -> None:
+    data = pickle.dumps(msg, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+def _read_frame(stream: BinaryIO) -> Optional[tuple]:
+    """1通読む。相手が閉じた / 壊れていれば None"""
+    try:
+        header = stream.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return None
+        (n,) = _HEADER.unpack(header)
+        data = stream.read(n)
+        if len(data) < n:
+            return None
+        return pickle.loads(data)
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+# ---- 子プロセス側 ----
+
+
+class _ForwardHandler(logging.Handler):
+    """走査プロセスのログを親に送る（ファイルへの書き込みは親の LogService が行う）"""
+
+    def __init__(self, send: Callable[[tuple], None]):
+        super().__init__()
+        self._send = send
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            extra = dict(getattr(record, "fields", None) or {})
+            if record.exc_info:
+                extra["exc"] = logging.Formatter().formatException(record.exc_info)
+            self._send(("log", record.name, record.levelno, record.getMessage(), extra))
+        except Exception:
+            self.handleError(record)
+
+
+def scanner_main() -> None:
+    """
+    走査プロセスの本体（python -m app.isolation / exe --scanner）。
+    標準入力で依頼を受け、監視フォルダ1つずつ ScanEngine で走査して標準出力に返す。
+    キャンセルは受信スレッドが受け取り、走査中のエンジンに伝える。
+    """
+    out = sys.stdout.buffer
+    inp = sys.stdin.buffer
+    # 誤って print されても通信を壊さない
+    sys.stdout = sys.stderr
+    write_lock = threading.Lock()
+
+    def send(msg: tuple) -> None:
+        with write_lock:
+            _write_frame(out, msg)
+
+    root = logging.getLogger(LOGGER_ROOT)
+    root.propagate = False
+    root.addHandler(_ForwardHandler(send))
+
+    engine = ScanEngine(LOCAL_FS)
+    requests: "queue.Queue[Optional[tuple]]" = queue.Queue()
+    cancel = threading.Event()
+    # 走査中の依頼番号 / 最後にキャンセルされた依頼番号（どちらの順で届いても取りこぼさない）
+    current = [0]
+    cancelled = [0]
+
+    def receive() -> None:
+        while True:
+            msg = _read_frame(inp)
+            if msg is None:
+                # 親がいなくなった：走査を止めて終わる
+                cancel.set()
+                requests.put(None)
+                return
+            if msg[0] == "cancel":
+                cancelled[0] = msg[1]
+                if current[0] == msg[1]:
+                    cancel.set()
+            else:
+                requests.put(msg)
+
+    threading.Thread(target=receive, name="scanner-receive", daemon=True).start()
+
+    while True:
+        msg = requests.get()
+        if msg is None:
+            return
+        kind = msg[0]
+        if kind == "config":
+            _, rate, per_share, level, levels = msg
+            IO_BUDGET.configure(rate, per_share)
+            apply_levels(level, levels)
+        elif kind == "import":
+            engine.import_snapshot(msg[1])
+        elif kind == "retain":
+            engine.retain(msg[1])
+        elif kind == "export":
+            send(("export", msg[1], engine.export_snapshot()))
+        elif kind == "unit":
+            seq = msg[1]
+            current[0] = seq
+            cancel.clear()
+            if cancelled[0] == seq:
+                cancel.set()
+            send(_scan_unit(engine, msg, cancel))
+
+
+def _scan_unit(engine: ScanEngine, msg: tuple, cancel: threading.Event) -> tuple:
+    _, seq, ukey, rules, folder, pace_rate = msg
+    # 計画の作成（ScanPlan.add）と同じく、有効なフォルダでなければ黙って読み飛ばす
+    if not LOCAL_FS.is_dir(folder):
+        return ("unit", seq, None)
+    plan = ScanPlan()
+    plan.units[ukey] = set(rules)
+    plan.folder_original[ukey[0]] = folder
+    try:
+        unit_hits, errors = engine.scan(plan, partial=True, cancel=cancel, pace=TokenBucket(pace_rate) if pace_rate else None)
+    except ScanCancelled:
+        return ("cancelled", seq)
+    except Exception:
+        _log.exception("scanner_unit_failed", extra=fields(folder=folder))
+        return ("unit", seq, ([], CRASHED_MESSAGE, "scanner_failed", engine.last_listings, engine.last_entries))
+    fkey = ukey[0]
+    return (
+        "unit",
+        seq,
+        (unit_hits.get(ukey, []), errors.get(fkey), engine.last_error_reasons.get(fkey), engine.last_listings, engine.last_entries),
+    )
+
+
+# ---- 親プロセス側 ----
+
+
+def _share_of(folder: str) -> str:
+    # share_root() はマウントポイントを調べる（I/O がある）ので、親では文字列だけで決める
+    # （UNC / ドライブ文字はサーバ・共有単位、それ以外はフォルダ単位）
+    drive, _rest = os.path.splitdrive(folder)
+    return drive.upper() if drive else folder
+
+
+class _DeferredDirs(FileSystem):
+    """
+    走査計画の作成用。フォルダの確認（is_dir）も止まった共有では戻らないので、親では確認せず、
+    走査プロセスがユニットごとに確認する。一覧と stat は親では行わない。
+    """
+
+    def is_dir(self, path: str) -> bool:
+        return bool(path)
+
+
+def _scanner_command() -> Tuple[List[str], Optional[str]]:
+    if getattr(sys, "frozen", False):
+        return [sys.executable, SCANNER_FLAG], None
+    return [sys.executable, "-m", "app.isolation"], str(Path(__file__).resolve().parent.parent)
+
+
+class _Scanner:
+    """起動中の走査プロセス1つ（受信は専用スレッドで queue に積む）"""
+
+    def __init__(self):
+        cmd, cwd = _scanner_command()
+        flags = getattr(subprocess, "CREATE_NO_WINDOW", 0) if sys.platform == "win32" else 0
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=cwd,
+            creationflags=flags,
+        )
+        self.replies: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self.sent_config: Optional[tuple] = None
+        threading.Thread(target=self._receive, name=f"scanner-{self.proc.pid}", daemon=True).start()
+
+    def _receive(self) -> None:
+        stream = self.proc.stdout
+        while True:
+            msg = _read_frame(stream)
+            self.replies.put(msg)
+            if msg is None:
+                return
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def send(self, msg: tuple) -> bool:
+        try:
+            _write_frame(self.proc.stdin, msg)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def kill(self) -> None:
+        # カーネル内で止まったプロセスはすぐには消えないことがあるので、終了は待たない
+        # （受信スレッドは相手が消えた時点で終わる）
+        try:
+            self.proc.kill()
+        except OSError:
+            pass
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+
+
+class ProcessScanEngine(ScanEngine):
+    """
+    ScanEngine と同じ使い方で、一覧と stat を子プロセス（走査プロセス）で行うエンジン。
+    止まった共有の一覧でカーネル内に固まっても、固まるのは子プロセスだけで、監視スレッドと UI は動き続ける。
+      - 監視フォルダ1つずつ依頼し、folder_timeout 秒を超えたら子プロセスを止めて作り直す。
+        そのフォルダと、同じ共有にある残りのフォルダはこのサイクルでは「応答がありません」になる
+      - 子プロセスが落ちた場合も作り直し、そのフォルダは CRASHED_MESSAGE になる
+      - 枝刈り用キャッシュは子プロセスが持つ（作り直すと消えるので、次の走査は一覧し直す）
+      - 親に残るのはスナップショットの読み込み分だけ（起動直後の表示 warm_hits と走査の順番に使う）
+    """
+
+    def __init__(
+        self,
+        folder_timeout: float = DEFAULT_FOLDER_TIMEOUT_SECONDS,
+        log_level: str = "INFO",
+        log_levels: Optional[Mapping[str, str]] = None,
+    ):
+        super().__init__(_DeferredDirs())
+        self.folder_timeout = max(0.0, float(folder_timeout))
+        self.restarts = 0
+        self._log_level = log_level
+        self._log_levels = dict(log_levels or {})
+        self._scanner: Optional[_Scanner] = None
+        self._pending_import: Optional[list] = None
+        self._last_export: list = []
+        self._seq = 0
+
+    # ---- スナップショット ----
+    def import_snapshot(self, units: list) -> int:
+        n = super().import_snapshot(units)
+        self._pending_import = units if n else None
+        return n
+
+    def export_snapshot(self) -> list:
+        """走査プロセスのキャッシュを取り出す。取り出せなければ前回取り出せた分（無ければ読み込んだ分）"""
+        scanner = self._scanner
+        if scanner is not None and scanner.alive():
+            self._seq += 1
+            seq = self._seq
+            if scanner.send(("export", seq)):
+                reply = self._wait(scanner, seq, None, time.monotonic() + _EXPORT_TIMEOUT_SECONDS)
+                if reply is not None and reply[0] == "export":
+                    self._last_export = reply[2]
+                    return self._last_export
+        return self._last_export or super().export_snapshot()
+
+    def retain(self, plan: ScanPlan) -> None:
+        super().retain(plan)
+        # 全体を確認し終えたので、作り直した走査プロセスに古いスナップショットは渡さない
+        self._pending_import = None
+        if self._scanner is not None:
+            self._scanner.send(("retain", plan))
+
+    def close(self) -> None:
+        """走査プロセスを止める（終了時に呼ぶ）"""
+        scanner, self._scanner = self._scanner, None
+        if scanner is not None:
+            scanner.kill()
+
+    # ---- 走査 ----
+    def iter_scan(
+        self,
+        plan: ScanPlan,
+        partial: bool = False,
+        cancel: Optional[threading.Event] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+        pace: Optional[TokenBucket] = None,
+    ) -> Iterator[UnitResult]:
+        """ScanEngine.iter_scan() と同じ。監視フォルダ1つずつ走査プロセスに依頼し、応答を待つ間も親は止まらない。"""
+        total = len(plan.units)
+        self.last_listings = 0
+        self.last_entries = 0
+        self.last_error_reasons = {}
+        folder_seconds: Dict[str, float] = {}
+        timed_out: Set[str] = set()  # このサイクルで応答しなかった共有
+
+        for done, (ukey, rules) in enumerate(self.warm_first(list(plan.units.items()))):
+            if cancel is not None and cancel.is_set():
+                raise ScanCancelled()
+            if progress is not None:
+                progress(done, total)
+            fkey = ukey[0]
+            folder = plan.display(fkey)
+            root = _share_of(folder)
+            if root in timed_out:
+                self._count_error(fkey, "timeout")
+                yield UnitResult(ukey, folder, [], TIMEOUT_MESSAGE.format(seconds=int(self.folder_timeout)))
+                continue
+
+            t0 = time.perf_counter()
+            reply = self._scan_unit(ukey, rules, folder, cancel, pace)
+            elapsed = time.perf_counter() - t0
+            FOLDER_SCAN_SECONDS.observe(elapsed)
+            folder_seconds[folder] = elapsed
+            if reply == "cancelled":
+                raise ScanCancelled()
+            if reply == "timeout":
+                timed_out.add(root)
+                self._count_error(fkey, "timeout")
+                _log.warning("scanner_timeout", extra=fields(folder=folder, timeout=self.folder_timeout))
+                yield UnitResult(ukey, folder, [], TIMEOUT_MESSAGE.format(seconds=int(self.folder_timeout)))
+                continue
+            if reply == "crashed":
+                self._count_error(fkey, "scanner_crashed")
+                _log.warning("scanner_crashed", extra=fields(folder=folder))
+                yield UnitResult(ukey, folder, [], CRASHED_MESSAGE)
+                continue
+            if reply is None:
+                # 有効なフォルダではない（計画の作成時と同じ扱い）
+                continue
+            hits, error, reason, listings, entries = reply
+            self.last_listings += listings
+            self.last_entries += entries
+            DIRECTORIES_LISTED.inc(listings)
+            ENTRIES_LISTED.inc(entries)
+            if error is not None and reason:
+                self._count_error(fkey, reason)
+            yield UnitResult(ukey, folder, [] if error is not None else hits, error)
+
+        if not partial:
+            self.retain(plan)
+            FOLDER_LAST_SCAN_SECONDS.replace(folder_seconds)
+
+    def _scan_unit(
+        self, ukey: UnitKey, rules: Set[Rule], folder: str, cancel: Optional[threading.Event], pace: Optional[TokenBucket]
+    ):
+        """走査プロセスの結果（None / タプル）か、"cancelled" / "timeout" / "crashed" """
+        scanner = self._ensure_scanner()
+        self._seq += 1
+        seq = self._seq
+        if scanner is None or not scanner.send(("unit", seq, ukey, tuple(rules), folder, pace.rate if pace is not None else 0.0)):
+            self._restart()
+            return "crashed"
+        deadline = time.monotonic() + self.folder_timeout if self.folder_timeout else None
+        reply = self._wait(scanner, seq, cancel, deadline)
+        if reply is None:
+            self._restart()
+            if deadline is not None and time.monotonic() >= deadline:
+                return "timeout"
+            if cancel is not None and cancel.is_set():
+                # キャンセルに応じない（一覧の中で止まっている）：待たずに作り直した
+                return "cancelled"
+            return "crashed"
+        if reply[0] == "cancelled":
+            return "cancelled"
+        return reply[2]
+
+    def _wait(
+        self, scanner: _Scanner, seq: int, cancel: Optional[threading.Event], deadline: Optional[float]
+    ) -> Optional[tuple]:
+        """依頼 seq の返事を待つ。期限切れ・キャンセルに応じない・プロセスが落ちた場合は None"""
+        cancel_deadline: Optional[float] = None
+        while True:
+            now = time.monotonic()
+            if cancel is not None and cancel.is_set() and cancel_deadline is None:
+                scanner.send(("cancel", seq))
+                cancel_deadline = now + _CANCEL_GRACE_SECONDS
+            if (deadline is not None and now >= deadline) or (cancel_deadline is not None and now >= cancel_deadline):
+                return None
+            try:
+                msg = scanner.replies.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if msg is None:
+                return None
+            if msg[0] == "log":
+                self._relay_log(scanner, msg)
+                continue
+            if msg[1] == seq:
+                return msg
+
+    def _relay_log(self, scanner: _Scanner, msg: tuple) -> None:
+        _, name, level, text, extra = msg
+        logging.getLogger(name).log(level, text, extra=fields(scanner_pid=scanner.proc.pid, **extra))
+
+    def _ensure_scanner(self) -> Optional[_Scanner]:
+        scanner = self._scanner
+        if scanner is not None and not scanner.alive():
+            self._restart()
+            scanner = None
+        if scanner is None:
+            try:
+                scanner = _Scanner()
+            except OSError as e:
+                _log.error("scanner_start_failed", extra=fields(error=str(e)))
+                return None
+            self._scanner = scanner
+            if self._pending_import is not None:
+                scanner.send(("import", self._pending_import))
+        config = (*IO_BUDGET.limits(), self._log_level, self._log_levels)
+        if scanner.sent_config != config:
+            scanner.send(("config", *config))
+            scanner.sent_config = config
+        return scanner
+
+    def _restart(self) -> None:
+        scanner, self._scanner = self._scanner, None
+        if scanner is not None:
+            scanner.kill()
+            self.restarts += 1
+            _log.info("scanner_restarted", extra=fields(pid=scanner.proc.pid, restarts=self.restarts))
+
+
+if __name__ == "__main__":
+    scanner_main()
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from .metrics import NOTIFY_LATENCY_BY_CODE_SECONDS, NOTIFY_LATENCY_BY_FOLDER_SECONDS
+
+# 計測する段階：走査結果をキューに積んだ時点 / ポップアップに表示した時点
+STAGE_ENQUEUED = "enqueued"
+STAGE_POPUP = "popup"
+STAGES = (STAGE_ENQUEUED, STAGE_POPUP)
+
+# 集計の切り口
+DIM_FOLDER = "folder"
+DIM_CODE = "code"
+
+# 画面に出す分位点は、切り口ごとに直近この件数から求める（メトリクスのヒストグラムは全件）
+LATENCY_RECENT_SAMPLES = 500
+
+
+def _percentile(values: List[float], p: float) -> float:
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(p / 100 * (len(s) - 1))))]
+
+
+class LatencyRow(NamedTuple):
+    dim: str  # DIM_FOLDER / DIM_CODE
+    key: str  # フォルダ / コード
+    count: int  # 起動後の件数
+    p50: Dict[str, float]  # 段階 -> 秒（その段階の計測が無ければキーなし）
+    p95: Dict[str, float]
+    max: Dict[str, float]
+
+
+class LatencyStats:
+    """
+    通知遅延（ファイルがフォルダに現れてから、結果をキューに積む / ポップアップを出すまで）の集計。
+    走査スレッドと Tk スレッドの両方から observe_result() するので、短いロックで守る。
+    現れた時刻は scan_result の "appeared"（monitor.AppearanceEstimator の推定）を使う。
+    """
+
+    def __init__(self, recent: int = LATENCY_RECENT_SAMPLES):
+        self._recent = max(1, int(recent))
+        self._lock = threading.Lock()
+        # (段階, 切り口, キー) -> 直近の秒数
+        self._values: Dict[Tuple[str, str, str], Deque[float]] = {}
+        self._counts: Dict[Tuple[str, str, str], int] = {}
+
+    def observe_result(self, msg: dict, stage: str, now: Optional[float] = None) -> int:
+        """scan_result 1件分の新規ヒットを記録する。記録した件数を返す。"""
+        appeared: Dict[str, Dict[str, float]] = msg.get("appeared") or {}
+        if not appeared:
+            return 0
+        now = time.time() if now is None else now
+        codes: Dict[str, Dict[str, List[str]]] = msg.get("codes") or {}
+        n = 0
+        with self._lock:
+            for folder, per_file in appeared.items():
+                per_code = codes.get(folder) or {}
+                for name, ts in per_file.items():
+                    # ファイルサーバとの時計のずれで負になる分は 0 とみなす
+                    seconds = max(0.0, now - float(ts))
+                    self._add((stage, DIM_FOLDER, folder), seconds)
+                    NOTIFY_LATENCY_BY_FOLDER_SECONDS.observe(seconds, stage=stage, folder=folder)
+                    for code in per_code.get(name) or [""]:
+                        self._add((stage, DIM_CODE, code), seconds)
+                        NOTIFY_LATENCY_BY_CODE_SECONDS.observe(seconds, stage=stage, code=code)
+                    n += 1
+        return n
+
+    def _add(self, key: Tuple[str, str, str], seconds: float) -> None:
+        values = self._values.get(key)
+        if values is None:
+            values = self._values[key] = deque(maxlen=self._recent)
+        values.append(seconds)
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+    def rows(self) -> List[LatencyRow]:
+        """切り口・キーごとの集計（フォルダ → コードの順、キーの昇順）"""
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._values.items()}
+            counts = dict(self._counts)
+        keys = sorted({(dim, key) for _stage, dim, key in snapshot}, key=lambda k: (k[0] != DIM_FOLDER, k[1]))
+        out: List[LatencyRow] = []
+        for dim, key in keys:
+            p50: Dict[str, float] = {}
+            p95: Dict[str, float] = {}
+            worst: Dict[str, float] = {}
+            for stage in STAGES:
+                values = snapshot.get((stage, dim, key))
+                if values:
+                    p50[stage] = _percentile(values, 50)
+                    p95[stage] = _percentile(values, 95)
+                    worst[stage] = max(values)
+            count = max(counts.get((stage, dim, key), 0) for stage in STAGES)
+            out.append(LatencyRow(dim, key, count, p50, p95, worst))
+        return out
+
+
+# プロセス全体の集計（MonitorWorker / HubClient が enqueued、UI が popup を記録する）
+LATENCY = LatencyStats()
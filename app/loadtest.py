@@ -0,0 +1,192 @@
+import logging
+import os
+import queue
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .config import AppConfig, AppSettings, WatchItem
+from .fakefs import FakeFileSystem, FakeFolder
+from .logs import LOGGER_ROOT
+from .monitor import MonitorWorker, ScanEngine, build_scan_plan
+
+# 負荷試験で監視するコード（FakeFolder.codes の既定と合わせる）
+LOADTEST_CODE = "123"
+
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(p / 100 * (len(s) - 1))))]
+
+
+def _summary(values: List[float]) -> str:
+    if not values:
+        return "-"
+    return f"p50 {_percentile(values, 50):.3f}s / p95 {_percentile(values, 95):.3f}s / max {max(values):.3f}s（{len(values)}件）"
+
+
+def build_fake_shares(
+    shares: int, spec: FakeFolder, root: str = os.path.join(os.sep, "loadtest"), seed: Optional[int] = 1
+) -> Tuple[FakeFileSystem, List[str]]:
+    """shares 個の監視フォルダを spec の形で作る"""
+    fs = FakeFileSystem(seed)
+    roots = [os.path.join(root, f"share{i:03d}") for i in range(shares)]
+    for r in roots:
+        fs.add_tree(r, spec)
+    return fs, roots
+
+
+def loadtest_config(roots: List[str], interval: int, depth: int) -> AppConfig:
+    # 揺らぎなし・位相の分散なし（走査が interval ごとに並ぶので結果を読みやすい）
+    settings = AppSettings(interval_seconds=interval, scan_phase_spread=False, scan_jitter_percent=0.0)
+    items = [
+        WatchItem(
+            id=f"loadtest-{i}",
+            code=LOADTEST_CODE,
+            folder=r,
+            recursive=depth > 0,
+            max_depth=max(1, depth),
+        )
+        for i, r in enumerate(roots)
+    ]
+    return AppConfig(version=1, settings=settings, items=items)
+
+
+def run_engine_cycles(fs: FakeFileSystem, cfg: AppConfig, cycles: int) -> Dict[str, object]:
+    """スケジューラを通さず、走査エンジンだけを連続で回す（1回目は全一覧、2回目以降は枝刈りが効く）"""
+    engine = ScanEngine(fs)
+    plan = build_scan_plan(cfg.items, cfg.settings, fs)
+    times: List[float] = []
+    listings: List[int] = []
+    hits = errors = 0
+    for _ in range(cycles):
+        t0 = time.perf_counter()
+        unit_hits, errs = engine.scan(plan)
+        times.append(time.perf_counter() - t0)
+        listings.append(engine.last_listings)
+        hits = sum(len(v) for v in unit_hits.values())
+        errors = len(errs)
+    return {"cycle_seconds": times, "listings": listings, "hits": hits, "errors": errors}
+
+
+def run_scheduled(
+    fs: FakeFileSystem,
+    cfg: AppConfig,
+    roots: List[str],
+    duration: float,
+    inject_every: float,
+    seed: int = 1,
+) -> Dict[str, object]:
+    """
+    MonitorWorker（スケジューラ + 走査エンジン）を fs に対して duration 秒動かす。
+    inject_every 秒ごとに新しい担当ファイルを追加し、それが scan_result に載るまでの時間（通知遅延）を測る。
+    """
+    rng = random.Random(seed)
+    q: "queue.Queue[dict]" = queue.Queue()
+    worker = MonitorWorker(lambda: cfg, q, fs=fs)
+    pending: Dict[Tuple[str, str], float] = {}  # (フォルダ, ファイル名) -> 追加した時刻
+    latencies: List[float] = []
+    cycle_seconds: List[float] = []
+    errors: Dict[str, int] = {}
+    seq = 0
+
+    worker.start()
+    t_end = time.monotonic() + duration
+    next_inject = time.monotonic() + inject_every
+    try:
+        while time.monotonic() < t_end:
+            now = time.monotonic()
+            if inject_every > 0 and now >= next_inject:
+                seq += 1
+                folder = rng.choice(roots)
+                name = f"{LOADTEST_CODE}_injected{seq:06d}.txt"
+                fs.add_file(folder, name)
+                pending[(folder, name)] = now
+                next_inject += inject_every
+            try:
+                msg = q.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            if msg.get("type") != "scan_result":
+                continue
+            received = time.monotonic()
+            cycle_seconds.append(float(msg.get("elapsed") or 0.0))
+            for reason in (msg.get("errors") or {}).values():
+                errors[reason] = errors.get(reason, 0) + 1
+            hits = msg.get("hits") or {}
+            for key in [k for k in pending if k[1] in hits.get(k[0], ())]:
+                latencies.append(received - pending.pop(key))
+    finally:
+        worker.stop()
+        worker.join(5.0)
+    return {
+        "cycle_seconds": cycle_seconds,
+        "latencies": latencies,
+        "undelivered": len(pending),
+        "errors": errors,
+        "listings": fs.listings,
+        "stats": fs.stats,
+    }
+
+
+def _main(argv=None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="偽のファイルシステムに対する走査の負荷試験（実際の共有には触れない）")
+    parser.add_argument("--shares", type=int, default=20, help="監視フォルダ数")
+    parser.add_argument("--files", type=int, default=10000, help="監視フォルダ直下のファイル数")
+    parser.add_argument("--hit-every", type=int, default=1000, help="このファイル数に1件を担当ファイルにする")
+    parser.add_argument("--subdirs", type=int, default=0, help="サブフォルダ数（各階層）")
+    parser.add_argument("--depth", type=int, default=0, help="サブフォルダの階層数（0 は直下のみ）")
+    parser.add_argument("--sub-files", type=int, default=100, help="各サブフォルダのファイル数")
+    parser.add_argument("--latency", type=float, default=0.02, help="一覧1回の遅延(秒)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="遅延の揺らぎ(±秒)")
+    parser.add_argument("--stat-latency", type=float, default=0.0, help="stat 1回の遅延(秒)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="一覧が PermissionError になる確率")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="一覧が止まる確率")
+    parser.add_argument("--hang-seconds", type=float, default=10.0, help="止まる時間(秒)")
+    parser.add_argument("--engine-cycles", type=int, default=0, help="スケジューラを通さずエンジンだけをこの回数回す")
+    parser.add_argument("--interval", type=int, default=5, help="周期(秒)")
+    parser.add_argument("--duration", type=float, default=30, help="試験時間(秒)")
+    parser.add_argument("--inject-every", type=float, default=2, help="新しい担当ファイルを追加する間隔(秒、0 は追加しない)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    # 注入したエラーの警告を端末に出さない（結果は最後にまとめて表示する）
+    logging.getLogger(LOGGER_ROOT).addHandler(logging.NullHandler())
+
+    spec = FakeFolder(
+        files=args.files,
+        hit_every=args.hit_every,
+        subdirs=args.subdirs,
+        depth=args.depth,
+        sub_files=args.sub_files,
+        latency=args.latency,
+        jitter=args.jitter,
+        stat_latency=args.stat_latency,
+        fail_rate=args.fail_rate,
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+    )
+    fs, roots = build_fake_shares(args.shares, spec, seed=args.seed)
+    cfg = loadtest_config(roots, args.interval, args.depth)
+    print(f"shares={args.shares} folders={len(fs.folders())} files/share={args.files} latency={args.latency}s±{args.jitter}s")
+
+    if args.engine_cycles:
+        r = run_engine_cycles(fs, cfg, args.engine_cycles)
+        for i, (sec, n) in enumerate(zip(r["cycle_seconds"], r["listings"]), 1):
+            print(f"cycle {i}: {sec:.3f}s  一覧 {n}")
+        print(f"ヒット {r['hits']}  エラー {r['errors']}")
+        return
+
+    r = run_scheduled(fs, cfg, roots, args.duration, args.inject_every, seed=args.seed)
+    print(f"サイクル時間 : {_summary(r['cycle_seconds'])}")
+    print(f"通知遅延     : {_summary(r['latencies'])}  未通知 {r['undelivered']}")
+    print(f"一覧 {r['listings']} 回 / stat {r['stats']} 回")
+    for reason, n in sorted(r["errors"].items()):
+        print(f"エラー {n:5d}  {reason}")
+
+
+if __name__ == "__main__":
+    _main()
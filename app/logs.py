@@ -0,0 +1,121 @@
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+LOG_FILENAME = "watch_log.jsonl"
+# ハブはクライアントと同じPCで動くこともあるので別ファイル（ローテーションがぶつからないように）
+HUB_LOG_FILENAME = "watch_hub_log.jsonl"
+
+# ローテーション：1ファイルの上限と世代数（合計でも数MBに収まる）
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# サブシステムごとのロガー名（settings.log_levels のキー）
+#   monitor : 走査（周期 / 今すぐ1回）   hub : スキャンハブ
+#   ui      : Tk のコールバック         popup : 通知ポップアップ
+#   history : 通知履歴                 snapshot : 一覧スナップショット
+LOGGER_ROOT = "watcher"
+SUBSYSTEMS = ("monitor", "hub", "ui", "popup", "history", "snapshot")
+
+
+def get_logger(subsystem: str) -> logging.Logger:
+    return logging.getLogger(f"{LOGGER_ROOT}.{subsystem}")
+
+
+def fields(**kw: Any) -> Dict[str, Dict[str, Any]]:
+    """ログに添える項目。log.info("scan_finished", extra=fields(elapsed_ms=12.3)) のように使う"""
+    return {"fields": kw}
+
+
+class JsonFormatter(logging.Formatter):
+    """1件1行の JSON（ts / level / logger / thread / msg と、fields() で渡した項目）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        extra = getattr(record, "fields", None)
+        if isinstance(extra, Mapping):
+            for k, v in extra.items():
+                out.setdefault(k, v)
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+def _level(name: str, default: int = logging.INFO) -> int:
+    value = logging.getLevelName(str(name or "").upper())
+    return value if isinstance(value, int) else default
+
+
+def apply_levels(level: str = "INFO", levels: Optional[Mapping[str, str]] = None) -> None:
+    """全体の既定レベルと、サブシステムごとの上書き（{"monitor": "DEBUG"} など）を反映する"""
+    logging.getLogger(LOGGER_ROOT).setLevel(_level(level))
+    levels = levels or {}
+    for name in SUBSYSTEMS:
+        # 上書きがなければ NOTSET（= 全体の既定に従う）に戻す
+        get_logger(name).setLevel(_level(levels[name]) if name in levels else logging.NOTSET)
+
+
+class LogService:
+    """
+    非同期のログ出力。各スレッドは QueueHandler でキューに積むだけで、
+    ファイルへの書き込み（ローテーションを含む）は QueueListener のスレッドが行う。
+    走査スレッドや Tk スレッドがディスクの遅延で止まることはない。
+    """
+
+    def __init__(
+        self,
+        log_dir: Path,
+        level: str = "INFO",
+        levels: Optional[Mapping[str, str]] = None,
+        filename: str = LOG_FILENAME,
+    ):
+        self.path = log_dir / filename
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._handler: Optional[logging.Handler] = None
+        self._level = level
+        self._levels = dict(levels or {})
+
+    def start(self) -> bool:
+        """出力を始める。ログファイルを作れない場合は False（ログは捨てる、アプリは動かす）。"""
+        root = logging.getLogger(LOGGER_ROOT)
+        root.propagate = False
+        apply_levels(self._level, self._levels)
+        try:
+            file_handler = logging.handlers.RotatingFileHandler(
+                self.path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+            )
+        except OSError:
+            root.addHandler(logging.NullHandler())
+            return False
+        # JSON への整形は呼び出し側のスレッドで済ませ（例外の traceback もここで文字列になる）、
+        # リスナーのスレッドは書き込むだけにする
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        q: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        handler = logging.handlers.QueueHandler(q)
+        handler.setFormatter(JsonFormatter())
+        self._listener = logging.handlers.QueueListener(q, file_handler, respect_handler_level=False)
+        self._listener.start()
+        self._handler = handler
+        root.addHandler(handler)
+        return True
+
+    def stop(self) -> None:
+        """キューに残った分を書き出して止める（終了時に呼ぶ）"""
+        if self._handler is not None:
+            logging.getLogger(LOGGER_ROOT).removeHandler(self._handler)
+            self._handler = None
+        if self._listener is not None:
+            self._listener.stop()
+            for h in self._listener.handlers:
+                h.close()
+            self._listener = None
@@ -0,0 +1,181 @@
+import ctypes
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Deque, List, NamedTuple, Optional
+
+
+class MemorySample(NamedTuple):
+    ts: float
+    rss_bytes: Optional[int]
+    traced_bytes: Optional[int]  # tracemalloc 無効時は None
+    widget_count: int
+
+
+def current_rss_bytes() -> Optional[int]:
+    """
+    現在の常駐メモリ（取れない環境では None）。
+    macOS は現在値を取る手段が標準ライブラリにないため、ピーク値で代用する。
+    """
+    try:
+        if sys.platform == "win32":
+            return _win_rss()
+        if sys.platform.startswith("linux"):
+            with open("/proc/self/statm", "r", encoding="ascii") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        import resource
+
+        # macOS は bytes、その他 BSD 系は KB
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return None
+
+
+def _win_rss() -> Optional[int]:
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    handle = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+        return None
+    return int(counters.WorkingSetSize)
+
+
+def count_widgets(root) -> int:
+    """root 配下の Tk ウィジェット数（Toplevel を含む）"""
+    n = 0
+    stack = [root]
+    while stack:
+        w = stack.pop()
+        n += 1
+        try:
+            stack.extend(w.winfo_children())
+        except Exception:
+            continue
+    return n
+
+
+class MemoryMonitor:
+    """
+    常駐プロセスのメモリ推移を記録する。sample() は Tk スレッドから呼ぶこと（ウィジェット数を数えるため）。
+      - RSS とウィジェット数は毎回記録（軽い）
+      - tracemalloc 有効時はスナップショットを取り、前回との差分上位を保持
+      - 起動直後（基準値）からの RSS 増加が予算を超えたら on_budget_exceeded を1回だけ呼ぶ
+        （警告は起動中1回きり。基準値も起動直後のまま動かさない）
+    """
+
+    MAX_SAMPLES = 500
+    TOP_N = 15
+
+    def __init__(
+        self,
+        root,
+        budget_mb: int,
+        use_tracemalloc: bool = False,
+        on_budget_exceeded: Optional[Callable[[int], None]] = None,
+    ):
+        self.root = root
+        self.budget_mb = max(1, int(budget_mb))
+        self.on_budget_exceeded = on_budget_exceeded
+        self.samples: Deque[MemorySample] = deque(maxlen=self.MAX_SAMPLES)
+        self.top_diffs: List[str] = []
+        self.baseline_rss: Optional[int] = None
+        self._warned = False
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self.set_tracemalloc(use_tracemalloc)
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def set_tracemalloc(self, enabled: bool) -> None:
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._snapshot = None
+        elif not enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+            self._snapshot = None
+            self.top_diffs = []
+
+    def growth_bytes(self) -> Optional[int]:
+        if self.baseline_rss is None or not self.samples or self.samples[-1].rss_bytes is None:
+            return None
+        return self.samples[-1].rss_bytes - self.baseline_rss
+
+    def sample(self) -> MemorySample:
+        rss = current_rss_bytes()
+        traced: Optional[int] = None
+        if tracemalloc.is_tracing():
+            traced = tracemalloc.get_traced_memory()[0]
+            self._diff_snapshot()
+
+        s = MemorySample(time.time(), rss, traced, count_widgets(self.root))
+        self.samples.append(s)
+        if self.baseline_rss is None:
+            self.baseline_rss = rss
+
+        growth = self.growth_bytes()
+        if growth is not None and growth > self.budget_mb * 1024 * 1024 and not self._warned:
+            self._warned = True
+            if self.on_budget_exceeded is not None:
+                self.on_budget_exceeded(growth)
+        return s
+
+    def _diff_snapshot(self) -> None:
+        snap = tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            )
+        )
+        if self._snapshot is not None:
+            stats = snap.compare_to(self._snapshot, "lineno")
+            self.top_diffs = [str(st) for st in stats[: self.TOP_N]]
+        else:
+            stats = snap.statistics("lineno")
+            self.top_diffs = [str(st) for st in stats[: self.TOP_N]]
+        self._snapshot = snap
+
+    def format_report(self) -> str:
+        lines = [f"[memory] {datetime.now().isoformat(timespec='seconds')}"]
+        lines.append(f"budget: {self.budget_mb} MB / tracemalloc: {'on' if self.tracing else 'off'}")
+        growth = self.growth_bytes()
+        if growth is not None:
+            lines.append(f"growth since baseline: {growth / 1048576:.1f} MB")
+        lines.append("")
+        lines.append("time                 rss(MB)  traced(MB)  widgets")
+        for s in self.samples:
+            rss = f"{s.rss_bytes / 1048576:8.1f}" if s.rss_bytes is not None else "       -"
+            traced = f"{s.traced_bytes / 1048576:10.1f}" if s.traced_bytes is not None else "         -"
+            t = datetime.fromtimestamp(s.ts).isoformat(timespec="seconds")
+            lines.append(f"{t}  {rss}  {traced}  {s.widget_count:7d}")
+        if self.top_diffs:
+            lines.append("")
+            lines.append("top allocations (diff from previous snapshot):")
+            lines.extend(f"  {x}" for x in self.top_diffs)
+        return "\n".join(lines)
+
+    def dump(self, path: Path) -> Path:
+        path.write_text(self.format_report() + "\n", encoding="utf-8")
+        return path
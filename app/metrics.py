@@ -0,0 +1,259 @@
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 既定の待ち受け（外部には公開しない。集約側はこのPC上のエージェントから取る想定）
+METRICS_DEFAULT_HOST = "127.0.0.1"
+
+# 秒単位のヒストグラムの既定の区切り（ローカルディスク〜遅い NAS まで）
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# 通知遅延（ファイルが現れてから通知まで）の区切り。周期が分単位なので秒〜1日
+LATENCY_BUCKETS = (5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 900.0, 1800.0, 3600.0, 7200.0, 14400.0, 43200.0, 86400.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    # Windows のパス（\\server\share）をラベルにするので、バックスラッシュも忘れずに
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    value = float(value)
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class _Metric:
+    """
+    メトリクス1つ分。更新も出力も、このメトリクス専用のロックを一瞬だけ取る
+    （走査ループが長く持つロックには触らない）。
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {} if labels else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels_text(self.labels, k)} {_num(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), func: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {} if labels else {(): 0.0}
+        self._func = func
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def replace(self, values: Dict[str, float]) -> None:
+        """ラベル1つのゲージを丸ごと置き換える（監視対象から外れたフォルダを残さない）"""
+        with self._lock:
+            self._values = {(str(k),): float(v) for k, v in values.items()}
+
+    def set_function(self, func: Optional[Callable[[], float]]) -> None:
+        """出力のたびに func() の値を使う（キューの長さなど、数える側が別スレッドのもの）"""
+        self._func = func
+
+    def _samples(self) -> List[str]:
+        func = self._func
+        if func is not None:
+            try:
+                return [f"{self.name} {_num(func())}"]
+            except Exception:
+                return []
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels_text(self.labels, k)} {_num(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = SECONDS_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # ラベル値 -> (区切りごとの件数（累積ではない）, 合計, 件数)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, n = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[i] += 1
+            self._values[key] = (counts, total + value, n + 1)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s, n)) for k, (c, s, n) in self._values.items())
+        out: List[str] = []
+        for key, (counts, total, n) in items:
+            acc = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le = 'le="' + _num(bound) + '"'
+                out.append(f"{self.name}_bucket{_labels_text(self.labels, key, le)} {acc}")
+            out.append(f"{self.name}_sum{_labels_text(self.labels, key)} {_num(total)}")
+            out.append(f"{self.name}_count{_labels_text(self.labels, key)} {n}")
+        return out
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def _add(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = SECONDS_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        """Prometheus のテキスト形式（version 0.0.4）"""
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+# プロセス全体のメトリクス（更新は走査エンジン / MonitorWorker / ScanHub が行う）
+REGISTRY = MetricsRegistry()
+SCAN_CYCLE_SECONDS = REGISTRY.histogram(
+    "watcher_scan_cycle_seconds", "1サイクルの走査にかかった時間", labels=("trigger",)
+)
+SCAN_CYCLES = REGISTRY.counter("watcher_scan_cycles_total", "走査サイクル数", labels=("trigger", "result"))
+FOLDER_SCAN_SECONDS = REGISTRY.histogram(
+    "watcher_folder_scan_seconds", "監視フォルダ1つの走査（サブフォルダを含む）にかかった時間"
+)
+FOLDER_LAST_SCAN_SECONDS = REGISTRY.gauge(
+    "watcher_folder_last_scan_seconds", "監視フォルダごとの直近の走査時間", labels=("folder",)
+)
+DIRECTORIES_LISTED = REGISTRY.counter("watcher_directories_listed_total", "一覧したディレクトリ数（一覧を省略した分は含まない）")
+ENTRIES_LISTED = REGISTRY.counter("watcher_entries_listed_total", "一覧で読んだエントリ数")
+HITS = REGISTRY.gauge("watcher_hits", "直近の走査で検出したファイル数")
+PUSH_TRIGGERS = REGISTRY.counter("watcher_push_triggers_total", "外部からの臨時走査の依頼（IPC の scan）", labels=("status",))
+UNITS_DEFERRED = REGISTRY.gauge("watcher_scan_units_deferred", "直近の周期走査で、時間予算を超えたため次のサイクルに回した監視フォルダ数")
+SCAN_ERRORS = REGISTRY.counter("watcher_scan_errors_total", "監視フォルダにアクセスできなかった回数", labels=("reason",))
+QUEUE_DEPTH = REGISTRY.gauge("watcher_queue_depth", "UI へのイベントキュー / ハブの臨時走査待ちの長さ")
+SCHEDULE_LAG_SECONDS = REGISTRY.histogram(
+    "watcher_schedule_lag_seconds", "予定時刻から周期走査を始めるまでの遅れ"
+)
+# 通知遅延はフォルダ別とコード別に分けて持つ（フォルダ×コードの組み合わせで系列が増えないように）
+NOTIFY_LATENCY_BY_FOLDER_SECONDS = REGISTRY.histogram(
+    "watcher_notify_latency_by_folder_seconds",
+    "新規ヒットがフォルダに現れてから、結果をキューに積む（enqueued）/ ポップアップを出す（popup）までの時間（フォルダ別）",
+    labels=("stage", "folder"),
+    buckets=LATENCY_BUCKETS,
+)
+NOTIFY_LATENCY_BY_CODE_SECONDS = REGISTRY.histogram(
+    "watcher_notify_latency_by_code_seconds",
+    "新規ヒットがフォルダに現れてから、結果をキューに積む（enqueued）/ ポップアップを出す（popup）までの時間（コード別）",
+    labels=("stage", "code"),
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def _handler_class(registry: MetricsRegistry):
+    # http.server は待ち受けを始める時だけ import する（監視側は計数だけでこのモジュールを使う）
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            # pythonw（コンソールなし）では stderr が無いので書かない
+            pass
+
+    return MetricsHandler
+
+
+class MetricsServer:
+    """
+    GET /metrics に Prometheus のテキスト形式で答える HTTP サーバ（別スレッド）。
+    既定ではこのPC（127.0.0.1）からしか取れない。
+    """
+
+    def __init__(self, port: int, host: str = METRICS_DEFAULT_HOST, registry: MetricsRegistry = REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._server = None  # ThreadingHTTPServer
+
+    def start(self) -> bool:
+        """待ち受けを始める。ポートが使えなければ False。"""
+        from http.server import ThreadingHTTPServer
+
+        try:
+            server = ThreadingHTTPServer((self.host, self.port), _handler_class(self.registry))
+        except OSError:
+            return False
+        server.daemon_threads = True
+        self.port = server.server_address[1]
+        self._server = server
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return True
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
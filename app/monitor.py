@@ -1,115 +1,1349 @@
+import fnmatch
+import os
+import re
+import stat
 import threading
 import time
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Set, Tuple, Union
 
-from .config import AppConfig
+from .config import AppConfig, AppSettings, FilterSettings, WatchItem
 from .constants import STABLE_WAIT_SECONDS
+from .filters import EntryFilter, FilterSpec, build_filter_spec, compile_filter
+from .fsio import LOCAL_FS, FileSystem
+from .iobudget import IO_BUDGET, BudgetCancelled, TokenBucket, share_root
+from .latency import LATENCY, STAGE_ENQUEUED
+from .logs import fields, get_logger
+from .metrics import (
+    DIRECTORIES_LISTED,
+    ENTRIES_LISTED,
+    FOLDER_LAST_SCAN_SECONDS,
+    FOLDER_SCAN_SECONDS,
+    HITS,
+    SCAN_CYCLE_SECONDS,
+    SCAN_CYCLES,
+    PUSH_TRIGGERS,
+    SCAN_ERRORS,
+    SCHEDULE_LAG_SECONDS,
+    UNITS_DEFERRED,
+)
+from .rules import DEFAULT_RULE_TYPE, RULE_LABELS, CodeMatcher, Rule, normalize_rule_code
+from .schedule import ScanSchedule
+from .snapshot import SNAPSHOT_SAVE_SECONDS, read_snapshot, write_snapshot
 from .utils import (
-    extract_leading_3digit_code,
     folder_key,
     is_office_temp_file,
-    is_valid_dir,
 )
 
 
+_log = get_logger("monitor")
+
+# FAT/SMB のフォルダ更新日時は粒度が粗い（最大2秒）。
+# 一覧取得時刻との差がこれ未満のキャッシュは信用しない。
+_MTIME_SLACK_NS = 2_000_000_000
+
+
+
+class RawHit(NamedTuple):
+    """走査で見つかった1ファイル。サイズと更新日時は DirEntry の stat キャッシュから取る。"""
+
+    name: str  # 監視フォルダからの相対パス
+    rules: Tuple[Rule, ...]  # 一致したルール
+    size: int  # bytes（取得できなければ -1）
+    mtime: float  # 更新日時（epoch 秒、取得できなければ 0）
+
+
+class HitInfo(NamedTuple):
+    """UI に渡すヒットごとの付帯情報（ハブ経由では JSON の配列になる）"""
+
+    size: int
+    mtime: float
+    first_seen: float  # このプロセスが最初に検出した時刻（epoch 秒）
+
+# 進捗通知の最短間隔（秒）。フォルダ数が多くても queue を溢れさせない
+_PROGRESS_INTERVAL = 0.25
+
+# キャンセル確認の間隔（エントリ数）。大きなフォルダの一覧中でも止められるように
+_CANCEL_CHECK_ENTRIES = 256
+
+# 一覧をサイクルに分散する場合、間隔のこの割合で走査を終える（次のサイクルと重ならないように）
+_SPREAD_FRACTION = 0.8
+
+# 外部からの臨時走査の依頼：同じフォルダの走査はこの秒数に1回まで / 待たせておく依頼（フォルダ数）の上限
+_PUSH_MIN_INTERVAL = 5.0
+_PUSH_MAX_PENDING = 1000
+
+
+class ScanCancelled(Exception):
+    """走査がキャンセルされた（結果は破棄する）"""
+
+
+@dataclass(frozen=True)
+class ScanOptions:
+    """監視ユニットの走査オプション（WatchItem から作る。ハッシュ可能）"""
+
+    max_depth: int = 0  # 0 = フォルダ直下のみ
+    exclude_globs: Tuple[str, ...] = ()
+    filters: FilterSpec = FilterSpec()
+
+    def is_excluded(self, name: str, rel_path: str) -> bool:
+        if not self.exclude_globs:
+            return False
+        rx = _exclude_regex(self.exclude_globs)
+        return rx.match(name) is not None or rx.match(rel_path.replace(os.sep, "/")) is not None
+
+
+@lru_cache(maxsize=256)
+def _exclude_regex(globs: Tuple[str, ...]) -> "re.Pattern[str]":
+    return re.compile("|".join(fnmatch.translate(g) for g in globs), re.IGNORECASE)
+
+
+def scan_options_for(item: WatchItem, settings: AppSettings) -> ScanOptions:
+    spec = build_filter_spec(settings.filters, item.filters)
+    if not item.recursive:
+        return ScanOptions(filters=spec)
+    globs = tuple(sorted({g.strip() for g in item.exclude_globs if g and g.strip()}))
+    return ScanOptions(max_depth=max(1, int(item.max_depth)), exclude_globs=globs, filters=spec)
+
+
+class _DirState:
+    """サブフォルダ1つ分の前回走査結果（枝刈り用）"""
+
+    __slots__ = ("mtime_ns", "listed_at_ns", "hits", "subdirs")
+
+    def __init__(self, mtime_ns: int, listed_at_ns: int, hits: List[RawHit], subdirs: List[str]):
+        self.mtime_ns = mtime_ns
+        self.listed_at_ns = listed_at_ns
+        # サイズ条件がある場合は「名前条件を通過した候補」を持ち、再利用時にサイズだけ再判定する
+        # （中身の書き込みではフォルダ更新日時が変わらないため）
+        self.hits = hits
+        self.subdirs = subdirs
+
+    def is_fresh(self, mtime_ns: int) -> bool:
+        return mtime_ns == self.mtime_ns and (self.listed_at_ns - mtime_ns) >= _MTIME_SLACK_NS
+
+
+def _entry_mtime_ns(entry: os.DirEntry) -> Optional[int]:
+    # Windows では scandir の結果にキャッシュ済み（追加の stat なし）
+    try:
+        return entry.stat(follow_symlinks=False).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _entry_stat(entry: os.DirEntry) -> Tuple[int, float]:
+    # Windows では scandir の結果にキャッシュ済み（追加の stat なし）。
+    # それ以外でもヒットしたファイルだけが対象で、サイズフィルタと同じキャッシュを共有する
+    try:
+        st = entry.stat()
+    except OSError:
+        return -1, 0.0
+    return st.st_size, st.st_mtime
+
+
+def _state_to_json(state: _DirState) -> list:
+    return [
+        state.mtime_ns,
+        state.listed_at_ns,
+        state.subdirs,
+        [[hit.name, [list(r) for r in hit.rules], hit.size, hit.mtime] for hit in state.hits],
+    ]
+
+
+def _state_from_json(data: list) -> _DirState:
+    mtime_ns, listed_at_ns, subdirs, hits = data
+    return _DirState(
+        int(mtime_ns),
+        int(listed_at_ns),
+        [RawHit(str(name), tuple((str(t), str(c)) for t, c in rules), int(size), float(mtime)) for name, rules, size, mtime in hits],
+        [str(name) for name in subdirs],
+    )
+
+
+def _cache_key_text(cache_key: tuple) -> str:
+    # スナップショット上のキー。ScanOptions / FilterSpec は frozen dataclass なので repr が安定している
+    fkey, opts, rules = cache_key
+    return repr((fkey, opts, tuple(sorted(rules))))
+
+
+def _refresh_hits(fs: FileSystem, folder: str, hits: List[RawHit], flt: EntryFilter) -> List[RawHit]:
+    """
+    一覧を省略したサブフォルダの前回ヒットを、サイズ条件で判定し直す（サイズ条件があるときだけ呼ぶ）。
+    中身の書き込みではフォルダ更新日時が変わらないので、サイズ・更新日時はヒットだけ stat し直す。
+    """
+    out: List[RawHit] = []
+    for hit in hits:
+        try:
+            st = fs.stat(os.path.join(folder, hit.name))
+        except OSError:
+            continue
+        if flt.accept_size(st.st_size):
+            out.append(hit._replace(size=st.st_size, mtime=st.st_mtime))
+    return out
+
+
+UnitKey = Tuple[str, ScanOptions]  # (フォルダキー, 走査オプション)
+
+
+@dataclass
+class ScanPlan:
+    """1サイクルで走査するユニットの一覧（WatchItem 群から作る）"""
+
+    units: Dict[UnitKey, Set[Rule]] = field(default_factory=dict)
+    folder_original: Dict[str, str] = field(default_factory=dict)
+    # ピン留め（WatchItem.pinned）の監視対象を含むユニット
+    pinned: Set[UnitKey] = field(default_factory=set)
+
+    def add(self, item: WatchItem, settings: AppSettings, fs: FileSystem = LOCAL_FS) -> Optional[UnitKey]:
+        f = item.folder.strip()
+        if not f or not fs.is_dir(f):
+            return None
+        key = folder_key(f)
+        # 同一フォルダでも走査オプションが違えば別ユニット（通常は1フォルダ1ユニット）
+        ukey = (key, scan_options_for(item, settings))
+        self.units.setdefault(ukey, set()).add((item.rule_type, item.code))
+        self.folder_original.setdefault(key, f)
+        if item.pinned:
+            self.pinned.add(ukey)
+        return ukey
+
+    def display(self, fkey: str) -> str:
+        return self.folder_original.get(fkey, fkey)
+
+
+def build_scan_plan(items: Iterable[WatchItem], settings: AppSettings, fs: FileSystem = LOCAL_FS) -> ScanPlan:
+    plan = ScanPlan()
+    for it in items:
+        if (not it.is_deleted) and it.is_active:
+            plan.add(it, settings, fs)
+    return plan
+
+
+class UnitResult(NamedTuple):
+    """ScanEngine.iter_scan() がユニット1つを走査し終えるたびに返す結果"""
+
+    ukey: UnitKey
+    folder: str  # 表示用のフォルダ
+    hits: List[RawHit]  # error があるときは空
+    error: Optional[str]  # アクセスできなかった理由（画面に出す文言）
+
+
+def collapse_hits(plan: ScanPlan, unit_hits: Dict[UnitKey, List[RawHit]]) -> Dict[str, List[str]]:
+    """ユニット単位のヒットを、従来通りの {表示用フォルダ: [ファイル名, ...]} にまとめる"""
+    hits: Dict[str, List[str]] = {}
+    for (fkey, _opts), found in unit_hits.items():
+        if found:
+            hits.setdefault(plan.display(fkey), []).extend(hit.name for hit in found)
+    for k in list(hits.keys()):
+        hits[k] = sorted(set(hits[k]))
+    return hits
+
+
+def collapse_hit_codes(plan: ScanPlan, unit_hits: Dict[UnitKey, List[RawHit]]) -> Dict[str, Dict[str, List[str]]]:
+    """ヒットごとの一致コード {表示用フォルダ: {ファイル名: [コード, ...]}}（履歴の記録用）"""
+    codes: Dict[str, Dict[str, Set[str]]] = {}
+    for (fkey, _opts), found in unit_hits.items():
+        if not found:
+            continue
+        per_file = codes.setdefault(plan.display(fkey), {})
+        for hit in found:
+            per_file.setdefault(hit.name, set()).update(code for _rule_type, code in hit.rules)
+    return {folder: {name: sorted(cs) for name, cs in per_file.items()} for folder, per_file in codes.items()}
+
+
+def collapse_hit_info(
+    plan: ScanPlan, unit_hits: Dict[UnitKey, List[RawHit]], first_seen: "FirstSeen"
+) -> Dict[str, Dict[str, HitInfo]]:
+    """ヒットごとの付帯情報 {表示用フォルダ: {ファイル名: HitInfo}}"""
+    info: Dict[str, Dict[str, HitInfo]] = {}
+    for (fkey, _opts), found in unit_hits.items():
+        if not found:
+            continue
+        per_file = info.setdefault(plan.display(fkey), {})
+        for hit in found:
+            per_file[hit.name] = HitInfo(hit.size, hit.mtime, first_seen.get(fkey, hit.name))
+    return info
+
+
+def collapse_appeared(
+    plan: ScanPlan, unit_hits: Dict[UnitKey, List[RawHit]], appeared: Dict[str, Dict[str, float]]
+) -> Dict[str, Dict[str, float]]:
+    """AppearanceEstimator.estimate() の結果のうち unit_hits にあるものを {表示用フォルダ: {ファイル名: 時刻}} にする"""
+    out: Dict[str, Dict[str, float]] = {}
+    for (fkey, _opts), found in unit_hits.items():
+        per_file = appeared.get(fkey)
+        if not per_file:
+            continue
+        for hit in found:
+            if hit.name in per_file:
+                out.setdefault(plan.display(fkey), {})[hit.name] = per_file[hit.name]
+    return out
+
+
+class FirstSeen:
+    """
+    ヒットを最初に検出した時刻。走査したフォルダで見つからなくなったものは忘れる
+    （保持するのは現在ヒットしている分だけなので、常駐しても増え続けない）。
+    """
+
+    __slots__ = ("_seen",)
+
+    def __init__(self):
+        self._seen: Dict[str, Dict[str, float]] = {}
+
+    def update(self, unit_hits: Dict[UnitKey, List[RawHit]], now: float) -> None:
+        current: Dict[str, Dict[str, float]] = {}
+        for (fkey, _opts), found in unit_hits.items():
+            before = self._seen.get(fkey, {})
+            per_file = current.setdefault(fkey, {})
+            for hit in found:
+                per_file[hit.name] = before.get(hit.name, now)
+        # 今回走査しなかったフォルダ（臨時走査の対象外）はそのまま残す
+        self._seen.update(current)
+
+    def forget_except(self, fkeys: Iterable[str]) -> None:
+        keep = set(fkeys)
+        for fkey in [k for k in self._seen if k not in keep]:
+            del self._seen[fkey]
+
+    def get(self, fkey: str, name: str) -> float:
+        return self._seen.get(fkey, {}).get(name, 0.0)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {fkey: dict(per_file) for fkey, per_file in self._seen.items()}
+
+    def restore(self, data: Dict[str, Dict[str, float]]) -> None:
+        try:
+            self._seen = {str(fkey): {str(n): float(t) for n, t in per_file.items()} for fkey, per_file in data.items()}
+        except (AttributeError, TypeError, ValueError):
+            self._seen = {}
+
+
+class AppearanceEstimator:
+    """
+    新規ヒットがフォルダに現れた時刻の推定（通知遅延の計測用）。
+    基本はファイルの更新日時だが、コピーでは古い日時が残るので、前回そのフォルダを問題なく走査した
+    サイクルの開始時刻より前にはしない（その時点で有れば前回検出されている）。
+    前回の走査が無いフォルダ（起動直後・追加直後）のヒットは推定しない。
+    """
+
+    __slots__ = ("_scanned_at",)
+
+    def __init__(self):
+        self._scanned_at: Dict[str, float] = {}
+
+    def estimate(
+        self,
+        plan: ScanPlan,
+        unit_hits: Dict[UnitKey, List[RawHit]],
+        errors: Dict[str, str],
+        first_seen: FirstSeen,
+        started: float,
+        now: float,
+        partial: bool = False,
+        scanned: Optional[Set[str]] = None,
+    ) -> Dict[str, Dict[str, float]]:
+        """
+        今回初めて検出したヒット（first_seen が now のもの）の {フォルダキー: {ファイル名: 現れた時刻}}。
+        first_seen.update(unit_hits, now) の後に呼ぶ。表示用には collapse_appeared() でまとめる。
+        scanned は今回実際に走査したフォルダキー（時間予算で次に回したフォルダを除く。None は plan の全て）。
+        """
+        appeared: Dict[str, Dict[str, float]] = {}
+        for (fkey, _opts), found in unit_hits.items():
+            since = self._scanned_at.get(fkey)
+            if since is None:
+                continue
+            for hit in found:
+                if first_seen.get(fkey, hit.name) != now:
+                    continue
+                appeared.setdefault(fkey, {})[hit.name] = min(now, max(hit.mtime, since))
+        if not partial:
+            self._scanned_at = {k: v for k, v in self._scanned_at.items() if k in plan.folder_original}
+        for fkey in plan.folder_original:
+            if fkey not in errors and (scanned is None or fkey in scanned):
+                self._scanned_at[fkey] = started
+        return appeared
+
+
+# 直近この秒数以内に新しいヒットのあったユニットは、時間予算のあるサイクルで先に走査する
+_RECENT_HIT_SECONDS = 3600.0
+
+
+class ScanCursor:
+    """
+    時間予算（settings.scan_cycle_budget_seconds）のある周期走査の順序と、次に回したユニットの前回の結果。
+    ピン留め → 直近 _RECENT_HIT_SECONDS 以内に新しいヒットのあったもの → その他 の順で、それぞれの中では
+    最後に走査してから長いもの（未走査が最初）から走査する。予算切れで残ったユニットは次のサイクルで
+    「最後に走査してから長いもの」として前に来るので、そこが続きの位置になる。
+    """
+
+    __slots__ = ("_scanned_at", "_hit_at", "_last")
+
+    def __init__(self):
+        self._scanned_at: Dict[UnitKey, float] = {}
+        self._hit_at: Dict[UnitKey, float] = {}
+        self._last: Dict[UnitKey, UnitResult] = {}
+
+    def order(self, plan: ScanPlan, now: float) -> ScanPlan:
+        """plan のユニットを走査する順に並べ替えた計画"""
+
+        def key(ukey: UnitKey) -> Tuple[bool, bool, float]:
+            recent = now - self._hit_at.get(ukey, float("-inf")) <= _RECENT_HIT_SECONDS
+            return (ukey not in plan.pinned, not recent, self._scanned_at.get(ukey, float("-inf")))
+
+        units = {ukey: plan.units[ukey] for ukey in sorted(plan.units, key=key)}
+        return ScanPlan(units=units, folder_original=plan.folder_original, pinned=plan.pinned)
+
+    def record(self, result: UnitResult, now: float) -> None:
+        self._scanned_at[result.ukey] = now
+        # 「ヒットのあった」は前回の走査に無かったヒットが出たこと（ヒットが残っているだけのフォルダは先にしない）
+        before = self._last.get(result.ukey)
+        if before is not None and {hit.name for hit in result.hits} - {hit.name for hit in before.hits}:
+            self._hit_at[result.ukey] = now
+        self._last[result.ukey] = result
+
+    def carried(self, plan: ScanPlan, scanned: Set[UnitKey]) -> List[UnitResult]:
+        """今回走査しなかったユニットの前回の結果（まだ一度も走査していないユニットは無し）"""
+        return [self._last[ukey] for ukey in plan.units if ukey not in scanned and ukey in self._last]
+
+    def retain(self, plan: ScanPlan) -> None:
+        for d in (self._scanned_at, self._hit_at, self._last):
+            for ukey in [k for k in d if k not in plan.units]:
+                del d[ukey]
+
+
+class ScanEngine:
+    """
+    走査本体。サブフォルダ枝刈り用のキャッシュを持つので、同じ呼び出し元（スレッド）で使い回す。
+    一覧と stat は fs を通す（負荷試験では偽のファイルシステムを渡す）。
+    """
+
+    def __init__(self, fs: FileSystem = LOCAL_FS):
+        self.fs = fs
+        # (フォルダキー, 走査オプション, ルール) -> {パス: 状態}
+        self._tree_cache: Dict[tuple, Dict[str, _DirState]] = {}
+        # 直近の走査で実際に一覧したディレクトリ数（一覧を省略したサブフォルダは含まない）と、読んだエントリ数
+        self.last_listings = 0
+        self.last_entries = 0
+        # 直近の走査でアクセスできなかったフォルダの理由（メトリクスの reason ラベル）
+        self.last_error_reasons: Dict[str, str] = {}
+        # 前回終了時のスナップショット（_cache_key_text -> {パス: 状態}）。次の全体走査で確認し終えたら捨てる
+        self._warm: Dict[str, Dict[str, _DirState]] = {}
+
+    def import_snapshot(self, units: list) -> int:
+        """export_snapshot() の結果を読み込む。読み込めたユニット数を返す（壊れたユニットは読み飛ばす）。"""
+        warm: Dict[str, Dict[str, _DirState]] = {}
+        for unit in units:
+            try:
+                warm[str(unit["key"])] = {str(path): _state_from_json(st) for path, st in unit["states"].items()}
+            except (KeyError, TypeError, ValueError, AttributeError):
+                continue
+        self._warm = warm
+        return len(warm)
+
+    def export_snapshot(self) -> list:
+        """枝刈り用キャッシュを JSON にできる形で返す（まだ確認していないスナップショット分も含める）"""
+        units = []
+        written: Set[str] = set()
+        for cache_key, states in self._tree_cache.items():
+            text = _cache_key_text(cache_key)
+            written.add(text)
+            units.append({"key": text, "states": {path: _state_to_json(st) for path, st in states.items()}})
+        for text, states in self._warm.items():
+            if text not in written:
+                units.append({"key": text, "states": {path: _state_to_json(st) for path, st in states.items()}})
+        return units
+
+    def warm_hits(self, plan: ScanPlan) -> Dict[UnitKey, List[RawHit]]:
+        """スナップショット時点のヒット（I/O なし。起動直後の表示用）"""
+        unit_hits: Dict[UnitKey, List[RawHit]] = {}
+        for ukey, rules in plan.units.items():
+            states = self._warm.get(_cache_key_text((ukey[0], ukey[1], frozenset(rules))))
+            if not states:
+                continue
+            flt = compile_filter(ukey[1].filters)
+            unit_hits[ukey] = [hit for st in states.values() for hit in st.hits if flt.accept_size(hit.size)]
+        return unit_hits
+
+    def _warm_has_hits(self, ukey: UnitKey, rules: Set[Rule]) -> bool:
+        states = self._warm.get(_cache_key_text((ukey[0], ukey[1], frozenset(rules))))
+        return bool(states) and any(st.hits for st in states.values())
+
+    def warm_first(self, units: List[Tuple[UnitKey, Set[Rule]]]) -> List[Tuple[UnitKey, Set[Rule]]]:
+        """起動直後の確認は、前回ヒットのあったフォルダから（表示中の結果を早く確定させる）"""
+        if not self._warm:
+            return units
+        return sorted(units, key=lambda u: not self._warm_has_hits(u[0], u[1]))
+
+    def retain(self, plan: ScanPlan) -> None:
+        """plan に無いユニットのキャッシュとスナップショットを捨てる（ユニットごとに partial で走査した後の全体走査の締め）"""
+        keep = {(fkey, opts, frozenset(rules)) for (fkey, opts), rules in plan.units.items()}
+        self._tree_cache = {k: v for k, v in self._tree_cache.items() if k in keep}
+        self._warm.clear()
+
+    def scan(
+        self,
+        plan: ScanPlan,
+        partial: bool = False,
+        cancel: Optional[threading.Event] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+        pace: Optional[TokenBucket] = None,
+    ) -> Tuple[Dict[UnitKey, List[RawHit]], Dict[str, str]]:
+        """
+        戻り値：(ユニットごとのヒット [(相対パス, 一致ルール), ...], {フォルダキー: エラー理由})
+        iter_scan() を最後まで回してまとめたもの。引数の意味も同じ。
+        """
+        unit_hits: Dict[UnitKey, List[RawHit]] = {}
+        errors: Dict[str, str] = {}
+        for r in self.iter_scan(plan, partial, cancel, progress, pace):
+            if r.error is None:
+                unit_hits[r.ukey] = r.hits
+            else:
+                errors[r.ukey[0]] = r.error
+        return unit_hits, errors
+
+    def iter_scan(
+        self,
+        plan: ScanPlan,
+        partial: bool = False,
+        cancel: Optional[threading.Event] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+        pace: Optional[TokenBucket] = None,
+    ) -> Iterator[UnitResult]:
+        """
+        plan のユニットを順に走査し、1つ終えるたびに UnitResult を返す（遅いフォルダを待たずに結果を使える）。
+        partial=True は一部のユニットだけの臨時走査（他ユニットのキャッシュを捨てない）。
+        cancel がセットされたらフォルダの区切り / 一覧中 _CANCEL_CHECK_ENTRIES 件ごとに ScanCancelled を送出する。
+        progress(済んだユニット数, 全ユニット数) は各フォルダの走査前に呼ぶ。
+        一覧のたびにプロセス全体の I/O 予算（IO_BUDGET）を取り、pace があればこの走査だけの速度制限もかける。
+        キャンセル・途中で close() した場合は、走査を終えたフォルダのキャッシュだけを残す（partial と同じ扱い）。
+        """
+        next_cache: Dict[tuple, Dict[str, _DirState]] = {}
+        total = len(plan.units)
+        self.last_listings = 0
+        self.last_entries = 0
+        self.last_error_reasons = {}
+        folder_seconds: Dict[str, float] = {}
+        finished = False
+
+        try:
+            for done, (ukey, rules) in enumerate(self.warm_first(list(plan.units.items()))):
+                if cancel is not None and cancel.is_set():
+                    raise ScanCancelled()
+                if progress is not None:
+                    progress(done, total)
+                folder = plan.display(ukey[0])
+                t0 = time.perf_counter()
+                listings, entries = self.last_listings, self.last_entries
+                try:
+                    found, error = self._scan_folder(ukey, rules, folder, next_cache, cancel, pace)
+                finally:
+                    elapsed = time.perf_counter() - t0
+                    FOLDER_SCAN_SECONDS.observe(elapsed)
+                    folder_seconds[folder] = elapsed
+                    DIRECTORIES_LISTED.inc(self.last_listings - listings)
+                    ENTRIES_LISTED.inc(self.last_entries - entries)
+                yield UnitResult(ukey, folder, found, error)
+            finished = True
+        finally:
+            if finished and not partial:
+                # 今回走査しなかったユニットのキャッシュは捨てる
+                self._tree_cache = next_cache
+                self._warm.clear()
+                FOLDER_LAST_SCAN_SECONDS.replace(folder_seconds)
+            else:
+                self._tree_cache.update(next_cache)
+
+    def _scan_folder(
+        self,
+        ukey: UnitKey,
+        rules: Set[Rule],
+        folder: str,
+        next_cache: Dict[tuple, Dict[str, _DirState]],
+        cancel: Optional[threading.Event],
+        pace: Optional[TokenBucket],
+    ) -> Tuple[List[RawHit], Optional[str]]:
+        """ユニット1つを走査する。戻り値：(ヒット, アクセスできなかった理由 or None)"""
+        fkey, opts = ukey
+        try:
+            # フォルダにアクセスできるか（この stat の更新日時で、起動直後は直下の一覧も省略できる）
+            try:
+                root_st = self.fs.stat(folder)
+            except FileNotFoundError:
+                self._count_error(fkey, "not_found")
+                _log.warning("folder_not_found", extra=fields(folder=folder))
+                return [], "フォルダが存在しません。"
+            if not stat.S_ISDIR(root_st.st_mode):
+                self._count_error(fkey, "not_dir")
+                _log.warning("folder_not_dir", extra=fields(folder=folder))
+                return [], "フォルダではありません。"
+
+            cache_key = (fkey, opts, frozenset(rules))
+            cache = self._tree_cache.get(cache_key)
+            warm_text = None
+            if cache is None and self._warm:
+                warm_text = _cache_key_text(cache_key)
+                cache = self._warm.get(warm_text)
+            found, dir_states = self._walk_folder(
+                folder,
+                CodeMatcher(rules),
+                opts,
+                cache or {},
+                cancel,
+                share_root(folder),
+                pace,
+                root_mtime_ns=root_st.st_mtime_ns,
+                trust_root=warm_text is not None and cache is not None,
+            )
+            if warm_text is not None:
+                self._warm.pop(warm_text, None)
+            if dir_states:
+                next_cache[cache_key] = dir_states
+            return found, None
+        except BudgetCancelled:
+            raise ScanCancelled()
+        except PermissionError as e:
+            self._count_error(fkey, "permission")
+            _log.warning("folder_access_denied", extra=fields(folder=folder, error=str(e)))
+            return [], "アクセス権限がありません"
+        except OSError as e:
+            self._count_error(fkey, e.__class__.__name__)
+            # 画面には種類だけ出すので、errno / winerror などの詳細はログに残す
+            _log.warning(
+                "folder_access_failed",
+                extra=fields(folder=folder, error=e.__class__.__name__, errno=e.errno, winerror=getattr(e, "winerror", None), detail=str(e)),
+            )
+            return [], f"フォルダにアクセスできません: {e.__class__.__name__}"
+
+    def _count_error(self, fkey: str, reason: str) -> None:
+        self.last_error_reasons[fkey] = reason
+        SCAN_ERRORS.inc(reason=reason)
+
+    def _walk_folder(
+        self,
+        folder: str,
+        matcher: CodeMatcher,
+        opts: ScanOptions,
+        cache: Dict[str, _DirState],
+        cancel: Optional[threading.Event] = None,
+        root: str = "",
+        pace: Optional[TokenBucket] = None,
+        root_mtime_ns: Optional[int] = None,
+        trust_root: bool = False,
+    ) -> Tuple[List[RawHit], Dict[str, _DirState]]:
+        """
+        scandir ベースの反復走査（再帰呼び出しなし）。
+        - 監視フォルダ直下は毎回一覧する（VBA互換）。ただし trust_root=True（起動直後のスナップショット）では
+          サブフォルダと同じく、更新日時が変わっていなければ一覧を省略する
+        - サブフォルダは前回からフォルダ更新日時が変わっていなければ一覧を省略し、
+          前回のヒットとサブフォルダ一覧を使い回す（stat 1回で済む）
+        - 監視フォルダ直下の一覧エラーは呼び出し側へ送出、サブフォルダのエラーは読み飛ばす
+        """
+        found: List[RawHit] = []
+        states: Dict[str, _DirState] = {}
+        flt: EntryFilter = compile_filter(opts.filters)
+
+        # (絶対パス, 相対パス, 深さ, 既知の mtime_ns)
+        stack: List[Tuple[str, str, int, Optional[int]]] = [(folder, "", 0, root_mtime_ns)]
+        countdown = _CANCEL_CHECK_ENTRIES
+        while stack:
+            if cancel is not None and cancel.is_set():
+                raise ScanCancelled()
+            path, rel, depth, mtime_ns = stack.pop()
+
+            if depth > 0 or trust_root:
+                if mtime_ns is None:
+                    try:
+                        mtime_ns = self.fs.stat(path).st_mtime_ns
+                    except OSError:
+                        continue
+                cached = cache.get(path)
+                if cached is not None and cached.is_fresh(mtime_ns):
+                    states[path] = cached
+                    if flt.needs_stat:
+                        found.extend(_refresh_hits(self.fs, folder, cached.hits, flt))
+                    else:
+                        # サイズ条件がなければ stat しない（サイズ・更新日時は一覧した時点の値）
+                        found.extend(cached.hits)
+                    for name in cached.subdirs:
+                        stack.append((os.path.join(path, name), os.path.join(rel, name), depth + 1, None))
+                    continue
+
+            if pace is not None:
+                pace.acquire(cancel)
+            listed_at_ns = self.fs.time_ns()
+            dir_hits: List[RawHit] = []
+            size_candidates: List[RawHit] = []
+            subdirs: List[str] = []
+            subdir_mtimes: List[Optional[int]] = []
+            self.last_listings += 1
+            try:
+                # scandir 自体が PermissionError を出す場合もある
+                with IO_BUDGET.listing(root or share_root(folder), cancel), self.fs.scandir(path) as it:
+                    for entry in it:
+                        countdown -= 1
+                        if countdown <= 0:
+                            countdown = _CANCEL_CHECK_ENTRIES
+                            self.last_entries += _CANCEL_CHECK_ENTRIES
+                            if cancel is not None and cancel.is_set():
+                                raise ScanCancelled()
+                        name = entry.name
+                        if entry.is_dir():
+                            if depth < opts.max_depth and not entry.is_symlink() and not opts.is_excluded(name, os.path.join(rel, name)):
+                                subdirs.append(name)
+                                subdir_mtimes.append(_entry_mtime_ns(entry))
+                            continue
+                        # 安い判定から順に：Office一時ファイル → コード照合 → 名前フィルタ → サイズ
+                        if is_office_temp_file(name):
+                            continue
+                        matched = matcher.match(name)
+                        if not matched:
+                            continue
+                        if not flt.accept_name(name):
+                            continue
+                        size, mtime = _entry_stat(entry)
+                        hit = RawHit(os.path.join(rel, name) if rel else name, matched, size, mtime)
+                        if flt.needs_stat:
+                            size_candidates.append(hit)
+                            if size < 0 or not flt.accept_size(size):
+                                continue
+                        dir_hits.append(hit)
+            except OSError:
+                if depth == 0:
+                    raise
+                continue
+
+            found.extend(dir_hits)
+            # 直下の状態も持つ（次回は一覧するが、スナップショットに残して起動直後に使う）
+            if mtime_ns is not None:
+                states[path] = _DirState(mtime_ns, listed_at_ns, size_candidates if flt.needs_stat else dir_hits, subdirs)
+            for name, sub_mtime in zip(subdirs, subdir_mtimes):
+                stack.append((os.path.join(path, name), os.path.join(rel, name), depth + 1, sub_mtime))
+
+        # エントリ数は確認の区切りごとに数えている（1件ごとの加算はしない）ので、残りを足す
+        self.last_entries += _CANCEL_CHECK_ENTRIES - countdown
+        return found, states
+
+
+class HitRecord(NamedTuple):
+    """iter_hits() が返すヒット1件"""
+
+    folder: str  # 監視フォルダ（folders_to_codes のキー）
+    name: str  # 監視フォルダからの相対パス
+    codes: Tuple[str, ...]  # 一致したコード
+    size: int  # bytes（取得できなければ -1）
+    mtime: float  # 更新日時（epoch 秒、取得できなければ 0）
+
+
+class ErrorRecord(NamedTuple):
+    """iter_hits() が返す、走査できなかった監視フォルダ"""
+
+    folder: str
+    reason: str  # 画面に出すのと同じ文言
+
+
+def iter_hits(
+    folders_to_codes: Mapping[str, Iterable[Union[str, Rule]]],
+    *,
+    recursive: bool = False,
+    max_depth: int = 1,
+    exclude_globs: Sequence[str] = (),
+    filters: Optional[FilterSettings] = None,
+    where: Sequence[Callable[[HitRecord], bool]] = (),
+    cancel: Optional[threading.Event] = None,
+    engine: Optional[ScanEngine] = None,
+) -> Iterator[Union[HitRecord, ErrorRecord]]:
+    """
+    スクリプト・他のツールから使う走査 API。監視フォルダを1つ走査し終えるたびに、その HitRecord / ErrorRecord を返す
+    （全フォルダを待たずに最初のヒットを使える。途中で抜けてもよい）。
+
+        for rec in iter_hits({"S:/受付": ["123", ("prefix", "AB")]}, recursive=True, max_depth=2):
+            if isinstance(rec, ErrorRecord):
+                print(rec.folder, rec.reason)
+            else:
+                print(rec.folder, rec.name, rec.codes)
+
+    コードは文字列なら既定のルール（VBA互換3桁）、(ルール種別, コード) ならそのルールで照合する。
+    不正なルール種別・コードは ValueError。
+    recursive / max_depth / exclude_globs は監視対象の設定と同じ。filters は事前フィルタ（拡張子・除外パターン・サイズ）で、
+    一覧の段階で絞る。where は HitRecord の述語の並びで、全てが真のヒットだけを返す（事前フィルタで書けない条件用）。
+    存在しない・フォルダでないパスは最初に ErrorRecord で返す。
+    cancel がセットされたら ScanCancelled を送出する。engine を渡して使い回すと、2回目以降は変わっていない
+    サブフォルダの一覧を省略する（既定はその都度ローカルのファイルシステムで新しく作る）。
+    """
+    if engine is None:
+        engine = ScanEngine()
+    settings = AppSettings(filters=filters or FilterSettings())
+    plan = ScanPlan()
+    missing: List[str] = []
+    for folder, codes in folders_to_codes.items():
+        for c in [codes] if isinstance(codes, str) else codes:
+            rule_type, raw = c if isinstance(c, tuple) else (DEFAULT_RULE_TYPE, c)
+            if rule_type not in RULE_LABELS:
+                raise ValueError(f"ルール種別が不正です: {rule_type!r}")
+            code = normalize_rule_code(rule_type, str(raw))
+            if code is None:
+                raise ValueError(f"コードが不正です: {raw!r}")
+            item = WatchItem(
+                id="",
+                code=code,
+                folder=folder,
+                rule_type=rule_type,
+                recursive=recursive,
+                max_depth=max_depth,
+                exclude_globs=list(exclude_globs),
+            )
+            if plan.add(item, settings, engine.fs) is None and folder not in missing:
+                missing.append(folder)
+
+    for folder in missing:
+        yield ErrorRecord(folder, "フォルダが存在しません。")
+    for r in engine.iter_scan(plan, cancel=cancel):
+        if r.error is not None:
+            yield ErrorRecord(r.folder, r.error)
+            continue
+        for hit in r.hits:
+            rec = HitRecord(r.folder, hit.name, tuple(code for _rule_type, code in hit.rules), hit.size, hit.mtime)
+            if all(accept(rec) for accept in where):
+                yield rec
+
+
+def _loose_path(path: str) -> str:
+    # I/O なしで比べる用（folder_key は resolve するので、止まった共有では待たされることがある）
+    return os.path.normpath(path.strip()).upper()
+
+
+def match_watched_folder(plan: ScanPlan, path: str) -> Optional[str]:
+    """
+    path を走査するユニットのフォルダキー（監視フォルダそのもの、またはサブフォルダ監視の階層内）。無ければ None。
+    I/O はしない（設定に書かれたフォルダの文字列と比べる）。
+    """
+    target = _loose_path(path)
+    found: Optional[str] = None
+    for fkey, opts in plan.units:
+        root = _loose_path(plan.display(fkey)).rstrip(os.sep)
+        if target == root:
+            return fkey
+        if opts.max_depth and target.startswith(root + os.sep):
+            if target[len(root) + 1 :].count(os.sep) + 1 <= opts.max_depth:
+                found = fkey
+    return found
+
+
+class PushQueue:
+    """
+    外部からの臨時走査の依頼（MonitorWorker.trigger）。待っている間に来た同じフォルダへの依頼は1回にまとめ、
+    同じフォルダの走査は min_interval 秒に1回まで（書き込みが続く間の依頼の嵐で一覧を繰り返さない）。
+    """
+
+    def __init__(self, min_interval: float = _PUSH_MIN_INTERVAL, max_pending: int = _PUSH_MAX_PENDING):
+        self.min_interval = min_interval
+        self.max_pending = max_pending
+        self.wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pending: Set[str] = set()
+        # フォルダキー -> 最後に走査を始めた時刻（time.monotonic）。min_interval を過ぎたら忘れる
+        self._last: Dict[str, float] = {}
+
+    def add(self, fkey: str) -> str:
+        """"queued" / "merged"（同じフォルダの依頼が待っている）/ "busy"（待たせている依頼が多すぎる）"""
+        with self._lock:
+            if fkey in self._pending:
+                return "merged"
+            if len(self._pending) >= self.max_pending:
+                return "busy"
+            self._pending.add(fkey)
+        self.wake.set()
+        return "queued"
+
+    def take_due(self, now: float) -> Tuple[Set[str], Optional[float]]:
+        """今走査してよいフォルダを取り出す。戻り値：(フォルダキー, 次に走査できるようになるまでの秒数 or None)"""
+        with self._lock:
+            self._last = {k: t for k, t in self._last.items() if now - t < self.min_interval}
+            due = {k for k in self._pending if k not in self._last}
+            self._pending -= due
+            for k in due:
+                self._last[k] = now
+            wait = min((self._last[k] + self.min_interval - now for k in self._pending), default=None)
+        return due, wait
+
+
+class _Flight:
+    """
+    実行中の1回分の走査。同時に1つだけで、走査中に来た依頼はこの結果を受け取る。
+    キャンセル済みの走査と、一部のフォルダだけの走査（targets）には相乗りせず、終わるのを待ってから次の走査を始める（after）。
+    """
+
+    __slots__ = ("show_nohit", "generation", "cancel", "done", "after", "pace", "trigger", "targets")
+
+    def __init__(
+        self,
+        show_nohit: bool,
+        generation: int,
+        after: "Optional[_Flight]" = None,
+        trigger: str = "periodic",
+        targets: Optional[Set[str]] = None,
+    ):
+        self.show_nohit = show_nohit
+        self.generation = generation
+        self.trigger = trigger  # メトリクスのラベル（"periodic" / "manual" / "push"）
+        # 外部からの依頼（trigger="push"）で走査するフォルダキー。他のフォルダは前回の結果を出す
+        self.targets = targets
+        self.cancel = threading.Event()
+        self.done = threading.Event()
+        self.after = after
+        # 周期の走査を間隔全体に分散するときの速度制限（臨時の依頼が相乗りしたら解除する）
+        self.pace = TokenBucket(0)
+
+
 class MonitorWorker:
     """
     バックグラウンドで周期監視し、結果はUI側が渡した queue に dict を put する。
+    周期の走査も「今すぐ1回実行」も外部からの依頼（trigger）も同じ single-flight を通るので、走査が同時に2本走ることはない。
+      - {"type": "scan_progress", "done": 済んだフォルダ数, "total": 全フォルダ数, "hits": ここまでのヒット数, "generation": 世代}
+        generation が現在の generation と違うもの（stop() 前に積まれたもの）は UI 側で捨てる
+        走査は ScanEngine.iter_scan() の流れで受け取るので、ヒット数は済んだフォルダの分
+      - {"type": "scan_result", "hits", "errors", "codes", "info", "appeared", "show_nohit", "elapsed"}
+        appeared は今回初めて検出したヒットが現れた時刻の推定（AppearanceEstimator。通知遅延の計測用）
+        deferred は時間予算を超えたため / 外部からの依頼（trigger）の対象外のため走査せず、前回の結果を出したフォルダ
+      - {"type": "scan_cancelled"} / {"type": "scan_failed"}（想定外のエラー。詳細はログ）
+      - {"type": "scan_result", ..., "cached": True, "saved_at"}  load_snapshot() 後の起動直後に1回だけ。
+        前回終了時点の結果で、続く実際の走査で確認し直す
+
+    stop() は世代（generation）を進めて実行中の走査をキャンセルする。
+    古い世代の走査結果は queue に出さないので、停止直後に開始し直しても古いスレッドと混ざらない。
     """
 
-    def __init__(self, get_config_callable, event_queue):
+    # 実行中の走査を cancel_scan() で止められるか（UI のキャンセルボタンを出すか）
+    can_cancel = True
+
+    def __init__(self, get_config_callable, event_queue, fs: FileSystem = LOCAL_FS, engine: Optional[ScanEngine] = None):
         self._get_config = get_config_callable
         self._q = event_queue
+        # engine を渡した場合（isolation.ProcessScanEngine）は fs ではなく、そのエンジンのファイルシステムを使う
+        self._engine = engine if engine is not None else ScanEngine(fs)
+        self._fs = self._engine.fs
+        # 周期監視スレッドごとに専用の停止イベントを持つ（古いスレッドは自分のイベントで止まる）
         self._stop = threading.Event()
+        self._stop.set()
         self._thread: Optional[threading.Thread] = None
+        self._first_seen = FirstSeen()
+        self._appearance = AppearanceEstimator()
+        self._cursor = ScanCursor()
+        # 外部からの臨時走査の依頼と、それを走査するスレッド。照合には直近の走査計画を使う
+        self._push = PushQueue()
+        self._push_thread: Optional[threading.Thread] = None
+        self._plan: Optional[ScanPlan] = None
+        # 直近の周期・臨時の走査（一部のフォルダだけの走査を除く）の一覧数。分散の速さの基準
+        self._cycle_listings = 0
+        self._flight_lock = threading.Lock()
+        self._flight: Optional[_Flight] = None
+        self._flight_thread: Optional[threading.Thread] = None
+        self._generation = 0
+        # 初回の遅延を「今すぐ1回実行」で打ち切るための合図
+        self._kick = threading.Event()
+        # 任意：CycleProfiler（UI側が設定に応じて差し込む）
+        self.profiler = None
+        # 任意：trace.TraceRecorder（記録するには fs も recorder.wrap() したものを渡す）
+        self.recorder = None
+        # 一覧スナップショットの保存先（load_snapshot() で決まる）
+        self._snapshot_path: Optional[Path] = None
+        self._snapshot_saved_at = 0.0
+        self._snapshot_cached_at: Optional[float] = None
+
+    def load_snapshot(self, path: Path) -> bool:
+        """
+        前回終了時の一覧スナップショットを読み込む（start() の前に呼ぶ）。
+        最初の周期スレッドが、その時点のヒットを cached つきの scan_result としてすぐ出し、
+        続く初回走査では更新日時が変わっていないフォルダを stat だけで確認する。
+        以後は定期的に / save_snapshot() で同じファイルに保存する。
+        """
+        self._snapshot_path = path
+        self._snapshot_saved_at = time.monotonic()
+        data = read_snapshot(path)
+        if data is None or not self._engine.import_snapshot(data.get("units") or []):
+            return False
+        self._first_seen.restore(data.get("first_seen") or {})
+        self._snapshot_cached_at = float(data["saved_at"])
+        return True
+
+    def save_snapshot(self) -> bool:
+        """
+        一覧スナップショットを保存する。走査中のエンジンには触らないので、
+        走査スレッドの中か、stop() + join() で止まったのを確かめてから呼ぶ。
+        """
+        payload = self._snapshot_payload()
+        return payload is not None and self._write_snapshot(payload)
+
+    def _snapshot_payload(self) -> Optional[dict]:
+        if self._snapshot_path is None:
+            return None
+        self._snapshot_saved_at = time.monotonic()
+        return self._engine_state()
+
+    def _engine_state(self) -> dict:
+        return {"units": self._engine.export_snapshot(), "first_seen": self._first_seen.snapshot()}
+
+    def _write_snapshot(self, payload: dict) -> bool:
+        path = self._snapshot_path
+        return path is not None and write_snapshot(path, payload)
 
     def start(self) -> None:
-        if self._thread and self._thread.is_alive():
+        if self._thread and self._thread.is_alive() and not self._stop.is_set():
             return
-        self._stop.clear()
-        self._thread = threading.Thread(target=self._run, daemon=True)
+        stop = threading.Event()
+        self._stop = stop
+        self._thread = threading.Thread(target=self._run, args=(stop,), daemon=True)
         self._thread.start()
+        self._push_thread = threading.Thread(target=self._run_push, args=(stop,), daemon=True)
+        self._push_thread.start()
 
     def stop(self) -> None:
         self._stop.set()
+        self._push.wake.set()
+        with self._flight_lock:
+            self._generation += 1
+            if self._flight is not None:
+                self._flight.cancel.set()
 
-    def run_once(self, show_nohit: bool = True) -> None:
-        cfg: AppConfig = self._get_config()
-        hits, errors = self._scan_once(cfg)
-        self._q.put({"type": "scan_result", "hits": hits, "errors": errors, "show_nohit": show_nohit})
+    def join(self, timeout: float) -> bool:
+        """stop() 後のスレッド終了を最大 timeout 秒待つ。全て終わったら True。"""
+        deadline = time.monotonic() + timeout
+        threads = (self._thread, self._flight_thread, self._push_thread)
+        for t in threads:
+            if t is not None and t.is_alive():
+                t.join(max(0.0, deadline - time.monotonic()))
+        return not any(t is not None and t.is_alive() for t in threads)
 
-    def _run(self) -> None:
-        # 監視開始直後の1回（VBA互換）
-        cfg: AppConfig = self._get_config()
-        hits, errors = self._scan_once(cfg)
-        self._q.put({"type": "scan_result", "hits": hits, "errors": errors, "show_nohit": True})
+    def run_once(self, show_nohit: bool = True) -> bool:
+        """
+        臨時の走査を依頼する（呼び出し元は待たない。Tk スレッドから呼んでよい）。
+        走査中なら新たには走査せず、実行中の走査の結果を show_nohit つきで受け取る。
+        新しく走査を開始したら True。
+        """
+        self._kick.set()
+        flight, owner = self._join_or_begin(show_nohit, trigger="manual")
+        if owner:
+            t = threading.Thread(target=self._fly, args=(flight,), daemon=True)
+            self._flight_thread = t
+            t.start()
+        return owner
 
-        while not self._stop.is_set():
-            cfg = self._get_config()
-            interval = max(1, int(cfg.settings.interval_seconds))
+    def trigger(self, folder: str, name: str = "") -> str:
+        """
+        外部からの臨時走査の依頼（IPC の "scan"。どのスレッドから呼んでもよい）。
+        folder（監視フォルダか、サブフォルダ監視の階層内のフォルダ）を含む監視フォルダだけをすぐ走査し、
+        通常の scan_result で結果を出す（他のフォルダは前回の結果）。name は書き込んだファイル名（ログ用）。
+        戻り値："queued" / "merged" / "busy"（PushQueue.add）、"not_watched"（監視対象外）、
+        "not_ready"（初回の走査の計画がまだ無い）、"stopped"（監視停止中）
+        """
+        plan = self._plan
+        if self._stop.is_set():
+            status = "stopped"
+        elif plan is None:
+            status = "not_ready"
+        else:
+            fkey = match_watched_folder(plan, folder)
+            status = "not_watched" if fkey is None else self._push.add(fkey)
+        PUSH_TRIGGERS.inc(status=status)
+        _log.info("push_trigger", extra=fields(folder=folder, file=name or None, status=status))
+        return status
 
-            end = time.time() + interval
-            while time.time() < end:
-                if self._stop.is_set():
-                    return
-                time.sleep(0.2)
+    @property
+    def generation(self) -> int:
+        """stop() のたびに進む世代（scan_progress の generation と比べる）"""
+        return self._generation
 
-            cfg = self._get_config()
-            hits, errors = self._scan_once(cfg)
-            # 通常サイクル 0件は無通知（VBA互換）
-            self._q.put({"type": "scan_result", "hits": hits, "errors": errors, "show_nohit": False})
+    def cancel_scan(self) -> None:
+        with self._flight_lock:
+            if self._flight is not None:
+                self._flight.cancel.set()
 
-    def _scan_once(self, cfg: AppConfig) -> Tuple[Dict[str, List[str]], Dict[str, str]]:
-        active_items = [x for x in cfg.items if (not x.is_deleted) and x.is_active]
-        if not active_items:
-            return {}, {}
+    def _join_or_begin(self, show_nohit: bool, trigger: str = "periodic") -> Tuple[_Flight, bool]:
+        with self._flight_lock:
+            current = self._flight
+            if current is not None and not current.cancel.is_set() and current.targets is None:
+                if show_nohit:
+                    # 待っている人がいるので分散をやめて急ぐ
+                    current.show_nohit = True
+                    current.pace.configure(0)
+                return current, False
+            self._flight = _Flight(show_nohit, self._generation, after=current, trigger=trigger)
+            return self._flight, True
 
-        folder_to_codes: Dict[str, Set[str]] = {}
-        folder_original: Dict[str, str] = {}
+    def _scan_and_put(self, show_nohit: bool) -> None:
+        # 周期監視のスレッドから呼ぶ。臨時の走査が実行中ならその結果を待つだけにする
+        flight, owner = self._join_or_begin(show_nohit)
+        if owner:
+            self._fly(flight)
+        else:
+            flight.done.wait()
 
-        for it in active_items:
-            f = it.folder.strip()
-            if not f or not is_valid_dir(f):
-                continue
-            key = folder_key(f)
-            folder_to_codes.setdefault(key, set()).add(it.code)
-            folder_original[key] = f
+    def _fly(self, flight: _Flight) -> None:
+        try:
+            if flight.after is not None:
+                # キャンセル済みの前の走査がエンジンを手放すのを待つ（キャンセル確認は短い間隔なのですぐ終わる）
+                flight.after.done.wait()
+                flight.after = None
+            cfg: AppConfig = self._get_config()
+            if self.recorder is not None:
+                self.recorder.begin_cycle(self._fs, cfg, self._engine_state)
+            t0 = time.perf_counter()
+            failed = False
+            try:
+                if self.profiler is not None:
+                    result = self.profiler.run(self._scan_once, cfg, flight)
+                else:
+                    result = self._scan_once(cfg, flight)
+                cancelled = False
+            except ScanCancelled:
+                cancelled = True
+            except Exception:
+                # 想定外の失敗でも周期監視のスレッドは止めない（原因はログに残す）
+                _log.exception("scan_failed", extra=fields(trigger=flight.trigger))
+                cancelled = failed = True
+            elapsed = time.perf_counter() - t0
+            outcome = "failed" if failed else "cancelled" if cancelled else "ok"
+            _log.info(
+                "scan_finished",
+                extra=fields(
+                    trigger=flight.trigger,
+                    result=outcome,
+                    elapsed_ms=round(elapsed * 1000, 1),
+                    listings=self._engine.last_listings,
+                    entries=self._engine.last_entries,
+                    hits=0 if cancelled else sum(len(v) for v in result["hits"].values()),
+                    errors=0 if cancelled else len(result["errors"]),
+                ),
+            )
+            SCAN_CYCLE_SECONDS.observe(elapsed, trigger=flight.trigger)
+            SCAN_CYCLES.inc(trigger=flight.trigger, result=outcome)
+            snapshot = None
+            if (
+                not cancelled
+                and self._snapshot_path is not None
+                and time.monotonic() - self._snapshot_saved_at >= SNAPSHOT_SAVE_SECONDS
+            ):
+                # 異常終了に備えて定期的に保存する。中身はエンジンを手放す前に取り出し、書き込みは結果を出してから
+                snapshot = self._snapshot_payload()
 
-        hits: Dict[str, List[str]] = {}
-        errors: Dict[str, str] = {}
+            # ここ以降に来た依頼は次の走査になる
+            with self._flight_lock:
+                show_nohit = flight.show_nohit
+                stale = flight.generation != self._generation
+                if self._flight is flight:
+                    self._flight = None
+            if self.recorder is not None:
+                self.recorder.end_cycle(flight.trigger, outcome, elapsed, None if cancelled else result, show_nohit)
+            if stale:
+                # stop() より前に始まった走査の結果は捨てる
+                return
+            if cancelled:
+                self._q.put({"type": "scan_failed" if failed else "scan_cancelled"})
+                return
+            result.update({"type": "scan_result", "show_nohit": show_nohit, "elapsed": elapsed})
+            self._q.put(result)
+            LATENCY.observe_result(result, STAGE_ENQUEUED)
+            if snapshot is not None:
+                self._write_snapshot(snapshot)
+        finally:
+            with self._flight_lock:
+                if self._flight is flight:
+                    self._flight = None
+            flight.done.set()
 
-        for fkey, codes in folder_to_codes.items():
-            folder = folder_original.get(fkey, fkey)
-            p = Path(folder)
+    def _progress_reporter(
+        self, flight: Optional[_Flight], found: Optional[Dict[UnitKey, List[RawHit]]] = None
+    ) -> Callable[[int, int], None]:
+        last = [0.0]
 
-            # フォルダにアクセスできるか
-            try:
-                if not p.exists():
-                    errors[folder] = "フォルダが存在しません。"
-                    continue
-                if not p.is_dir():
-                    errors[folder] = "フォルダではありません。"
-                    continue
+        def report(done: int, total: int) -> None:
+            if flight is not None and flight.generation != self._generation:
+                return
+            now = time.monotonic()
+            if done and now - last[0] < _PROGRESS_INTERVAL:
+                return
+            last[0] = now
+            msg = {"type": "scan_progress", "done": done, "total": total}
+            if flight is not None:
+                msg["generation"] = flight.generation
+            if found is not None:
+                msg["hits"] = sum(len(v) for v in found.values())
+            self._q.put(msg)
 
-                # iterdir自体が PermissionError を出す場合もある
-                for child in p.iterdir():
-                    if child.is_dir():
-                        continue
-                    name = child.name
-                    if is_office_temp_file(name):
-                        continue
+        return report
 
-                    code = extract_leading_3digit_code(name)
-                    if code and (code in codes):
-                        hits.setdefault(folder, []).append(name)
-            except PermissionError:
-                errors[folder] = "アクセス権限がありません"
-                continue
-            except OSError as e:
-                errors[folder] = f"フォルダにアクセスできません: {e.__class__.__name__}"
-                continue
-            
-        for k in list(hits.keys()):
-            hits[k] = sorted(set(hits[k]))
-        return hits, errors
+    def _put_cached(self) -> None:
+        # スナップショットの結果は最初の1回だけ出す（停止→再開では出さない）
+        saved_at, self._snapshot_cached_at = self._snapshot_cached_at, None
+        if saved_at is None:
+            return
+        cfg: AppConfig = self._get_config()
+        plan = build_scan_plan(cfg.items, cfg.settings, self._fs)
+        unit_hits = self._engine.warm_hits(plan)
+        self._q.put(
+            {
+                "type": "scan_result",
+                "hits": collapse_hits(plan, unit_hits),
+                "errors": {},
+                "codes": collapse_hit_codes(plan, unit_hits),
+                "info": collapse_hit_info(plan, unit_hits, self._first_seen),
+                "show_nohit": False,
+                "elapsed": 0.0,
+                "cached": True,
+                "saved_at": saved_at,
+            }
+        )
+
+    def _run(self, stop: threading.Event) -> None:
+        # 前回終了時の結果をまず出し、下の初回走査で確認し直す
+        self._put_cached()
+        # 監視開始直後の1回（VBA互換）。初回の遅延が設定されていれば待つが、「今すぐ1回実行」で打ち切る
+        delay = ScanSchedule.from_settings(self._get_config().settings).initial_delay()
+        if delay and self._wait_initial(stop, delay):
+            return
+        last_start = time.time()
+        if not (delay and self._kick.is_set()):
+            # 遅延中に run_once された場合は、その走査が初回を兼ねる
+            self._scan_and_put(show_nohit=True)
+
+        while not stop.is_set():
+            # 多数のPCが同じ共有を同時に一覧しないよう、ホストごとの位相 + 揺らぎで次の時刻を決める
+            schedule = ScanSchedule.from_settings(self._get_config().settings)
+            target = schedule.next_after(last_start, time.time())
+            if stop.wait(max(0.0, target - time.time())):
+                return
+            SCHEDULE_LAG_SECONDS.observe(max(0.0, time.time() - target))
+
+            # 通常サイクル 0件は無通知（VBA互換）
+            last_start = time.time()
+            self._scan_and_put(show_nohit=False)
+
+    def _run_push(self, stop: threading.Event) -> None:
+        # 依頼のあったフォルダを、実行中の走査が終わるのを待ってからまとめて走査する
+        wait: Optional[float] = None
+        while not stop.is_set():
+            self._push.wake.wait(wait)
+            self._push.wake.clear()
+            if stop.is_set():
+                return
+            flight = None
+            with self._flight_lock:
+                current = self._flight
+                if current is None:
+                    targets, wait = self._push.take_due(time.monotonic())
+                    if targets:
+                        flight = _Flight(False, self._generation, trigger="push", targets=targets)
+                        self._flight = flight
+            if current is not None:
+                # 実行中の走査がそのフォルダを一覧し終えた後に書かれたかもしれないので、終わってから走査し直す
+                current.done.wait()
+                self._push.wake.set()
+            elif flight is not None:
+                self._fly(flight)
+                self._push.wake.set()
+
+    def _wait_initial(self, stop: threading.Event, delay: float) -> bool:
+        """初回の遅延を待つ。停止されたら True。run_once が呼ばれたらすぐ抜ける。"""
+        self._kick.clear()
+        deadline = time.monotonic() + delay
+        while not self._kick.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if stop.wait(min(0.2, remaining)):
+                return True
+        return stop.is_set()
+
+    def _scan_once(self, cfg: AppConfig, flight: Optional[_Flight] = None) -> dict:
+        """scan_result の中身（hits / errors / codes / info / appeared / deferred）を作る。フォルダごとの結果を走査の流れで集める"""
+        st = cfg.settings
+        IO_BUDGET.configure(st.io_listings_per_second, st.io_concurrent_per_share)
+        targets = flight.targets if flight is not None else None
+        periodic = flight is not None and not flight.show_nohit and targets is None
+        if periodic and st.io_spread_cycles and self._cycle_listings:
+            # 前回の一覧数をもとに、間隔の _SPREAD_FRACTION で終わる速さに抑える
+            flight.pace.configure(self._cycle_listings / (max(1, int(st.interval_seconds)) * _SPREAD_FRACTION))
+
+        plan = build_scan_plan(cfg.items, st, self._fs)
+        self._plan = plan
+        started = time.time()
+        # 時間予算は周期の走査だけ（起動直後・今すぐ1回は待っている人がいるので最後まで走査する）
+        budget = st.scan_cycle_budget_seconds if periodic else 0
+        deadline = time.monotonic() + budget if budget else None
+        if targets is not None:
+            scan_plan = ScanPlan(
+                units={ukey: rules for ukey, rules in plan.units.items() if ukey[0] in targets},
+                folder_original=plan.folder_original,
+                pinned=plan.pinned,
+            )
+        else:
+            scan_plan = self._cursor.order(plan, started) if budget else plan
+        unit_hits: Dict[UnitKey, List[RawHit]] = {}
+        errors: Dict[str, str] = {}
+        scanned: Set[UnitKey] = set()
+        stream = self._engine.iter_scan(
+            scan_plan,
+            partial=targets is not None,
+            cancel=flight.cancel if flight is not None else None,
+            progress=self._progress_reporter(flight, unit_hits),
+            pace=flight.pace if flight is not None else None,
+        )
+        try:
+            for r in stream:
+                scanned.add(r.ukey)
+                self._cursor.record(r, time.time())
+                if r.error is not None:
+                    errors[r.ukey[0]] = r.error
+                else:
+                    unit_hits[r.ukey] = r.hits
+                if deadline is not None and time.monotonic() >= deadline and len(scanned) < len(plan.units):
+                    break
+        finally:
+            # 途中で抜けた場合も、走査し終えたフォルダのキャッシュはここで残す
+            stream.close()
+        self._cursor.retain(plan)
+        if targets is None:
+            self._cycle_listings = self._engine.last_listings
+
+        # 予算切れで次に回したフォルダ・依頼の無かったフォルダは前回の結果のまま出す
+        deferred = self._cursor.carried(plan, scanned)
+        for r in deferred:
+            if r.error is not None:
+                errors[r.ukey[0]] = r.error
+            else:
+                unit_hits[r.ukey] = r.hits
+        if budget:
+            UNITS_DEFERRED.set(len(plan.units) - len(scanned))
+            if len(scanned) < len(plan.units):
+                _log.info(
+                    "scan_budget_exhausted",
+                    extra=fields(budget=budget, scanned=len(scanned), deferred=len(plan.units) - len(scanned)),
+                )
+        now = time.time()
+        self._first_seen.update(unit_hits, now)
+        self._first_seen.forget_except(plan.folder_original)
+        HITS.set(sum(len(found) for found in unit_hits.values()))
+        return {
+            "hits": collapse_hits(plan, unit_hits),
+            "errors": {plan.display(k): v for k, v in errors.items()},
+            "codes": collapse_hit_codes(plan, unit_hits),
+            "info": collapse_hit_info(plan, unit_hits, self._first_seen),
+            "appeared": collapse_appeared(
+                plan,
+                unit_hits,
+                self._appearance.estimate(
+                    plan,
+                    unit_hits,
+                    errors,
+                    self._first_seen,
+                    started,
+                    now,
+                    partial=targets is not None,
+                    scanned={ukey[0] for ukey in scanned},
+                ),
+            ),
+            "deferred": sorted({plan.display(fkey) for fkey, _opts in set(plan.units) - scanned}),
+        }
@@ -0,0 +1,29 @@
+from typing import Dict, List, Optional
+
+NOHIT_TITLE = "(監視結果)"
+NOHIT_LINE = "該当ファイルはありませんでした。"
+ACCESS_ERROR_TITLE = "(アクセスできないフォルダ)"
+
+
+def notification_for(
+    hits: Dict[str, List[str]],
+    errors: Dict[str, str],
+    show_nohit: bool,
+    notify_access_errors: bool,
+) -> Optional[Dict[str, List[str]]]:
+    """
+    scan_result 1件からポップアップに出す内容を決める（出さない場合は None）。
+      - ヒットがあればヒットだけ（VBA互換）
+      - 通常サイクルの0件は無通知。アクセスエラーの通知が有効なら、エラーだけ出す
+      - 起動直後 / 今すぐ1回（show_nohit）の0件は「該当なし」（+ アクセスエラー）
+    UI とトレースの再生（trace.replay）で同じ判定を使う。
+    """
+    if hits:
+        return hits
+    lines = [f"{folder}：{reason}" for folder, reason in errors.items()] if errors and notify_access_errors else []
+    if not show_nohit:
+        return {ACCESS_ERROR_TITLE: lines} if lines else None
+    content = {NOHIT_TITLE: [NOHIT_LINE]}
+    if lines:
+        content[ACCESS_ERROR_TITLE] = lines
+    return content
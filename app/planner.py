@@ -0,0 +1,266 @@
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .config import AppConfig, WatchItem
+from .fsio import LOCAL_FS, FileSystem
+from .iobudget import IO_BUDGET
+from .monitor import ScanEngine, ScanPlan, UnitKey
+from .rules import rule_display
+
+# 周期の走査はこの割合の時間で終わるのが目安（io_spread_cycles の分散と同じ）
+PLAN_TARGET_FRACTION = 0.8
+
+# 監視フォルダごとの注意の目安
+PLAN_HITS_WARN = 100  # ヒット数（ポップアップが長くなる）
+PLAN_DIRS_WARN = 500  # 初回に一覧するディレクトリ数（サブフォルダ監視）
+PLAN_ENTRIES_WARN = 100_000  # 初回に読むエントリ数
+
+
+class FolderCost(NamedTuple):
+    """監視フォルダ（ユニット）1つの見積もり。初回 = キャッシュなし、2回目以降 = 変更がない場合"""
+
+    folder: str
+    rules: Tuple[str, ...]  # 表示用のコード
+    max_depth: int  # 0 = フォルダ直下のみ
+    candidate: bool  # まだ設定にない（追加予定）
+    cold_listings: int
+    cold_entries: int
+    cold_stats: int
+    cold_seconds: float
+    warm_listings: int
+    warm_stats: int
+    warm_seconds: float
+    hits: int
+    error: Optional[str]
+    warnings: Tuple[str, ...]
+
+
+class PlanReport(NamedTuple):
+    folders: List[FolderCost]
+    missing: List[str]  # フォルダとして見つからず、計画に入らなかったもの
+    interval_seconds: int
+    io_listings_per_second: float
+    io_concurrent_per_share: int
+    cycle_budget_seconds: int
+    cold_seconds: float  # サイクル時間の見込み（一覧の上限を含む）
+    warm_seconds: float
+    warnings: List[str]
+
+
+class _CountingFileSystem(FileSystem):
+    """stat の回数を数える（一覧の回数・エントリ数は ScanEngine が数えている）"""
+
+    def __init__(self, inner: FileSystem):
+        self.inner = inner
+        self.stats = 0
+
+    def time_ns(self) -> int:
+        return self.inner.time_ns()
+
+    def stat(self, path: str) -> os.stat_result:
+        self.stats += 1
+        return self.inner.stat(path)
+
+    def scandir(self, path: str):
+        return self.inner.scandir(path)
+
+    def is_dir(self, path: str) -> bool:
+        return self.inner.is_dir(path)
+
+
+def _cycle_seconds(seconds: float, listings: int, rate: float) -> float:
+    # 一覧の上限があれば、一覧数 / 上限 より速くは終わらない
+    return max(seconds, listings / rate) if rate > 0 else seconds
+
+
+def _folder_warnings(cost: FolderCost, interval: int) -> Tuple[str, ...]:
+    out: List[str] = []
+    if cost.error is not None:
+        out.append(f"アクセスできません：{cost.error}")
+    if cost.hits >= PLAN_HITS_WARN:
+        out.append(f"ヒット {cost.hits}件：ポップアップが長くなります。コードか事前フィルタ（拡張子・サイズ）で絞ってください")
+    if cost.max_depth and cost.cold_listings >= PLAN_DIRS_WARN:
+        out.append(f"サブフォルダ {cost.cold_listings}個を一覧します：最大階層を浅くするか、除外フォルダを指定してください")
+    if cost.cold_entries >= PLAN_ENTRIES_WARN:
+        out.append(f"エントリ {cost.cold_entries:,}件：事前フィルタや除外フォルダで一覧の対象を減らしてください")
+    if cost.warm_seconds >= interval * PLAN_TARGET_FRACTION:
+        out.append(f"このフォルダだけで {cost.warm_seconds:.1f}秒かかります：間隔を長くしてください")
+    return tuple(out)
+
+
+def estimate_costs(
+    cfg: AppConfig,
+    fs: FileSystem = LOCAL_FS,
+    extra: Iterable[WatchItem] = (),
+    cancel: Optional[threading.Event] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> PlanReport:
+    """
+    設定の監視対象（と extra の追加予定の監視対象）を、実際の走査エンジンで2回一覧して費用を見積もる。
+    1回目はキャッシュなし（起動直後・追加直後）、2回目は変更がない場合（枝刈りが効いた定常状態）の費用。
+    一覧は設定の I/O 予算（IO_BUDGET）に従う。cancel がセットされたら monitor.ScanCancelled を送出する。
+    """
+    st = cfg.settings
+    IO_BUDGET.configure(st.io_listings_per_second, st.io_concurrent_per_share)
+    counting = _CountingFileSystem(fs)
+    plan = ScanPlan()
+    missing: List[str] = []
+    candidates = set()
+    extra_ids = set()
+    items = [it for it in cfg.items if it.is_active and not it.is_deleted]
+    for it in extra:
+        extra_ids.add(id(it))
+        items.append(it)
+    for it in items:
+        ukey = plan.add(it, st, counting)
+        if ukey is None:
+            missing.append(it.folder)
+        elif id(it) in extra_ids:
+            candidates.add(ukey)
+
+    engine = ScanEngine(counting)
+    passes: List[Dict[UnitKey, tuple]] = []
+    total = len(plan.units)
+    for n in range(2):
+        per: Dict[UnitKey, tuple] = {}
+        listings = entries = 0
+        stats = counting.stats
+        t = time.perf_counter()
+        report = None if progress is None else (lambda done, _total, n=n: progress(n * total + done, 2 * total))
+        for r in engine.iter_scan(plan, cancel=cancel, progress=report):
+            now = time.perf_counter()
+            per[r.ukey] = (
+                engine.last_listings - listings,
+                engine.last_entries - entries,
+                counting.stats - stats,
+                now - t,
+                r,
+            )
+            listings, entries, stats, t = engine.last_listings, engine.last_entries, counting.stats, now
+        passes.append(per)
+
+    cold, warm = passes
+    interval = max(1, int(st.interval_seconds))
+    folders: List[FolderCost] = []
+    for ukey, rules in plan.units.items():
+        c_listings, c_entries, c_stats, c_seconds, result = cold[ukey]
+        w_listings, _w_entries, w_stats, w_seconds, _ = warm[ukey]
+        cost = FolderCost(
+            folder=result.folder,
+            rules=tuple(sorted(rule_display(rule_type, code) for rule_type, code in rules)),
+            max_depth=ukey[1].max_depth,
+            candidate=ukey in candidates,
+            cold_listings=c_listings,
+            cold_entries=c_entries,
+            cold_stats=c_stats,
+            cold_seconds=c_seconds,
+            warm_listings=w_listings,
+            warm_stats=w_stats,
+            warm_seconds=w_seconds,
+            hits=len(result.hits),
+            error=result.error,
+            warnings=(),
+        )
+        folders.append(cost._replace(warnings=_folder_warnings(cost, interval)))
+
+    rate = st.io_listings_per_second
+    cold_seconds = _cycle_seconds(sum(f.cold_seconds for f in folders), sum(f.cold_listings for f in folders), rate)
+    warm_seconds = _cycle_seconds(sum(f.warm_seconds for f in folders), sum(f.warm_listings for f in folders), rate)
+    budget = st.scan_cycle_budget_seconds
+    warnings: List[str] = []
+    if warm_seconds > interval * PLAN_TARGET_FRACTION:
+        if budget:
+            warnings.append(
+                f"2回目以降も1サイクル {warm_seconds:.1f}秒の見込みで、走査時間の上限 {budget}秒で打ち切られます。"
+                f"全フォルダを一巡するのに約 {math.ceil(warm_seconds / budget)} サイクルかかります"
+            )
+        else:
+            warnings.append(
+                f"2回目以降のサイクル時間の見込み {warm_seconds:.1f}秒が間隔 {interval}秒の8割を超えます。"
+                f"間隔を {math.ceil(warm_seconds / PLAN_TARGET_FRACTION)}秒以上にするか、1サイクルの走査時間の上限を設定してください"
+            )
+    if budget and cold_seconds > budget:
+        warnings.append(
+            f"キャッシュのない走査（追加直後など、約 {cold_seconds:.1f}秒）は、周期の走査では上限 {budget}秒ごとに分かれます"
+            "（起動直後の走査は最後まで走査します）"
+        )
+    if rate > 0 and sum(f.warm_listings for f in folders) / rate > interval * PLAN_TARGET_FRACTION:
+        warnings.append("一覧の上限（回/秒）のため間隔内に一覧し切れません。上限を上げるか間隔を長くしてください")
+    return PlanReport(
+        folders=folders,
+        missing=missing,
+        interval_seconds=interval,
+        io_listings_per_second=rate,
+        io_concurrent_per_share=st.io_concurrent_per_share,
+        cycle_budget_seconds=budget,
+        cold_seconds=cold_seconds,
+        warm_seconds=warm_seconds,
+        warnings=warnings,
+    )
+
+
+def format_report(report: PlanReport) -> str:
+    """CLI と設定タブの見積もり画面で出すテキスト"""
+    rate = f"{report.io_listings_per_second:g}回/秒" if report.io_listings_per_second > 0 else "無制限"
+    per_share = str(report.io_concurrent_per_share) if report.io_concurrent_per_share else "無制限"
+    budget = f"{report.cycle_budget_seconds}秒" if report.cycle_budget_seconds else "なし"
+    lines = [
+        f"設定：間隔 {report.interval_seconds}秒 / 一覧の上限 {rate} / 共有ごとの同時一覧数 {per_share} / 走査時間の上限 {budget}",
+        "（このPCの走査はフォルダを1つずつ順に一覧します。同時一覧数は複数プロセス・スキャンハブでの上限です）",
+        "",
+        "    初回 一覧 / エントリ / stat / 秒     2回目以降 一覧 / stat / 秒   ヒット  フォルダ",
+    ]
+    for f in report.folders:
+        depth = f"直下+{f.max_depth}階層" if f.max_depth else "直下"
+        mark = "（追加予定）" if f.candidate else ""
+        lines.append(
+            f"{f.cold_listings:10d} / {f.cold_entries:9,d} / {f.cold_stats:5d} / {f.cold_seconds:7.2f}"
+            f"    {f.warm_listings:8d} / {f.warm_stats:5d} / {f.warm_seconds:7.2f}"
+            f"  {f.hits:6d}  {f.folder}{mark}  [{', '.join(f.rules)}] {depth}"
+        )
+        for w in f.warnings:
+            lines.append(f"      ! {w}")
+    for folder in report.missing:
+        lines.append(f"      ! フォルダが見つかりません：{folder}")
+    share = report.warm_seconds / report.interval_seconds * 100
+    lines += [
+        "",
+        f"サイクル時間の見込み：初回 {report.cold_seconds:.1f}秒 / 2回目以降 {report.warm_seconds:.1f}秒（間隔の {share:.1f}%）",
+    ]
+    lines += [f"! {w}" for w in report.warnings]
+    return "\n".join(lines)
+
+
+def _main(argv=None) -> int:
+    import argparse
+    import logging
+
+    from .config import load_config
+    from .logs import LOGGER_ROOT
+    from .rules import DEFAULT_RULE_TYPE, RULE_LABELS, normalize_rule_code
+
+    parser = argparse.ArgumentParser(description="監視フォルダを実際に一覧して、走査の費用とサイクル時間を見積もる")
+    parser.add_argument("--folder", action="append", default=[], metavar="PATH", help="追加予定のフォルダ（複数指定可）")
+    parser.add_argument("--code", default="000", help="追加予定のフォルダで照合するコード（ヒット数の見積もり用）")
+    parser.add_argument("--rule", default=DEFAULT_RULE_TYPE, choices=sorted(RULE_LABELS), help="--code のルール種別")
+    parser.add_argument("--depth", type=int, default=0, help="追加予定のフォルダのサブフォルダ階層（0 は直下のみ）")
+    args = parser.parse_args(argv)
+    # アクセスできないフォルダの警告は表にまとめて出す
+    logging.getLogger(LOGGER_ROOT).addHandler(logging.NullHandler())
+
+    code = normalize_rule_code(args.rule, args.code)
+    if code is None:
+        parser.error(f"コードが不正です: {args.code}")
+    extra = [
+        WatchItem(id="", code=code, folder=folder, rule_type=args.rule, recursive=args.depth > 0, max_depth=max(1, args.depth))
+        for folder in args.folder
+    ]
+    print(format_report(estimate_costs(load_config(), extra=extra)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
@@ -0,0 +1,213 @@
+import cProfile
+import os
+import threading
+import time
+import tkinter as tk
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+from .logs import fields, get_logger
+
+T = TypeVar("T")
+
+_log = get_logger("ui")
+
+
+class StartupProfile:
+    """
+    --profile-startup 用。起動の各段階の所要時間を記録し、
+    UI構築と初回スキャン結果の受信が揃った時点で1回だけ内訳を出力する。
+    """
+
+    _LABELS = {
+        "import": "import",
+        "config": "設定読み込み",
+        "ui": "UI構築",
+    }
+
+    def __init__(self, t0: Optional[float] = None):
+        self.t0 = t0 if t0 is not None else time.perf_counter()
+        self._last = self.t0
+        self.phases: List[Tuple[str, float]] = []
+        # (スキャン自体の秒数 or None=監視対象なし, 起動から結果受信までの秒数)
+        self.first_scan: Optional[Tuple[Optional[float], float]] = None
+        self._reported = False
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def first_scan_done(self, scan_seconds: Optional[float]) -> None:
+        if self.first_scan is None:
+            self.first_scan = (scan_seconds, time.perf_counter() - self.t0)
+
+    def format_report(self) -> str:
+        lines = ["[startup profile]"]
+        for phase, sec in self.phases:
+            lines.append(f"  {self._LABELS.get(phase, phase):<12} {sec * 1000:8.1f} ms")
+        if self.first_scan is not None:
+            scan_seconds, since_start = self.first_scan
+            if scan_seconds is None:
+                lines.append("  初回スキャン       (監視対象なし)")
+            else:
+                lines.append(f"  {'初回スキャン':<12} {scan_seconds * 1000:8.1f} ms")
+                lines.append(f"  {'初回結果受信':<12} {since_start * 1000:8.1f} ms（起動から）")
+        return "\n".join(lines)
+
+    def report_once(self) -> None:
+        if self._reported:
+            return
+        if self.first_scan is None or not any(p == "ui" for p, _ in self.phases):
+            return
+        self._reported = True
+        # --noconsole ビルドでは stdout が None（print は何もしない）
+        print(self.format_report(), flush=True)
+
+
+# cProfile（3.12以降は sys.monitoring）は全スレッド共通で同時に1つしか有効にできない
+_profile_lock = threading.Lock()
+
+
+def profile_cycles_from_env() -> int:
+    """
+    WATCHER_PROFILE=N で N サイクル分のプロファイルを取る（STARTUP_DEBUG と同じ流儀）。
+    未設定・不正値は 0（無効）。
+    """
+    try:
+        return max(0, int(os.environ.get("WATCHER_PROFILE", "").strip() or "0"))
+    except ValueError:
+        return 0
+
+
+def effective_profile_cycles(enabled: bool, cycles: int) -> int:
+    """環境変数が優先。なければ設定画面の値（無効なら 0）。"""
+    return profile_cycles_from_env() or (max(0, int(cycles)) if enabled else 0)
+
+
+class CycleProfiler:
+    """
+    arm(N) されてから N 回分の呼び出しを cProfile で包み、
+    out_dir/profile_<name>_<日時>_<連番>.pstats に書き出す。
+    他スレッドでプロファイル中の呼び出しは計測せずにそのまま実行する（回数も減らさない）。
+    """
+
+    def __init__(self, name: str, out_dir: Path):
+        self.name = name
+        self.out_dir = out_dir
+        self._remaining = 0
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self._remaining > 0
+
+    def arm(self, cycles: int) -> None:
+        with self._lock:
+            self._remaining = max(0, int(cycles))
+
+    def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        if self._remaining <= 0 or not _profile_lock.acquire(blocking=False):
+            return fn(*args, **kwargs)
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                prof.disable()
+                self._dump(prof)
+        finally:
+            _profile_lock.release()
+
+    def _dump(self, prof: cProfile.Profile) -> None:
+        with self._lock:
+            if self._remaining <= 0:
+                return
+            self._remaining -= 1
+            self._seq += 1
+            seq = self._seq
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        try:
+            prof.dump_stats(str(self.out_dir / f"profile_{self.name}_{stamp}_{seq:03d}.pstats"))
+        except OSError:
+            pass
+
+
+class TkCallbackTimer:
+    """
+    Tk のコールバック（command / bind / after）の実行時間を測り、
+    閾値を超えたものを記録する。install() 以降に登録されたコールバックが対象。
+    あわせて after() の心拍で「イベントループがどれだけ遅れたか」も測る。
+    """
+
+    HEARTBEAT_MS = 100
+
+    def __init__(self, root: tk.Misc, threshold_ms: int, log_path: Path):
+        self.root = root
+        self.threshold_ms = max(1, int(threshold_ms))
+        self.log_path = log_path
+        self.max_lag_ms = 0.0
+        self.slow_count = 0
+        self._enabled = False
+        self._orig_call_wrapper = None
+        self._expected: Optional[float] = None
+
+    def install(self) -> None:
+        if self._enabled:
+            return
+        self._enabled = True
+        timer = self
+        orig = tk.CallWrapper
+        self._orig_call_wrapper = orig
+
+        class _TimedCallWrapper(orig):
+            def __call__(self, *args):
+                t0 = time.perf_counter()
+                try:
+                    return super().__call__(*args)
+                finally:
+                    timer._observe(self.func, (time.perf_counter() - t0) * 1000)
+
+        tk.CallWrapper = _TimedCallWrapper
+        self._expected = time.perf_counter() + self.HEARTBEAT_MS / 1000
+        self.root.after(self.HEARTBEAT_MS, self._heartbeat)
+
+    def uninstall(self) -> None:
+        if not self._enabled:
+            return
+        self._enabled = False
+        if self._orig_call_wrapper is not None:
+            tk.CallWrapper = self._orig_call_wrapper
+            self._orig_call_wrapper = None
+
+    def _observe(self, func, elapsed_ms: float) -> None:
+        # uninstall 前に作られた CallWrapper（bind 済みのコールバック）からも呼ばれるので、無効化後は記録しない
+        if not self._enabled or elapsed_ms < self.threshold_ms:
+            return
+        self.slow_count += 1
+        name = getattr(func, "__qualname__", None) or repr(func)
+        self._write(f"slow_callback {name} {elapsed_ms:.1f}ms")
+        _log.warning("slow_callback", extra=fields(callback=name, elapsed_ms=round(elapsed_ms, 1)))
+
+    def _heartbeat(self) -> None:
+        if not self._enabled:
+            return
+        now = time.perf_counter()
+        if self._expected is not None:
+            lag_ms = (now - self._expected) * 1000
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            if lag_ms >= self.threshold_ms:
+                self._write(f"event_loop_lag {lag_ms:.1f}ms")
+                _log.warning("event_loop_lag", extra=fields(lag_ms=round(lag_ms, 1)))
+        self._expected = now + self.HEARTBEAT_MS / 1000
+        self.root.after(self.HEARTBEAT_MS, self._heartbeat)
+
+    def _write(self, line: str) -> None:
+        try:
+            with self.log_path.open("a", encoding="utf-8") as f:
+                f.write(f"{datetime.now().isoformat(timespec='milliseconds')} {line}\n")
+        except OSError:
+            pass
@@ -0,0 +1,115 @@
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .utils import normalize_code
+
+# ルール種別（WatchItem.rule_type に保存する値）
+RULE_VBA3 = "vba3"      # VBA互換：先頭3桁数字、4文字目が数字なら除外
+RULE_PREFIX = "prefix"  # 英数字2〜6文字の前方一致、直後が英数字なら除外
+
+DEFAULT_RULE_TYPE = RULE_VBA3
+
+RULE_LABELS: Dict[str, str] = {
+    RULE_VBA3: "3桁数字（VBA互換）",
+    RULE_PREFIX: "英数字前方一致（2〜6文字）",
+}
+
+# 入力エラー時の説明
+RULE_HINTS: Dict[str, str] = {
+    RULE_VBA3: "3桁数字",
+    RULE_PREFIX: "英数字2〜6文字",
+}
+
+PREFIX_MIN_LEN = 2
+PREFIX_MAX_LEN = 6
+
+_PREFIX_RE = re.compile(rf"[0-9A-Za-z]{{{PREFIX_MIN_LEN},{PREFIX_MAX_LEN}}}")
+
+# (ルール種別, コード)
+Rule = Tuple[str, str]
+
+# トライのノードで「ここでコードが終わる」ことを示すキー（文字と衝突しない）
+_TERM = None
+
+
+def normalize_rule_type(rule_type: Optional[str]) -> str:
+    s = (rule_type or "").strip()
+    return s if s in RULE_LABELS else DEFAULT_RULE_TYPE
+
+
+def normalize_rule_code(rule_type: str, code_raw: str) -> Optional[str]:
+    """
+    ルール種別ごとのコード正規化。不正なら None。
+      - vba3   : 従来通り 0〜999 を3桁ゼロ埋め
+      - prefix : 英数字2〜6文字（大文字化）
+    """
+    if rule_type == RULE_PREFIX:
+        s = (code_raw or "").strip()
+        if not _PREFIX_RE.fullmatch(s):
+            return None
+        return s.upper()
+    return normalize_code(code_raw)
+
+
+def rule_display(rule_type: str, code: str) -> str:
+    """一覧表示用。既定ルールはコードのみ、それ以外は種別を添える。"""
+    if rule_type == RULE_PREFIX:
+        return f"{code} (前方一致)"
+    return code
+
+
+def _boundary_ok(rule_type: str, next_char: str) -> bool:
+    if not next_char:
+        return True
+    if rule_type == RULE_PREFIX:
+        return not (next_char.isascii() and next_char.isalnum())
+    # VBA互換：4文字目が数字なら除外
+    return not next_char.isdigit()
+
+
+class CodeMatcher:
+    """
+    フォルダ単位のコード群をトライにまとめたもの。
+    ファイル名（拡張子除外）を先頭から1回なぞるだけで、一致した全コードを返す。
+    コストはファイル名長（最大でも最長コード長+1文字）に比例し、ルール数には依存しない。
+    """
+
+    __slots__ = ("_root", "_max_len")
+
+    def __init__(self, rules: Iterable[Rule]):
+        root: dict = {}
+        max_len = 0
+        for rule_type, code in rules:
+            if not code:
+                continue
+            node = root
+            for ch in code:
+                node = node.setdefault(ch, {})
+            terms: List[Rule] = node.setdefault(_TERM, [])
+            if (rule_type, code) not in terms:
+                terms.append((rule_type, code))
+            max_len = max(max_len, len(code))
+        self._root = root
+        self._max_len = max_len
+
+    def __bool__(self) -> bool:
+        return self._max_len > 0
+
+    def match(self, filename: str) -> Tuple[Rule, ...]:
+        """一致したルール (rule_type, code)（短い順）を返す。一致なしは空タプル。"""
+        base = os.path.splitext(filename)[0]
+        node = self._root
+        found: List[Rule] = []
+        n = len(base)
+        for i in range(min(n, self._max_len)):
+            node = node.get(base[i].upper())
+            if node is None:
+                break
+            terms = node.get(_TERM)
+            if terms:
+                next_char = base[i + 1] if i + 1 < n else ""
+                for rule in terms:
+                    if _boundary_ok(rule[0], next_char):
+                        found.append(rule)
+        return tuple(found)
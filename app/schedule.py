@@ -0,0 +1,162 @@
+import getpass
+import hashlib
+import math
+import random
+import socket
+from typing import Dict, List, Optional
+
+from .config import AppSettings
+
+
+def host_id() -> str:
+    """位相を決めるための識別子（同じPCでもユーザーが違えば別扱い：ターミナルサーバ対策）"""
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = ""
+    return f"{socket.gethostname()}/{user}"
+
+
+def _fraction(key: str) -> float:
+    """key から決まる [0, 1) の値（プロセスや起動時刻によらず同じ）"""
+    digest = hashlib.sha1(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64
+
+
+class ScanSchedule:
+    """
+    周期走査の時刻を決める。
+      - phase_spread : 時計（epoch）基準の interval 刻みのグリッドに、ホストごとに決まった位相でずらして乗せる。
+                       起動時刻がそろっていても、多数のPCの走査が間隔全体に均等にばらける
+      - jitter_percent : 毎回 ±(interval × %) の揺らぎを加える
+      - initial_delay_max : 起動直後の初回走査をホストごとに決まった 0〜この秒数だけ遅らせる（0 は即時）
+    時刻はすべて time.time() の値。
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        phase_spread: bool = False,
+        jitter_percent: float = 0.0,
+        initial_delay_max: float = 0.0,
+        host: Optional[str] = None,
+        rng: Optional[random.Random] = None,
+    ):
+        self.interval = max(1.0, float(interval))
+        self.phase_spread = phase_spread
+        self.jitter = max(0.0, min(50.0, float(jitter_percent))) / 100.0
+        self.initial_delay_max = max(0.0, float(initial_delay_max))
+        self.host = host if host is not None else host_id()
+        self.phase = _fraction(self.host) * self.interval
+        self._rng = rng if rng is not None else random.Random()
+
+    @classmethod
+    def from_settings(cls, settings: AppSettings, host: Optional[str] = None) -> "ScanSchedule":
+        return cls(
+            interval=settings.interval_seconds,
+            phase_spread=settings.scan_phase_spread,
+            jitter_percent=settings.scan_jitter_percent,
+            initial_delay_max=settings.scan_initial_delay_seconds,
+            host=host,
+        )
+
+    def initial_delay(self) -> float:
+        if self.initial_delay_max <= 0:
+            return 0.0
+        # 位相とは別の値にする（初回とグリッドの位置が連動しないように）
+        return _fraction(self.host + "#initial") * self.initial_delay_max
+
+    def next_after(self, last_start: float, last_end: float) -> float:
+        """
+        次の走査時刻。
+          phase_spread あり : last_start + interval/2 以降で最初のグリッド時刻（間隔は interval/2〜interval×1.5 に収まる）
+          phase_spread なし : 従来通り、走査の終了から interval 後
+        """
+        if self.phase_spread:
+            base = last_start + self.interval / 2
+            k = math.ceil((base - self.phase) / self.interval)
+            target = k * self.interval + self.phase
+        else:
+            target = last_end + self.interval
+        if self.jitter:
+            target += self._rng.uniform(-self.jitter, self.jitter) * self.interval
+        return max(last_end, target)
+
+
+def simulate_load(
+    clients: int,
+    interval: float,
+    login_window: float = 60.0,
+    cycles: int = 4,
+    bucket: float = 10.0,
+    phase_spread: bool = True,
+    jitter_percent: float = 0.0,
+    initial_delay_max: float = 0.0,
+    seed: int = 1,
+) -> Dict[str, float]:
+    """
+    N台のクライアントが login_window 秒の間にまとめて起動したときの、走査開始の集中度を見積もる。
+    起動後 cycles 回目以降の定常状態だけを bucket 秒ごとに数え、最大 / 平均 / 理想（均等）を返す。
+    """
+    rng = random.Random(seed)
+    starts: List[float] = []
+    t0 = 1_700_000_000.0
+    for i in range(clients):
+        sched = ScanSchedule(
+            interval,
+            phase_spread=phase_spread,
+            jitter_percent=jitter_percent,
+            initial_delay_max=initial_delay_max,
+            host=f"pc-{i:05d}/user",
+            rng=random.Random(rng.random()),
+        )
+        t = t0 + rng.uniform(0, login_window) + sched.initial_delay()
+        for n in range(cycles + 2):
+            if n >= 2:
+                starts.append(t)
+            t = sched.next_after(t, t)
+
+    lo = min(starts)
+    counts: Dict[int, int] = {}
+    for t in starts:
+        counts[int((t - lo) // bucket)] = counts.get(int((t - lo) // bucket), 0) + 1
+    span_buckets = max(1, int((max(starts) - lo) // bucket) + 1)
+    return {
+        "max_per_bucket": float(max(counts.values())),
+        "mean_per_bucket": len(starts) / span_buckets,
+        "ideal_per_bucket": clients * bucket / interval,
+    }
+
+
+def _main(argv=None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="多数のクライアントの走査開始の集中度を見積もる")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--interval", type=float, default=900)
+    parser.add_argument("--login-window", type=float, default=60, help="全台が起動し終えるまでの秒数")
+    parser.add_argument("--jitter", type=float, default=5, help="揺らぎ(%%)")
+    parser.add_argument("--bucket", type=float, default=10, help="集計の刻み(秒)")
+    args = parser.parse_args(argv)
+
+    print(f"clients={args.clients} interval={args.interval:g}s login_window={args.login_window:g}s bucket={args.bucket:g}s")
+    print("max/bucket  mean/bucket  ideal/bucket  mode")
+    for label, spread, jitter in (
+        ("起動時刻基準（従来）", False, 0.0),
+        ("起動時刻基準 + 揺らぎ", False, args.jitter),
+        ("ホスト位相", True, 0.0),
+        ("ホスト位相 + 揺らぎ", True, args.jitter),
+    ):
+        r = simulate_load(
+            args.clients,
+            args.interval,
+            login_window=args.login_window,
+            bucket=args.bucket,
+            phase_spread=spread,
+            jitter_percent=jitter,
+        )
+        print(f"{r['max_per_bucket']:10.0f}  {r['mean_per_bucket']:11.1f}  {r['ideal_per_bucket']:12.1f}  {label}")
+
+
+if __name__ == "__main__":
+    _main()
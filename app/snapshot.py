@@ -0,0 +1,63 @@
+import gzip
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from .logs import fields, get_logger
+
+_log = get_logger("snapshot")
+
+SNAPSHOT_FILENAME = "watch_snapshot.json.gz"
+
+# 形式を変えたら上げる（違う版のファイルは読まずに捨てる）
+SNAPSHOT_VERSION = 1
+
+# 常駐中に保存し直す間隔（秒）。異常終了しても、この程度前の状態から再開できる
+SNAPSHOT_SAVE_SECONDS = 600
+
+# これより古いスナップショットは使わない（長期間止めていたPCで古い結果を出さない）
+SNAPSHOT_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+
+def write_snapshot(path: Path, payload: dict) -> bool:
+    """
+    一覧スナップショットを gzip 圧縮の JSON で保存する。
+    一時ファイルに書いてから置き換えるので、保存中に落ちても前回のファイルは壊れない。
+    """
+    data = dict(payload, version=SNAPSHOT_VERSION, saved_at=time.time())
+    tmp = path.with_name(path.name + ".tmp")
+    try:
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+        return True
+    except OSError as e:
+        _log.warning("snapshot_save_failed", extra=fields(path=str(path), error=str(e)))
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        return False
+
+
+def read_snapshot(path: Path) -> Optional[dict]:
+    """保存済みのスナップショット。無い・壊れている・版が違う・古すぎる場合は None。"""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, ValueError) as e:
+        _log.warning("snapshot_load_failed", extra=fields(path=str(path), error=str(e)))
+        return None
+    if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+        _log.info("snapshot_version_mismatch", extra=fields(path=str(path)))
+        return None
+    try:
+        if time.time() - float(data.get("saved_at", 0)) > SNAPSHOT_MAX_AGE_SECONDS:
+            return None
+    except (TypeError, ValueError):
+        return None
+    return data
@@ -0,0 +1,497 @@
+import builtins
+import gzip
+import json
+import os
+import stat
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .config import AppConfig, AppSettings, WatchItem, item_from_dict, settings_from_dict
+from .fakefs import FakeStat
+from .fsio import FileSystem
+from .history import HistoryStore, iter_hit_keys
+from .logs import fields, get_logger
+from .monitor import FirstSeen, ScanEngine, ScanPlan, build_scan_plan, collapse_hit_codes, collapse_hits
+from .notify import notification_for
+
+_log = get_logger("monitor")
+
+# 形式を変えたら上げる（違う版のトレースは再生しない）
+TRACE_VERSION = 1
+
+# 一覧のエントリ：[名前, 種類, サイズ, 更新日時ns]。種類は下のビットの組み合わせ。
+# stat に失敗したエントリはサイズ -1 / 更新日時 None
+_KIND_DIR = 1
+_KIND_SYMLINK = 2
+
+
+def trace_cycles_from_env() -> int:
+    """WATCHER_TRACE=N で N サイクル分のトレースを取る（WATCHER_PROFILE と同じ流儀）。未設定・不正値は 0。"""
+    try:
+        return max(0, int(os.environ.get("WATCHER_TRACE", "").strip() or "0"))
+    except ValueError:
+        return 0
+
+
+def _error_json(e: OSError) -> list:
+    return [e.__class__.__name__, e.errno, e.strerror if e.strerror is not None else str(e)]
+
+
+def _error_from_json(data: list, path: str) -> OSError:
+    name, code, message = data
+    cls = getattr(builtins, str(name), None)
+    if not (isinstance(cls, type) and issubclass(cls, OSError)):
+        cls = OSError
+    return cls(code, message, path) if code is not None else cls(message)
+
+
+def _config_json(cfg: AppConfig) -> dict:
+    return {"settings": asdict(cfg.settings), "items": [asdict(it) for it in cfg.items]}
+
+
+# ---- 記録 ----
+
+
+class _CycleLog:
+    """1サイクル分の記録（走査スレッドだけが書く）"""
+
+    def __init__(self, now_ns: int):
+        self.now_ns = now_ns
+        self.started = time.time()
+        self.dirs: Dict[str, bool] = {}
+        self.stats: Dict[str, list] = {}
+        # パス -> [所要秒, エラー or None, エントリ or None（開けなかった）, 最後まで読んだか]
+        self.listings: Dict[str, list] = {}
+
+
+class RecordingFileSystem(FileSystem):
+    """
+    inner をそのまま通しつつ、記録中のサイクルでは一覧・stat・フォルダ確認の結果を TraceRecorder に残す。
+    エントリの stat は走査側と同じ呼び方をするので、os.DirEntry のキャッシュで追加の I/O にはならない
+    （Linux ではディレクトリのエントリにも stat が1回ずつ増える）。
+    """
+
+    def __init__(self, inner: FileSystem, recorder: "TraceRecorder"):
+        self._inner = inner
+        self._recorder = recorder
+
+    def time_ns(self) -> int:
+        return self._inner.time_ns()
+
+    def is_dir(self, path: str) -> bool:
+        result = self._inner.is_dir(path)
+        log = self._recorder.current
+        if log is not None:
+            log.dirs[path] = result
+        return result
+
+    def stat(self, path: str) -> os.stat_result:
+        log = self._recorder.current
+        if log is None:
+            return self._inner.stat(path)
+        try:
+            st = self._inner.stat(path)
+        except OSError as e:
+            log.stats[path] = [None, _error_json(e)]
+            raise
+        log.stats[path] = [[st.st_mode, st.st_size, st.st_mtime_ns], None]
+        return st
+
+    @contextmanager
+    def scandir(self, path: str) -> Iterator[Iterator[os.DirEntry]]:
+        log = self._recorder.current
+        if log is None:
+            with self._inner.scandir(path) as it:
+                yield it
+            return
+        t0 = time.perf_counter()
+        entries: Optional[list] = None
+        state = [False]  # 最後まで読んだか
+        error: Optional[list] = None
+        try:
+            with self._inner.scandir(path) as it:
+                entries = []
+                yield self._tee(it, entries, state)
+        except OSError as e:
+            error = _error_json(e)
+            raise
+        finally:
+            log.listings[path] = [round(time.perf_counter() - t0, 6), error, entries, state[0]]
+
+    @staticmethod
+    def _tee(it: Iterator[os.DirEntry], entries: list, state: list) -> Iterator[os.DirEntry]:
+        for entry in it:
+            is_dir = entry.is_dir()
+            kind = (_KIND_DIR if is_dir else 0) | (_KIND_SYMLINK if entry.is_symlink() else 0)
+            try:
+                # 走査側と同じ引数（ディレクトリは follow_symlinks=False、ファイルは既定）
+                st = entry.stat(follow_symlinks=False) if is_dir else entry.stat()
+                entries.append([entry.name, kind, st.st_size, st.st_mtime_ns])
+            except OSError:
+                entries.append([entry.name, kind, -1, None])
+            yield entry
+        state[0] = True
+
+
+class TraceRecorder:
+    """
+    arm(N) されてから N サイクル分の走査を out_dir/trace_scan_<日時>.jsonl.gz に記録する。
+    1行目は開始時の設定と走査エンジンの状態（枝刈りキャッシュ）、以後1サイクル1行
+    （一覧の中身と所要時間・stat・エラー・結果）。サイクルごとに gzip のメンバーを追記するので、
+    途中で落ちてもそこまでは読める。書き込みは走査スレッドで行う（記録中だけ、その分サイクルが延びる）。
+    """
+
+    def __init__(self, out_dir: Path):
+        self.out_dir = out_dir
+        self.path: Optional[Path] = None
+        self.current: Optional[_CycleLog] = None
+        self._remaining = 0
+        self._seq = 0
+        self._last_config = ""
+        self._pending_config: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self._remaining > 0
+
+    def arm(self, cycles: int) -> None:
+        with self._lock:
+            self._remaining = max(0, int(cycles))
+            # 次のサイクルから新しいファイルに書く
+            self.path = None
+
+    def wrap(self, fs: FileSystem) -> FileSystem:
+        return RecordingFileSystem(fs, self)
+
+    def begin_cycle(self, fs: FileSystem, cfg: AppConfig, engine_state: Callable[[], dict]) -> None:
+        """走査の直前に呼ぶ。記録するサイクルなら（最初の1回はヘッダも書いて）記録を始める。"""
+        with self._lock:
+            if self._remaining <= 0:
+                self.current = None
+                return
+            start = self.path is None
+            if start:
+                stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                self.path = self.out_dir / f"trace_scan_{stamp}.jsonl.gz"
+                self._seq = 0
+                self._last_config = ""
+        if start and not self._write(
+            {"type": "header", "version": TRACE_VERSION, "created": time.time(), "engine": engine_state()}
+        ):
+            self.arm(0)
+            return
+        self.current = _CycleLog(fs.time_ns())
+        config = json.dumps(_config_json(cfg), ensure_ascii=False, sort_keys=True)
+        self._pending_config = None if config == self._last_config else config
+        self._last_config = config
+
+    def end_cycle(self, trigger: str, outcome: str, elapsed: float, result: Optional[dict], show_nohit: bool) -> None:
+        """走査の直後に呼ぶ（キャンセル・失敗でも呼ぶ。result はその場合 None）"""
+        log, self.current = self.current, None
+        if log is None:
+            return
+        with self._lock:
+            self._remaining -= 1
+            self._seq += 1
+            seq = self._seq
+        record: Dict[str, Any] = {
+            "type": "cycle",
+            "seq": seq,
+            "t": log.started,
+            "now_ns": log.now_ns,
+            "trigger": trigger,
+            "outcome": outcome,
+            "elapsed": round(elapsed, 6),
+            "show_nohit": show_nohit,
+            "dirs": log.dirs,
+            "stats": log.stats,
+            "listings": log.listings,
+        }
+        if self._pending_config is not None:
+            record["config"] = json.loads(self._pending_config)
+        if result is not None:
+            record["hits"] = result["hits"]
+            record["errors"] = result["errors"]
+            if result.get("deferred"):
+                record["deferred"] = result["deferred"]
+        if not self._write(record):
+            self.arm(0)
+
+    def _write(self, record: dict) -> bool:
+        path = self.path
+        if path is None:
+            return False
+        try:
+            with gzip.open(path, "at", encoding="utf-8", compresslevel=6) as f:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+                f.write("\n")
+            return True
+        except OSError as e:
+            _log.warning("trace_write_failed", extra=fields(path=str(path), error=str(e)))
+            return False
+
+
+# ---- 再生 ----
+
+
+def read_trace(path: Path) -> Tuple[dict, List[dict]]:
+    """(ヘッダ, サイクルの一覧)。途中で切れたトレースは読めたところまで。版が違えば ValueError。"""
+    header: Optional[dict] = None
+    cycles: List[dict] = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                rec = json.loads(line)
+                if rec.get("type") == "header":
+                    header = rec
+                elif rec.get("type") == "cycle":
+                    cycles.append(rec)
+    except (EOFError, json.JSONDecodeError):
+        pass
+    if header is None or header.get("version") != TRACE_VERSION:
+        raise ValueError(f"トレースとして読めません（版が違うか、ヘッダがありません）: {path}")
+    return header, cycles
+
+
+class _ReplayEntry:
+    __slots__ = ("name", "path", "_kind", "_stat")
+
+    def __init__(self, path: str, name: str, kind: int, st: Optional[FakeStat]):
+        self.path = path
+        self.name = name
+        self._kind = kind
+        self._stat = st
+
+    def is_dir(self, follow_symlinks: bool = True) -> bool:
+        return bool(self._kind & _KIND_DIR)
+
+    def is_file(self, follow_symlinks: bool = True) -> bool:
+        return not self._kind & _KIND_DIR
+
+    def is_symlink(self) -> bool:
+        return bool(self._kind & _KIND_SYMLINK)
+
+    def stat(self, follow_symlinks: bool = True) -> FakeStat:
+        if self._stat is None:
+            raise FileNotFoundError(2, "No such file or directory", self.path)
+        return self._stat
+
+
+def _entry_stat(kind: int, size: int, mtime_ns: Optional[int]) -> Optional[FakeStat]:
+    if mtime_ns is None:
+        return None
+    return FakeStat(stat.S_IFDIR if kind & _KIND_DIR else stat.S_IFREG, size, mtime_ns / 1e9, mtime_ns)
+
+
+class ReplayFileSystem(FileSystem):
+    """
+    記録したトレースを遅延なしで返すファイルシステム。load_cycle() で読み込んだサイクルの結果を優先し、
+    そのサイクルで記録されていないパスは、それ以前のサイクルの記録（一覧の中身を含む）から答える。
+    記録のどこにも無かった問い合わせは misses に数える（再生が記録と違う経路をたどった目安）。
+    """
+
+    def __init__(self):
+        self._dirs: Dict[str, bool] = {}
+        self._stats: Dict[str, list] = {}
+        self._listings: Dict[str, list] = {}
+        self._now_ns = time.time_ns()
+        self.misses = 0
+
+    def load_cycle(self, cycle: dict) -> None:
+        self._dirs.update(cycle.get("dirs") or {})
+        self._stats.update(cycle.get("stats") or {})
+        for path, listing in (cycle.get("listings") or {}).items():
+            # キャンセルで途中までしか読まなかった一覧は、前に最後まで読んだ記録があればそちらを使う
+            if listing[3] or listing[1] is not None or path not in self._listings:
+                self._listings[path] = listing
+        self._now_ns = int(cycle.get("now_ns") or self._now_ns)
+
+    def time_ns(self) -> int:
+        return self._now_ns
+
+    def is_dir(self, path: str) -> bool:
+        if path in self._dirs:
+            return self._dirs[path]
+        st = self._lookup_stat(path)
+        return st is not None and stat.S_ISDIR(st.st_mode)
+
+    def stat(self, path: str) -> FakeStat:
+        rec = self._stats.get(path)
+        if rec is not None:
+            st, error = rec
+            if error is not None:
+                raise _error_from_json(error, path)
+            return FakeStat(st[0], st[1], st[2] / 1e9, st[2])
+        st = self._lookup_stat(path)
+        if st is None:
+            raise FileNotFoundError(2, "No such file or directory", path)
+        return st
+
+    def _lookup_stat(self, path: str) -> Optional[FakeStat]:
+        # 親フォルダの一覧に載っていれば、その時のサイズ・更新日時を使う
+        parent = self._listings.get(os.path.dirname(path))
+        name = os.path.basename(path)
+        if parent is not None and parent[2] is not None:
+            for entry_name, kind, size, mtime_ns in parent[2]:
+                if entry_name == name:
+                    return _entry_stat(kind, size, mtime_ns)
+        self.misses += 1
+        return None
+
+    @contextmanager
+    def scandir(self, path: str) -> Iterator[Iterator[_ReplayEntry]]:
+        listing = self._listings.get(path)
+        if listing is None:
+            self.misses += 1
+            raise FileNotFoundError(2, "No such file or directory", path)
+        _, error, entries, _ = listing
+        if entries is None:
+            raise _error_from_json(error, path)
+        yield self._entries(path, entries, error)
+
+    @staticmethod
+    def _entries(path: str, entries: list, error: Optional[list]) -> Iterator[_ReplayEntry]:
+        for name, kind, size, mtime_ns in entries:
+            yield _ReplayEntry(os.path.join(path, name), name, kind, _entry_stat(kind, size, mtime_ns))
+        if error is not None:
+            # 一覧の途中で失敗した記録
+            raise _error_from_json(error, path)
+
+
+class ReplayCycle(NamedTuple):
+    seq: int
+    trigger: str
+    outcome: str
+    recorded_seconds: float  # 記録時のサイクル時間
+    recorded_listings: int  # 記録時の一覧回数
+    io_seconds: float  # 記録時の一覧の所要時間の合計
+    replay_seconds: float  # 再生（I/O なし）のサイクル時間
+    listings: int  # 再生での一覧回数
+    hits: int
+    new_hits: int  # 通知履歴に新規として載る件数
+    notified: bool  # ポップアップを出すか
+    mismatches: List[str]  # 記録時の結果との差（空なら一致）
+
+
+def _diff_results(recorded: dict, replayed: Dict[str, Any]) -> List[str]:
+    out: List[str] = []
+    # 時間予算で次に回したフォルダは記録時に走査していない（前回の結果のまま）ので比べない
+    skip = set(recorded.get("deferred") or [])
+    for key in ("hits", "errors"):
+        want, got = recorded.get(key) or {}, replayed.get(key) or {}
+        for folder in sorted((set(want) | set(got)) - skip):
+            a, b = want.get(folder), got.get(folder)
+            if key == "hits":
+                a, b = sorted(a or []), sorted(b or [])
+            if a != b:
+                out.append(f"{key} {folder}: 記録 {a!r} / 再生 {b!r}")
+    return out
+
+
+def replay(path: Path) -> List[ReplayCycle]:
+    """
+    トレースを走査エンジン（照合・枝刈り）→ 初回検出 → 通知の判定・通知履歴 の順に全速で流し直す。
+    キャンセル・失敗したサイクルはエンジンの状態だけ進め、結果は比べない。
+    """
+    header, cycles = read_trace(path)
+    fs = ReplayFileSystem()
+    engine = ScanEngine(fs)
+    engine_state = header.get("engine") or {}
+    engine.import_snapshot(engine_state.get("units") or [])
+    first_seen = FirstSeen()
+    first_seen.restore(engine_state.get("first_seen") or {})
+    history = HistoryStore(Path(":memory:"))
+    settings = AppSettings()
+    items: List[WatchItem] = []
+    out: List[ReplayCycle] = []
+    try:
+        for cycle in cycles:
+            if "config" in cycle:
+                settings = settings_from_dict(cycle["config"].get("settings") or {})
+                items = [item_from_dict(it) for it in cycle["config"].get("items") or []]
+            fs.load_cycle(cycle)
+            t0 = time.perf_counter()
+            plan = build_scan_plan(items, settings, fs)
+            deferred = set(cycle.get("deferred") or [])
+            if deferred:
+                # 記録時に走査したフォルダだけを流し直す
+                plan = ScanPlan(
+                    units={u: r for u, r in plan.units.items() if plan.display(u[0]) not in deferred},
+                    folder_original=plan.folder_original,
+                    pinned=plan.pinned,
+                )
+            unit_hits, errors = engine.scan(plan, partial=bool(deferred))
+            first_seen.update(unit_hits, float(cycle.get("t") or 0.0))
+            first_seen.forget_except(plan.folder_original)
+            result = {"hits": collapse_hits(plan, unit_hits), "errors": {plan.display(k): v for k, v in errors.items()}}
+            codes = collapse_hit_codes(plan, unit_hits)
+            replay_seconds = time.perf_counter() - t0
+
+            ok = cycle.get("outcome") == "ok"
+            show_nohit = bool(cycle.get("show_nohit"))
+            listings = cycle.get("listings") or {}
+            out.append(
+                ReplayCycle(
+                    seq=int(cycle.get("seq") or 0),
+                    trigger=str(cycle.get("trigger") or ""),
+                    outcome=str(cycle.get("outcome") or ""),
+                    recorded_seconds=float(cycle.get("elapsed") or 0.0),
+                    recorded_listings=len(listings),
+                    io_seconds=sum(float(rec[0]) for rec in listings.values()),
+                    replay_seconds=replay_seconds,
+                    listings=engine.last_listings,
+                    hits=sum(len(v) for v in result["hits"].values()),
+                    new_hits=history.record(iter_hit_keys(result["hits"], codes), float(cycle.get("t") or 0.0)),
+                    notified=notification_for(result["hits"], result["errors"], show_nohit, settings.notify_folder_access_error)
+                    is not None,
+                    mismatches=_diff_results(cycle, result) if ok else [],
+                )
+            )
+    finally:
+        history.close()
+    return out
+
+
+def _main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="走査トレース（WATCHER_TRACE=N で記録）を再生する")
+    parser.add_argument("trace", type=Path, help="trace_scan_*.jsonl.gz")
+    parser.add_argument("--repeat", type=int, default=1, help="ベンチマーク用に繰り返す回数（最速の回を表示）")
+    parser.add_argument("--verbose", action="store_true", help="結果の差分を全件表示する")
+    args = parser.parse_args(argv)
+
+    best: Optional[List[ReplayCycle]] = None
+    for _ in range(max(1, args.repeat)):
+        result = replay(args.trace)
+        if best is None or sum(c.replay_seconds for c in result) < sum(c.replay_seconds for c in best):
+            best = result
+    assert best is not None
+
+    mismatched = 0
+    for c in best:
+        mark = "一致" if not c.mismatches else f"差分 {len(c.mismatches)}"
+        if c.outcome != "ok":
+            mark = c.outcome
+        print(
+            f"#{c.seq:<3} {c.trigger:<8} 記録 {c.recorded_seconds:7.3f}s（一覧 {c.recorded_listings} 回 / I/O {c.io_seconds:.3f}s）"
+            f"  再生 {c.replay_seconds * 1000:8.1f}ms（一覧 {c.listings} 回）"
+            f"  ヒット {c.hits} 新規 {c.new_hits}{' 通知' if c.notified else ''}  {mark}"
+        )
+        if c.mismatches:
+            mismatched += 1
+            for line in c.mismatches if args.verbose else c.mismatches[:3]:
+                print(f"      {line}")
+    total = sum(c.replay_seconds for c in best)
+    print(f"{len(best)} サイクル  再生 {total:.3f}s  結果の差分があったサイクル {mismatched}")
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
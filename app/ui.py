@@ -1,46 +1,93 @@
+import logging
+import os
 import queue
+import threading
+import time
 import uuid
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-
-from .config import AppConfig, WatchItem, load_config, save_config, config_path
-from .constants import APP_TITLE, STARTUP_ENTRY_NAME
-from .monitor import MonitorWorker
-from .utils import now_iso, normalize_code, is_valid_dir
+from tkinter import ttk, messagebox
+
+from .config import AppConfig, FilterSettings, WatchItem, load_config, save_config, config_path
+from .constants import APP_TITLE, MAX_SCAN_DEPTH, STARTUP_ENTRY_NAME
+from .fsio import LOCAL_FS
+from .instance import SingleInstance
+from .latency import LATENCY, STAGE_POPUP
+from .logs import LogService, fields, get_logger
+from .monitor import MonitorWorker, ScanCancelled
+from .notify import notification_for
+from .profiling import CycleProfiler, StartupProfile, TkCallbackTimer, effective_profile_cycles
+from .rules import RULE_HINTS, normalize_rule_code, rule_display
+from .snapshot import SNAPSHOT_FILENAME
+from .utils import now_iso, is_valid_dir, split_csv
 
 from .startup import is_supported as startup_supported
 from .startup import is_registered as startup_is_registered
 from .startup import register as startup_register, unregister as startup_unregister
 from .startup import should_show_button_for_debug
 
-
 from .views.settings_view import SettingsView
 from .views.new_item_view import NewItemView
 from .views.edit_item_view import EditItemView
 from .views.watch_list_view import WatchListView
-from .views.purge_view import PurgeView
-from .views.popup_manager import PopupManager
+
+_log = get_logger("ui")
+
+# 起動直後に不要なもの（完全削除タブ・ポップアップ・ファイル選択ダイアログ・通知履歴・メモリ推移）は使う時に import する。
+# スキャンハブ・走査プロセス・トレース・メトリクスは run_app で有効な場合だけ import する
 
 
 class App(tk.Tk):
-    def __init__(self):
+    def __init__(
+        self,
+        cfg: Optional[AppConfig] = None,
+        q: "Optional[queue.Queue[dict]]" = None,
+        monitor: Optional[MonitorWorker] = None,
+        profile: Optional[StartupProfile] = None,
+    ):
         super().__init__()
         self.title(APP_TITLE)
         self.minsize(980, 700)
 
-        self.cfg: AppConfig = load_config()
-        self.q: "queue.Queue[dict]" = queue.Queue()
-        self.monitor = MonitorWorker(self._get_config_snapshot, self.q)
+        # run_app から渡された場合は、UI構築前に開始済みの監視をそのまま引き継ぐ
+        self.cfg: AppConfig = cfg if cfg is not None else load_config()
+        self.q: "queue.Queue[dict]" = q if q is not None else queue.Queue()
+        self.monitor = monitor if monitor is not None else MonitorWorker(self._get_config_snapshot, self.q)
         self.monitor_running = False
-
-        self.popup = PopupManager(self)
+        self.profile = profile
+
+        # プロファイル（設定 or WATCHER_PROFILE）。スキャン側は run_app で開始前に仕掛け済みのことがある
+        if self.monitor.profiler is None:
+            self.monitor.profiler = CycleProfiler("scan", config_path().parent)
+        self.ui_profiler = CycleProfiler("ui", config_path().parent)
+        self.tk_timer: Optional[TkCallbackTimer] = None
+        self._apply_profiling(arm_scan=(monitor is None))
+
+        # メモリ推移（RSS / ウィジェット数、必要なら tracemalloc）。初回の計測時に作る
+        self._memory = None
+        if self.cfg.settings.memory_tracemalloc:
+            # tracemalloc は起動直後から追跡しないと差分の意味が薄いので、有効なら先に作る
+            self.memory
+        self.stats_view = None
+
+        # 通知履歴（ポップアップを閉じた後でも初回検出日時などを検索できるように残す）。初回の記録・検索時に開く
+        self._history = None
+        self.history_view = None
+
+        self._popup = None
+        # 走査コストの見積もり画面（planner。開いている間だけ）
+        self._plan_window = None
 
         # 編集中のID（一覧の選択が1行のときのみ）
         self.editing_id: Optional[str] = None
 
+        # タブは初回表示時に構築する（タブのウィジェット名 -> builder）
+        self._tab_builders: Dict[str, Callable[[ttk.Frame], None]] = {}
+        self.purge_view = None
+
         self._build_ui()
         self._refresh_all()
 
@@ -48,10 +95,44 @@ class App(tk.Tk):
         self.after(0, self._start_monitor)
 
         self.after(150, self._poll_queue)
+        # 起動処理が落ち着いてから基準値を取る
+        self.after(30 * 1000, self._sample_memory_periodic)
         self.protocol("WM_DELETE_WINDOW", self._on_close)
 
     def _get_config_snapshot(self) -> AppConfig:
         return self.cfg
+
+    @property
+    def memory(self):
+        if self._memory is None:
+            from .memwatch import MemoryMonitor
+
+            self._memory = MemoryMonitor(
+                self,
+                budget_mb=self.cfg.settings.memory_budget_mb,
+                use_tracemalloc=self.cfg.settings.memory_tracemalloc,
+                on_budget_exceeded=self._on_memory_budget_exceeded,
+            )
+        return self._memory
+
+    @property
+    def history(self):
+        if self._history is None:
+            from .history import HISTORY_FILENAME, HistoryStore
+
+            self._history = HistoryStore(
+                config_path().parent / HISTORY_FILENAME,
+                retention_days=self.cfg.settings.history_retention_days,
+            )
+        return self._history
+
+    @property
+    def popup(self):
+        if self._popup is None:
+            from .views.popup_manager import PopupManager
+
+            self._popup = PopupManager(self)
+        return self._popup
     
     # 親フォルダを返す共通関数
     def _parent_dir_or_none(self, path_str: str | None) -> str | None:
@@ -101,6 +182,7 @@ class App(tk.Tk):
                 startup_register(STARTUP_ENTRY_NAME)
                 messagebox.showinfo("完了", "スタートアップに登録しました。")
         except Exception as e:
+            _log.exception("startup_registration_failed")
             messagebox.showerror("失敗", f"スタートアップ設定に失敗しました。\n{e}")
         finally:
             self._refresh_startup_button_text()
@@ -142,6 +224,14 @@ class App(tk.Tk):
         self.btn_run_once = ttk.Button(left, text="今すぐ1回実行", command=self._run_once)
         self.btn_run_once.pack(side="left", padx=(16, 0))
 
+        self.btn_cancel_scan = ttk.Button(left, text="キャンセル", command=self._cancel_scan, state="disabled")
+        if self.monitor.can_cancel:
+            # スキャンハブ利用時は走査がハブ側なので出さない
+            self.btn_cancel_scan.pack(side="left", padx=(8, 0))
+
+        self.scan_progress_label = ttk.Label(left, text="")
+        self.scan_progress_label.pack(side="left", padx=(8, 0))
+
         # --- 右側ブロック（★ ここがポイント） ---
         right = ttk.Frame(header)
         right.pack(side="right")
@@ -157,11 +247,14 @@ class App(tk.Tk):
         # notebook
         nb = ttk.Notebook(root)
         nb.pack(fill="both", expand=True)
+        self.notebook = nb
 
         tab_main = ttk.Frame(nb, padding=10)
-        tab_purge = ttk.Frame(nb, padding=10)
         nb.add(tab_main, text="監視 / 設定")
-        nb.add(tab_purge, text="完全削除")
+        self._add_lazy_tab("完全削除", self._build_purge_tab)
+        self._add_lazy_tab("履歴", self._build_history_tab)
+        self._add_lazy_tab("統計", self._build_stats_tab)
+        nb.bind("<<NotebookTabChanged>>", self._on_tab_changed)
 
         # --- main tab layout
         self.settings_view = SettingsView(
@@ -170,7 +263,19 @@ class App(tk.Tk):
             popup_persistent=self.cfg.settings.popup_persistent,
             popup_seconds=self.cfg.settings.popup_seconds,
             notify_folder_access_error=self.cfg.settings.notify_folder_access_error,
+            filters=self.cfg.settings.filters,
+            profile_enabled=self.cfg.settings.profile_enabled,
+            profile_cycles=self.cfg.settings.profile_cycles,
+            profile_tk_threshold_ms=self.cfg.settings.profile_tk_threshold_ms,
+            memory_budget_mb=self.cfg.settings.memory_budget_mb,
+            memory_tracemalloc=self.cfg.settings.memory_tracemalloc,
+            hub_address=self.cfg.settings.hub_address,
+            io_listings_per_second=self.cfg.settings.io_listings_per_second,
+            io_concurrent_per_share=self.cfg.settings.io_concurrent_per_share,
+            io_spread_cycles=self.cfg.settings.io_spread_cycles,
+            scan_cycle_budget_seconds=self.cfg.settings.scan_cycle_budget_seconds,
             on_save=self._save_settings,
+            on_plan=self._estimate_scan_cost,
         )
         self.settings_view.pack(fill="x")
 
@@ -205,17 +310,174 @@ class App(tk.Tk):
         )
         self.watch_list.pack(fill="both", expand=True)
 
-        # --- purge tab layout
+        footer = ttk.Frame(root)
+        footer.pack(fill="x", pady=(10, 0))
+        ttk.Label(footer, text=f"設定ファイル: {config_path()}").pack(side="left")
+
+    def _apply_profiling(self, arm_scan: bool = True) -> None:
+        st = self.cfg.settings
+        cycles = effective_profile_cycles(st.profile_enabled, st.profile_cycles)
+        if arm_scan:
+            self.monitor.profiler.arm(cycles)
+        self.ui_profiler.arm(cycles)
+        if cycles:
+            if self.tk_timer is None:
+                self.tk_timer = TkCallbackTimer(self, st.profile_tk_threshold_ms, config_path().parent / "profile_tk.log")
+            self.tk_timer.threshold_ms = max(1, int(st.profile_tk_threshold_ms))
+            self.tk_timer.install()
+        elif self.tk_timer is not None:
+            self.tk_timer.uninstall()
+
+    # ----------------------------
+    # Lazy tabs
+    # ----------------------------
+    def _add_lazy_tab(self, text: str, builder: Callable[[ttk.Frame], None]) -> ttk.Frame:
+        frame = ttk.Frame(self.notebook, padding=10)
+        self.notebook.add(frame, text=text)
+        self._tab_builders[str(frame)] = builder
+        return frame
+
+    def _on_tab_changed(self, _evt=None) -> None:
+        current = self.notebook.select()
+        builder = self._tab_builders.pop(current, None)
+        if builder is not None:
+            builder(self.nametowidget(current))
+
+    def _build_purge_tab(self, tab: ttk.Frame) -> None:
+        from .views.purge_view import PurgeView
+
         self.purge_view = PurgeView(
-            tab_purge,
+            tab,
             on_purge=self._purge_selected,
             on_restore=self._restore_selected,
         )
         self.purge_view.pack(fill="both", expand=True)
+        self._refresh_purge_view()
 
-        footer = ttk.Frame(root)
-        footer.pack(fill="x", pady=(10, 0))
-        ttk.Label(footer, text=f"設定ファイル: {config_path()}").pack(side="left")
+    def _build_history_tab(self, tab: ttk.Frame) -> None:
+        from .views.history_view import HistoryView
+
+        self.history_view = HistoryView(tab, on_search=self._search_history, on_clear=self._clear_history_search)
+        self.history_view.pack(fill="both", expand=True)
+        self._refresh_history_view()
+
+    def _build_stats_tab(self, tab: ttk.Frame) -> None:
+        from .views.stats_view import StatsView
+
+        self.stats_view = StatsView(tab, on_sample_now=self._sample_memory_now, on_dump=self._dump_memory)
+        self.stats_view.pack(fill="both", expand=True)
+        self._refresh_stats_view()
+        self._refresh_latency_view()
+
+    # ----------------------------
+    # History
+    # ----------------------------
+    def _parse_history_conditions(self, quiet: bool = False) -> Optional[Tuple[str, str, Optional[float], Optional[float]]]:
+        view = self.history_view
+        code = (view.var_code.get() or "").strip().upper()
+        folder = (view.var_folder.get() or "").strip()
+
+        bounds: List[Optional[float]] = []
+        for var in (view.var_since, view.var_until):
+            s = (var.get() or "").strip()
+            if not s:
+                bounds.append(None)
+                continue
+            try:
+                bounds.append(datetime.strptime(s, "%Y-%m-%d").timestamp())
+            except ValueError:
+                if not quiet:
+                    messagebox.showerror("入力エラー", f"日付は YYYY-MM-DD で入力してください：{s}")
+                return None
+        since, until = bounds
+        if until is not None:
+            until += 86400  # 終了日はその日の終わりまで含める
+        return code, folder, since, until
+
+    def _search_history(self) -> None:
+        if self.history_view is None:
+            return
+        cond = self._parse_history_conditions()
+        if cond is None:
+            return
+        self._refresh_history_view(cond)
+
+    def _clear_history_search(self) -> None:
+        if self.history_view is None:
+            return
+        self.history_view.clear_conditions()
+        self._refresh_history_view()
+
+    def _refresh_history_view(
+        self, cond: Optional[Tuple[str, str, Optional[float], Optional[float]]] = None
+    ) -> None:
+        if self.history_view is None:
+            return
+        from .history import HISTORY_QUERY_LIMIT
+
+        code, folder, since, until = cond if cond is not None else ("", "", None, None)
+        rows = self.history.query(code=code, folder=folder, since=since, until=until)
+        summary = f"{len(rows)} 件を表示（初回検出の新しい順、最大 {HISTORY_QUERY_LIMIT} 件）"
+        if not self.history.available:
+            summary += " ※ 履歴ファイルを開けないため、起動後の直近分のみ"
+        self.history_view.refresh(rows, summary)
+
+    # ----------------------------
+    # Memory watch
+    # ----------------------------
+    def _sample_memory_periodic(self) -> None:
+        try:
+            self._sample_memory_now()
+        finally:
+            minutes = max(1, int(self.cfg.settings.memory_sample_minutes))
+            self.after(minutes * 60 * 1000, self._sample_memory_periodic)
+
+    def _sample_memory_now(self) -> None:
+        self.memory.sample()
+        self._refresh_stats_view()
+
+    def _refresh_stats_view(self) -> None:
+        if self.stats_view is None:
+            return
+        growth = self.memory.growth_bytes()
+        summary = f"予算 {self.memory.budget_mb} MB"
+        if growth is not None:
+            summary = f"起動後の増加 {growth / 1048576:.1f} MB / " + summary
+        self.stats_view.refresh_memory(self.memory.samples, self.memory.top_diffs, summary)
+
+    def _refresh_latency_view(self) -> None:
+        if self.stats_view is None:
+            return
+        interval = max(1, int(self.cfg.settings.interval_seconds))
+        self.stats_view.refresh_latency(LATENCY.rows(), f"監視間隔 {interval} 秒（起動後に新しく検出したファイルのみ）")
+
+    def _memory_dump_path(self) -> Path:
+        return config_path().parent / "memory_dump.txt"
+
+    def _dump_memory(self) -> None:
+        try:
+            path = self.memory.dump(self._memory_dump_path())
+            messagebox.showinfo("ダンプ出力", f"出力しました。\n{path}")
+        except Exception as e:
+            _log.exception("memory_dump_failed")
+            messagebox.showerror("失敗", f"ダンプの出力に失敗しました。\n{e}")
+
+    def _on_memory_budget_exceeded(self, growth_bytes: int) -> None:
+        try:
+            self.memory.dump(self._memory_dump_path())
+        except Exception:
+            _log.exception("memory_dump_failed")
+        _log.warning("memory_budget_exceeded", extra=fields(growth_mb=round(growth_bytes / 1048576, 1), budget_mb=self.memory.budget_mb))
+        self.popup.show_or_update(
+            {
+                "(メモリ警告)": [
+                    f"起動後のメモリ増加が {growth_bytes / 1048576:.0f} MB になりました（予算 {self.memory.budget_mb} MB）。",
+                    f"詳細: {self._memory_dump_path()}",
+                ]
+            },
+            popup_persistent=self.cfg.settings.popup_persistent,
+            popup_seconds=self.cfg.settings.popup_seconds,
+        )
 
     # ----------------------------
     # Header status
@@ -254,18 +516,147 @@ class App(tk.Tk):
             
         notify_folder_access_error = bool(self.settings_view.var_notify_access_error.get())
 
+        try:
+            min_size = int(self.settings_view.var_min_size.get() or "0")
+            max_size = int(self.settings_view.var_max_size.get() or "0")
+            if min_size < 0 or max_size < 0 or (max_size and min_size > max_size):
+                raise ValueError
+        except Exception:
+            messagebox.showerror("入力エラー", "サイズの上下限が不正です（0 は指定なし）")
+            return
+        try:
+            profile_cycles = int(self.settings_view.var_profile_cycles.get() or "0")
+            profile_tk_ms = int(self.settings_view.var_profile_tk_ms.get() or "0")
+            if profile_cycles <= 0 or profile_tk_ms <= 0:
+                raise ValueError
+        except Exception:
+            messagebox.showerror("入力エラー", "プロファイルのサイクル数 / 閾値が不正です")
+            return
+
+        try:
+            memory_budget_mb = int(self.settings_view.var_memory_budget.get() or "0")
+            if memory_budget_mb <= 0:
+                raise ValueError
+        except Exception:
+            messagebox.showerror("入力エラー", "メモリ増加の警告(MB)が不正です")
+            return
+
+        try:
+            io_rate = float((self.settings_view.var_io_rate.get() or "0").strip())
+            io_per_share = int((self.settings_view.var_io_per_share.get() or "0").strip())
+            if io_rate < 0 or io_per_share < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("入力エラー", "フォルダ一覧の上限が不正です（0 以上、0 は無制限）")
+            return
+        try:
+            cycle_budget = int((self.settings_view.var_cycle_budget.get() or "0").strip())
+            if cycle_budget < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("入力エラー", "走査時間の上限が不正です（0 以上の秒数、0 は無制限）")
+            return
+
+        hub_address = (self.settings_view.var_hub_address.get() or "").strip()
+        if hub_address:
+            from .hub import parse_host_port
+
+            try:
+                parse_host_port(hub_address)
+            except ValueError:
+                messagebox.showerror("入力エラー", "スキャンハブのアドレスが不正です（例: 127.0.0.1:47810）")
+                return
+
+        filters = FilterSettings(
+            allow_exts=split_csv(self.settings_view.var_allow_exts.get()),
+            deny_exts=split_csv(self.settings_view.var_deny_exts.get()),
+            ignore_globs=split_csv(self.settings_view.var_ignore_globs.get()),
+            min_size=min_size,
+            max_size=max_size,
+        )
+
         self.cfg.settings.interval_seconds = interval
         self.cfg.settings.popup_persistent = popup_persistent
         self.cfg.settings.popup_seconds = int(popup_seconds)
         self.cfg.settings.notify_folder_access_error = notify_folder_access_error
+        self.cfg.settings.filters = filters
+        self.cfg.settings.profile_enabled = bool(self.settings_view.var_profile_enabled.get())
+        self.cfg.settings.profile_cycles = profile_cycles
+        self.cfg.settings.profile_tk_threshold_ms = profile_tk_ms
+        self._apply_profiling()
+        self.cfg.settings.memory_budget_mb = memory_budget_mb
+        self.cfg.settings.hub_address = hub_address
+        self.cfg.settings.io_listings_per_second = io_rate
+        self.cfg.settings.io_concurrent_per_share = io_per_share
+        self.cfg.settings.io_spread_cycles = bool(self.settings_view.var_io_spread.get())
+        self.cfg.settings.scan_cycle_budget_seconds = cycle_budget
+        self.cfg.settings.memory_tracemalloc = bool(self.settings_view.var_memory_tracemalloc.get())
+        self.memory.budget_mb = memory_budget_mb
+        self.memory.set_tracemalloc(self.cfg.settings.memory_tracemalloc)
 
 
         try:
             save_config(self.cfg)
             messagebox.showinfo("保存", "設定を保存しました。")
         except Exception as e:
+            _log.exception("config_save_failed")
             messagebox.showerror("保存失敗", f"設定ファイルの保存に失敗しました。\n{e}")
 
+    def _estimate_scan_cost(self) -> None:
+        """設定の監視対象（と新規作成欄に入力中のフォルダ）を実際に一覧して、走査の費用を見積もる"""
+        if self._plan_window is not None and self._plan_window.alive():
+            return
+        from .planner import estimate_costs, format_report
+        from .views.plan_view import PlanWindow
+
+        extra: List[WatchItem] = []
+        if self._validate_new_inputs():
+            code_raw, folder = self.new_view.get_values()
+            rule_type = self.new_view.get_rule_type()
+            recursive, depth_raw, excludes_raw = self.new_view.get_scan_values()
+            try:
+                depth = min(MAX_SCAN_DEPTH, max(1, int(depth_raw or "1")))
+            except ValueError:
+                depth = 1
+            extra.append(
+                WatchItem(
+                    id="",
+                    code=normalize_rule_code(rule_type, code_raw) or "",
+                    folder=folder.strip(),
+                    rule_type=rule_type,
+                    recursive=recursive,
+                    max_depth=depth,
+                    exclude_globs=split_csv(excludes_raw),
+                )
+            )
+
+        cancel = threading.Event()
+        self._plan_window = PlanWindow(self, on_close=cancel.set)
+        cfg, q = self.cfg, self.q
+
+        def run() -> None:
+            # 共有の一覧は時間がかかるので Tk スレッドでは行わない。閉じたら一覧の区切りで止める
+            try:
+                report = estimate_costs(
+                    cfg,
+                    extra=extra,
+                    cancel=cancel,
+                    progress=lambda done, total: q.put({"type": "cost_plan_progress", "done": done, "total": total}),
+                )
+                msg = {
+                    "type": "cost_plan",
+                    "title": "見積もり結果（初回 = キャッシュなし / 2回目以降 = 変更がない場合）",
+                    "text": format_report(report),
+                }
+            except ScanCancelled:
+                return
+            except Exception:
+                _log.exception("cost_plan_failed")
+                msg = {"type": "cost_plan", "title": "見積もりに失敗しました（詳細は watch_log.jsonl）", "text": ""}
+            q.put(msg)
+
+        threading.Thread(target=run, name="cost-plan", daemon=True).start()
+
     # ----------------------------
     # Browse folder (new/edit behavior)
     # ----------------------------
@@ -274,12 +665,14 @@ class App(tk.Tk):
             self.cfg.settings.last_browse_dir = str(Path(selected_dir).resolve())
             save_config(self.cfg)
         except Exception:
-            pass
+            _log.warning("remember_browse_dir_failed", exc_info=True)
 
     def _browse_folder_new(self) -> None:
         base = self.cfg.settings.last_browse_dir if is_valid_dir(self.cfg.settings.last_browse_dir) else None
         initial = self._parent_dir_or_none(base)
 
+        from tkinter import filedialog
+
         d = filedialog.askdirectory(title="監視フォルダを選択（新規作成）", initialdir=initial or None)
         if d:
             self.new_view.set_folder(d)
@@ -297,6 +690,8 @@ class App(tk.Tk):
             base = self.cfg.settings.last_browse_dir if is_valid_dir(self.cfg.settings.last_browse_dir) else None
             initial = self._parent_dir_or_none(base)
 
+        from tkinter import filedialog
+
         d = filedialog.askdirectory(title="監視フォルダを選択（編集）", initialdir=initial or None)
         if d:
             self.edit_view.set_folder(d)
@@ -308,16 +703,27 @@ class App(tk.Tk):
     # ----------------------------
     def _validate_new_inputs(self) -> bool:
         code_raw, folder = self.new_view.get_values()
-        code = normalize_code(code_raw)
+        code = normalize_rule_code(self.new_view.get_rule_type(), code_raw)
         return bool(code) and is_valid_dir((folder or "").strip())
 
     def _validate_edit_inputs(self) -> bool:
         if not self.editing_id:
             return False
         code_raw, folder = self.edit_view.get_values()
-        code = normalize_code(code_raw)
+        code = normalize_rule_code(self.edit_view.get_rule_type(), code_raw)
         return bool(code) and is_valid_dir((folder or "").strip())
 
+    def _parse_scan_inputs(self, view) -> Optional[Tuple[bool, int, List[str]]]:
+        recursive, depth_raw, excludes_raw = view.get_scan_values()
+        try:
+            depth = int(depth_raw or "1")
+            if depth < 1 or depth > MAX_SCAN_DEPTH:
+                raise ValueError
+        except Exception:
+            messagebox.showerror("入力エラー", f"最大階層が不正です（1〜{MAX_SCAN_DEPTH}）")
+            return None
+        return recursive, depth, split_csv(excludes_raw)
+
     # ----------------------------
     # Items operations
     # ----------------------------
@@ -329,15 +735,20 @@ class App(tk.Tk):
 
     def _add_item(self) -> None:
         code_raw, folder = self.new_view.get_values()
-        code = normalize_code(code_raw)
+        rule_type = self.new_view.get_rule_type()
+        code = normalize_rule_code(rule_type, code_raw)
         folder = (folder or "").strip()
 
         if not code:
-            messagebox.showerror("入力エラー", "担当コードが不正です（3桁数字）")
+            messagebox.showerror("入力エラー", f"担当コードが不正です（{RULE_HINTS[rule_type]}）")
             return
         if not is_valid_dir(folder):
             messagebox.showerror("入力エラー", "監視フォルダが存在しません")
             return
+        scan = self._parse_scan_inputs(self.new_view)
+        if scan is None:
+            return
+        recursive, max_depth, exclude_globs = scan
 
         item = WatchItem(
             id=str(uuid.uuid4()),
@@ -347,11 +758,17 @@ class App(tk.Tk):
             is_deleted=False,
             created_at=now_iso(),
             updated_at=now_iso(),
+            rule_type=rule_type,
+            recursive=recursive,
+            max_depth=max_depth,
+            exclude_globs=exclude_globs,
+            pinned=self.new_view.get_pinned(),
         )
         self.cfg.items.append(item)
         try:
             save_config(self.cfg)
         except Exception as e:
+            _log.exception("config_save_failed")
             messagebox.showerror("保存失敗", f"設定ファイルの保存に失敗しました。\n{e}")
             self.cfg.items = [x for x in self.cfg.items if x.id != item.id]
             return
@@ -368,23 +785,31 @@ class App(tk.Tk):
             return
 
         code_raw, folder = self.edit_view.get_values()
-        code = normalize_code(code_raw)
+        rule_type = self.edit_view.get_rule_type()
+        code = normalize_rule_code(rule_type, code_raw)
         folder = (folder or "").strip()
 
         if not code:
-            messagebox.showerror("入力エラー", "担当コードが不正です（3桁数字）")
+            messagebox.showerror("入力エラー", f"担当コードが不正です（{RULE_HINTS[rule_type]}）")
             return
         if not is_valid_dir(folder):
             messagebox.showerror("入力エラー", "監視フォルダが存在しません")
             return
+        scan = self._parse_scan_inputs(self.edit_view)
+        if scan is None:
+            return
 
         it.code = code
+        it.rule_type = rule_type
+        it.recursive, it.max_depth, it.exclude_globs = scan
+        it.pinned = self.edit_view.get_pinned()
         it.folder = str(Path(folder).resolve())
         it.touch()
 
         try:
             save_config(self.cfg)
         except Exception as e:
+            _log.exception("config_save_failed")
             messagebox.showerror("保存失敗", f"設定ファイルの保存に失敗しました。\n{e}")
             return
 
@@ -406,12 +831,18 @@ class App(tk.Tk):
             is_deleted=False,
             created_at=now_iso(),
             updated_at=now_iso(),
+            rule_type=src.rule_type,
+            recursive=src.recursive,
+            max_depth=src.max_depth,
+            exclude_globs=list(src.exclude_globs),
+            pinned=src.pinned,
         )
         self.cfg.items.append(new_item)
 
         try:
             save_config(self.cfg)
         except Exception as e:
+            _log.exception("config_save_failed")
             messagebox.showerror("保存失敗", f"設定ファイルの保存に失敗しました。\n{e}")
             self.cfg.items = [x for x in self.cfg.items if x.id != new_item.id]
             return
@@ -435,7 +866,9 @@ class App(tk.Tk):
             return
         self.editing_id = item_id
         self.edit_view.set_enabled(True)
-        self.edit_view.set_values(it.code, it.folder)
+        self.edit_view.set_values(it.code, it.folder, it.rule_type)
+        self.edit_view.set_scan_values(it.recursive, it.max_depth, it.exclude_globs)
+        self.edit_view.set_pinned(it.pinned)
 
     def _exit_edit_mode(self) -> None:
         self.editing_id = None
@@ -463,6 +896,7 @@ class App(tk.Tk):
         try:
             save_config(self.cfg)
         except Exception as e:
+            _log.exception("config_save_failed")
             messagebox.showerror("保存失敗", f"設定ファイルの保存に失敗しました。\n{e}")
             return
 
@@ -492,6 +926,7 @@ class App(tk.Tk):
             try:
                 save_config(self.cfg)
             except Exception as e:
+                _log.exception("config_save_failed")
                 messagebox.showerror("保存失敗", f"設定ファイルの保存に失敗しました。\n{e}")
             self._refresh_all()
 
@@ -510,6 +945,7 @@ class App(tk.Tk):
             try:
                 save_config(self.cfg)
             except Exception as e:
+                _log.exception("config_save_failed")
                 messagebox.showerror("保存失敗", f"設定ファイルの保存に失敗しました。\n{e}")
             self._refresh_all()
 
@@ -526,6 +962,7 @@ class App(tk.Tk):
             try:
                 save_config(self.cfg)
             except Exception as e:
+                _log.exception("config_save_failed")
                 messagebox.showerror("保存失敗", f"設定ファイルの保存に失敗しました。\n{e}")
             self._refresh_all()
 
@@ -533,10 +970,18 @@ class App(tk.Tk):
     # Refresh views
     # ----------------------------
     def _refresh_all(self) -> None:
-        rows = [(it.id, it.code, it.folder, it.is_active) for it in self.cfg.items if not it.is_deleted]
+        rows = [
+            (it.id, rule_display(it.rule_type, it.code), it.folder, it.is_active)
+            for it in self.cfg.items
+            if not it.is_deleted
+        ]
         self.watch_list.refresh(rows)
+        self._refresh_purge_view()
 
-        del_rows = [(it.id, it.code, it.folder) for it in self.cfg.items if it.is_deleted]
+    def _refresh_purge_view(self) -> None:
+        if self.purge_view is None:
+            return
+        del_rows = [(it.id, rule_display(it.rule_type, it.code), it.folder) for it in self.cfg.items if it.is_deleted]
         self.purge_view.refresh(del_rows)
 
     # ----------------------------
@@ -567,63 +1012,139 @@ class App(tk.Tk):
         self.btn_start.configure(state="normal")
         self.btn_stop.configure(state="disabled")
         self.monitor.stop()
+        # 停止で走査中の結果は捨てられ、終わりの通知も来ないので、ここで進捗表示を戻す
+        self._set_scan_progress("", cancellable=False)
 
     def _run_once(self) -> None:
+        # 走査はワーカー側のスレッドで行う。走査中なら新たには走らず、その結果がポップアップに出る
         self.monitor.run_once(show_nohit=True)
+        self._set_scan_progress("スキャン中…", cancellable=True)
+
+    def _cancel_scan(self) -> None:
+        self.monitor.cancel_scan()
+        self._set_scan_progress("キャンセル中…", cancellable=False)
+
+    def _set_scan_progress(self, text: str, cancellable: bool) -> None:
+        self.scan_progress_label.configure(text=text)
+        self.btn_cancel_scan.configure(state="normal" if cancellable and self.monitor.can_cancel else "disabled")
 
     def _poll_queue(self) -> None:
         try:
             while True:
                 msg = self.q.get_nowait()
-                self._handle_worker_message(msg)
+                t0 = time.perf_counter()
+                self.ui_profiler.run(self._handle_worker_message, msg)
+                if _log.isEnabledFor(logging.DEBUG):
+                    _log.debug(
+                        "ui_callback",
+                        extra=fields(
+                            callback="handle_worker_message",
+                            msg_type=msg.get("type"),
+                            elapsed_ms=round((time.perf_counter() - t0) * 1000, 2),
+                        ),
+                    )
         except queue.Empty:
             pass
         self.after(150, self._poll_queue)
 
     def _handle_worker_message(self, msg: dict) -> None:
+        if msg.get("type") == "ipc":
+            self._handle_ipc_command(msg)
+            return
+        if msg.get("type") in ("cost_plan", "cost_plan_progress"):
+            window = self._plan_window
+            if window is None or not window.alive():
+                return
+            if msg["type"] == "cost_plan":
+                window.set_text(str(msg.get("title") or ""), str(msg.get("text") or ""))
+            else:
+                window.set_progress(int(msg.get("done") or 0), int(msg.get("total") or 0))
+            return
+        if msg.get("type") == "scan_progress":
+            generation = msg.get("generation")
+            if generation is not None and generation != self.monitor.generation:
+                # 停止より前に積まれた進捗（その走査の結果はもう来ない）
+                return
+            total = int(msg.get("total") or 0)
+            hits = int(msg.get("hits") or 0)
+            found = f"（ヒット {hits}件）" if hits else ""
+            self._set_scan_progress(f"スキャン中 {int(msg.get('done') or 0)}/{total} フォルダ{found}", cancellable=True)
+            return
+        if msg.get("type") == "scan_cancelled":
+            self._set_scan_progress("キャンセルしました", cancellable=False)
+            return
+        if msg.get("type") == "scan_failed":
+            self._set_scan_progress("スキャンに失敗しました（詳細は watch_log.jsonl）", cancellable=False)
+            return
         if msg.get("type") != "scan_result":
             return
 
+        if msg.get("cached"):
+            # 前回終了時の結果（続く初回走査で確認し直す）。履歴には記録しない
+            self._show_cached_result(msg)
+            return
+
+        self._set_scan_progress("", cancellable=False)
+
+        if self.profile is not None:
+            self.profile.first_scan_done(float(msg.get("elapsed") or 0.0))
+            self.profile.report_once()
+
         hits: Dict[str, List[str]] = msg.get("hits") or {}
         errors: Dict[str, str] = msg.get("errors") or {}
         show_nohit: bool = bool(msg.get("show_nohit", False))
 
-        if hits:
-            # hitsがある場合は従来通り（必要なら errors も一緒に表示してもOK）
-            self.popup.show_or_update(
-                hits,
-                popup_persistent=self.cfg.settings.popup_persistent,
-                popup_seconds=self.cfg.settings.popup_seconds,
-            )
+        from .history import iter_hit_keys
+
+        # 0件のサイクルも記録する（前回との差分で新規検出を判定するため）
+        if self.history.record(iter_hit_keys(hits, msg.get("codes") or {})) and self.history_view is not None:
+            # 入力中の条件が不正なら条件なしで表示する（自動更新ではエラーを出さない）
+            self._refresh_history_view(self._parse_history_conditions(quiet=True))
+
+        content = notification_for(hits, errors, show_nohit, self.cfg.settings.notify_folder_access_error)
+        if content is None:
             return
+        self.popup.show_or_update(
+            content,
+            popup_persistent=self.cfg.settings.popup_persistent,
+            popup_seconds=self.cfg.settings.popup_seconds,
+            info=msg.get("info") if hits else None,
+        )
+        # 新規ヒットが現れてから、ここで表示し終えるまでの時間
+        if LATENCY.observe_result(msg, STAGE_POPUP):
+            self._refresh_latency_view()
 
-        # hits がない時
-        if not show_nohit:
-            # フォルダへのアクセスエラーのみ表示
-            if errors and self.cfg.settings.notify_folder_access_error:
-                lines = [f"{folder}：{reason}" for folder, reason in errors.items()]
-                self.popup.show_or_update(
-                    {"(アクセスできないフォルダ)": lines},
-                    popup_persistent=self.cfg.settings.popup_persistent,
-                    popup_seconds=self.cfg.settings.popup_seconds,
-                )
+    def _show_cached_result(self, msg: dict) -> None:
+        hits: Dict[str, List[str]] = msg.get("hits") or {}
+        if not hits:
             return
+        saved = datetime.fromtimestamp(float(msg.get("saved_at") or 0)).isoformat(sep=" ", timespec="minutes")
+        self._set_scan_progress("前回の結果を確認中…", cancellable=False)
+        self.popup.show_or_update(
+            hits,
+            popup_persistent=self.cfg.settings.popup_persistent,
+            popup_seconds=self.cfg.settings.popup_seconds,
+            info=msg.get("info"),
+            note=f"（{saved} 時点の結果・確認中）",
+        )
 
-        # show_nohit=True（起動直後/今すぐ1回）
-        if errors and self.cfg.settings.notify_folder_access_error:
-            lines = [f"{folder}：{reason}" for folder, reason in errors.items()]
-            self.popup.show_or_update(
-                {"(監視結果)": ["該当ファイルはありませんでした。"], "(アクセスできないフォルダ)": lines},
-                popup_persistent=self.cfg.settings.popup_persistent,
-                popup_seconds=self.cfg.settings.popup_seconds,
-            )
-        else:
-            self.popup.show_or_update(
-                {"(監視結果)": ["該当ファイルはありませんでした。"]},
-                popup_persistent=self.cfg.settings.popup_persistent,
-                popup_seconds=self.cfg.settings.popup_seconds,
-            )
+    def _handle_ipc_command(self, msg: dict) -> None:
+        cmd = msg.get("cmd")
+        if cmd == "show":
+            self._show_window()
+        elif cmd == "run_once":
+            self._run_once()
 
+    def _show_window(self) -> None:
+        try:
+            self.deiconify()
+            self.lift()
+            # 他アプリの裏に隠れている場合でも前面に出す（一瞬だけ最前面）
+            self.attributes("-topmost", True)
+            self.after(300, lambda: self.attributes("-topmost", False))
+            self.focus_force()
+        except Exception:
+            pass
 
     # ----------------------------
     # Close
@@ -631,12 +1152,116 @@ class App(tk.Tk):
     def _on_close(self) -> None:
         try:
             self.monitor.stop()
+            # 走査中でもキャンセルは一覧の途中で効くので、長くは待たない
+            if self.monitor.join(timeout=2.0):
+                # 次回起動時にすぐ表示し、変わっていないフォルダの一覧を省くため
+                self.monitor.save_snapshot()
         except Exception:
-            pass
-        self.popup.close()
+            _log.exception("monitor_stop_failed")
+        if self._popup is not None:
+            self._popup.close()
+        if self._history is not None:
+            self._history.close()
         self.destroy()
 
 
-def run_app() -> None:
-    app = App()
+# 2つ目に起動されたプロセスから受け付けるコマンド
+IPC_COMMANDS = ("show", "run_once", "scan")
+
+
+def _make_ipc_handler(q: "queue.Queue[dict]", monitor):
+    # IPC のスレッドから呼ばれる。UI操作はキュー経由で Tk スレッドに渡す
+    def handle(msg: dict) -> dict:
+        cmd = msg.get("cmd")
+        if cmd not in IPC_COMMANDS:
+            return {"ok": False, "error": "unknown command"}
+        if cmd == "scan":
+            # 指定フォルダの臨時走査（Tk スレッドを通さず、走査側の依頼キューに直接積む）
+            trigger = getattr(monitor, "trigger", None)
+            if trigger is None:
+                return {"ok": False, "error": "not supported with scan hub"}
+            folder = str(msg.get("folder") or "").strip()
+            if not folder:
+                return {"ok": False, "error": "folder is required"}
+            status = trigger(folder, str(msg.get("file") or ""))
+            return {"ok": status in ("queued", "merged"), "status": status}
+        q.put({"type": "ipc", "cmd": cmd})
+        return {"ok": True}
+
+    return handle
+
+
+def run_app(profile: Optional[StartupProfile] = None, instance: Optional[SingleInstance] = None) -> None:
+    cfg = load_config()
+    if profile is not None:
+        profile.mark("config")
+
+    # 書き込みは専用スレッド（走査スレッド / Tk スレッドはキューに積むだけ）
+    logs = LogService(config_path().parent, cfg.settings.log_level, cfg.settings.log_levels)
+    logs.start()
+    _log.info("app_started", extra=fields(items=len(cfg.items), hub=bool(cfg.settings.hub_address)))
+
+    # 初回スキャンはウィンドウ構築と並行して走らせる（ログイン直後の初回通知を早める）
+    q: "queue.Queue[dict]" = queue.Queue()
+    engine = None
+    if cfg.settings.hub_address:
+        from .hub import HubClient
+
+        # スキャンハブに監視対象を登録し、結果だけ受け取る
+        monitor = HubClient(lambda: cfg, q, cfg.settings.hub_address, cfg.settings.hub_token)
+    else:
+        if cfg.settings.scan_isolated:
+            from .isolation import ProcessScanEngine
+
+            # 一覧と stat は走査プロセスで行い、止まったら作り直す
+            engine = ProcessScanEngine(cfg.settings.scan_folder_timeout_seconds, cfg.settings.log_level, cfg.settings.log_levels)
+        # WATCHER_TRACE=N：N サイクル分の一覧・stat・結果をトレースに記録する（python -m app.trace で再生）
+        recorder = None
+        if os.environ.get("WATCHER_TRACE"):
+            from .trace import TraceRecorder, trace_cycles_from_env
+
+            trace_cycles = trace_cycles_from_env()
+            if trace_cycles and engine is not None:
+                # 記録は同じプロセスの一覧を包んで取るので、走査プロセスとは併用できない
+                _log.warning("trace_unavailable_isolated")
+                trace_cycles = 0
+            recorder = TraceRecorder(config_path().parent) if trace_cycles else None
+        monitor = MonitorWorker(
+            lambda: cfg, q, fs=recorder.wrap(LOCAL_FS) if recorder is not None else LOCAL_FS, engine=engine
+        )
+        if recorder is not None:
+            recorder.arm(trace_cycles)
+            monitor.recorder = recorder
+        monitor.load_snapshot(config_path().parent / SNAPSHOT_FILENAME)
+    monitor.profiler = CycleProfiler("scan", config_path().parent)
+    monitor.profiler.arm(effective_profile_cycles(cfg.settings.profile_enabled, cfg.settings.profile_cycles))
+    if any((not it.is_deleted) and it.is_active for it in cfg.items):
+        monitor.start()
+    elif profile is not None:
+        profile.first_scan_done(None)
+
+    if instance is not None:
+        instance.serve(_make_ipc_handler(q, monitor))
+
+    metrics = None
+    if cfg.settings.metrics_port:
+        from .metrics import QUEUE_DEPTH, MetricsServer
+
+        # 出力はHTTPのスレッドで行い、走査スレッドとはメトリクスごとの短いロックしか共有しない
+        # （ポートが使えない場合は何もしない：監視は続ける）
+        QUEUE_DEPTH.set_function(q.qsize)
+        metrics = MetricsServer(cfg.settings.metrics_port)
+        metrics.start()
+
+    app = App(cfg, q, monitor, profile)
+    if profile is not None:
+        app.update_idletasks()
+        profile.mark("ui")
+        profile.report_once()
     app.mainloop()
+    if engine is not None:
+        engine.close()
+    if metrics is not None:
+        metrics.stop()
+    _log.info("app_stopped")
+    logs.stop()
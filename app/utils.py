@@ -1,7 +1,7 @@
 import re
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 
 def now_iso() -> str:
@@ -22,6 +22,25 @@ def normalize_code(code_raw: str) -> Optional[str]:
     return None
 
 
+def split_csv(text: str) -> List[str]:
+    """カンマ区切り入力を空要素なしのリストにする"""
+    return [x.strip() for x in (text or "").split(",") if x.strip()]
+
+
+def format_size(size: int) -> str:
+    """ポップアップ表示用のファイルサイズ（取得できなかった場合は "-"）"""
+    if size < 0:
+        return "-"
+    if size < 1024:
+        return f"{size} B"
+    value = size / 1024
+    for unit in ("KB", "MB"):
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
 def is_office_temp_file(name: str) -> bool:
     return name.startswith("~$")
 
@@ -4,6 +4,9 @@ import tkinter as tk
 from tkinter import ttk
 from typing import Callable
 
+from ..constants import MAX_SCAN_DEPTH
+from ..rules import DEFAULT_RULE_TYPE, RULE_LABELS
+
 
 class EditItemView(ttk.LabelFrame):
     """
@@ -24,13 +27,27 @@ class EditItemView(ttk.LabelFrame):
 
         self.on_validate = on_validate
 
+        self.var_rule = tk.StringVar(value=RULE_LABELS[DEFAULT_RULE_TYPE])
         self.var_code = tk.StringVar()
         self.var_folder = tk.StringVar()
+        self.var_recursive = tk.BooleanVar(value=False)
+        self.var_depth = tk.StringVar(value="1")
+        self.var_excludes = tk.StringVar()
+        self.var_pinned = tk.BooleanVar(value=False)
 
         r = ttk.Frame(self)
         r.pack(fill="x")
 
-        ttk.Label(r, text="担当コード(3桁)").pack(side="left")
+        ttk.Label(r, text="ルール").pack(side="left")
+        ttk.Combobox(
+            r,
+            width=24,
+            state="readonly",
+            values=list(RULE_LABELS.values()),
+            textvariable=self.var_rule,
+        ).pack(side="left", padx=(8, 12))
+
+        ttk.Label(r, text="担当コード").pack(side="left")
         ttk.Entry(r, width=10, textvariable=self.var_code).pack(side="left", padx=(8, 12))
 
         ttk.Label(r, text="監視フォルダ").pack(side="left")
@@ -38,6 +55,15 @@ class EditItemView(ttk.LabelFrame):
 
         ttk.Button(r, text="参照…", command=on_browse).pack(side="left")
 
+        r_sub = ttk.Frame(self)
+        r_sub.pack(fill="x", pady=(8, 0))
+        ttk.Checkbutton(r_sub, text="サブフォルダも監視", variable=self.var_recursive).pack(side="left")
+        ttk.Label(r_sub, text="最大階層").pack(side="left", padx=(12, 0))
+        ttk.Spinbox(r_sub, from_=1, to=MAX_SCAN_DEPTH, width=4, textvariable=self.var_depth).pack(side="left", padx=(8, 12))
+        ttk.Label(r_sub, text="除外フォルダ（カンマ区切り, 例: old,*_bak）").pack(side="left")
+        ttk.Entry(r_sub, width=36, textvariable=self.var_excludes).pack(side="left", padx=(8, 12), fill="x", expand=True)
+        ttk.Checkbutton(r_sub, text="優先して走査", variable=self.var_pinned).pack(side="left")
+
         r2 = ttk.Frame(self)
         r2.pack(fill="x", pady=(10, 0))
 
@@ -49,6 +75,7 @@ class EditItemView(ttk.LabelFrame):
 
         ttk.Label(r2, text="※ 編集：参照は「編集対象のフォルダ」から開きます／白い所クリックで選択解除").pack(side="left", padx=(12, 0))
 
+        self.var_rule.trace_add("write", lambda *_: self._refresh_enabled())
         self.var_code.trace_add("write", lambda *_: self._refresh_enabled())
         self.var_folder.trace_add("write", lambda *_: self._refresh_enabled())
 
@@ -71,23 +98,53 @@ class EditItemView(ttk.LabelFrame):
         for child in widget.winfo_children():
             try:
                 cls = child.winfo_class()
-                if cls in ("TEntry", "TSpinbox", "TButton", "TCheckbutton"):
+                if cls == "TCombobox":
+                    child.configure(state=("readonly" if state == "normal" else "disabled"))
+                elif cls in ("TEntry", "TSpinbox", "TButton", "TCheckbutton"):
                     child.configure(state=state)
             except Exception:
                 pass
             if child.winfo_children():
                 self._set_children_state(child, state)
 
-    def set_values(self, code: str, folder: str) -> None:
+    def set_values(self, code: str, folder: str, rule_type: str = DEFAULT_RULE_TYPE) -> None:
+        self.var_rule.set(RULE_LABELS.get(rule_type, RULE_LABELS[DEFAULT_RULE_TYPE]))
         self.var_code.set(code)
         self.var_folder.set(folder)
 
     def clear(self) -> None:
+        self.var_rule.set(RULE_LABELS[DEFAULT_RULE_TYPE])
         self.var_code.set("")
         self.var_folder.set("")
+        self.var_recursive.set(False)
+        self.var_depth.set("1")
+        self.var_excludes.set("")
+        self.var_pinned.set(False)
 
     def get_values(self) -> tuple[str, str]:
         return self.var_code.get(), self.var_folder.get()
 
+    def get_scan_values(self) -> tuple[bool, str, str]:
+        """(サブフォルダ監視, 最大階層, 除外パターン) を入力文字列のまま返す"""
+        return bool(self.var_recursive.get()), self.var_depth.get(), self.var_excludes.get()
+
+    def set_scan_values(self, recursive: bool, max_depth: int, exclude_globs: list[str]) -> None:
+        self.var_recursive.set(bool(recursive))
+        self.var_depth.set(str(max_depth))
+        self.var_excludes.set(", ".join(exclude_globs))
+
+    def get_pinned(self) -> bool:
+        return bool(self.var_pinned.get())
+
+    def set_pinned(self, pinned: bool) -> None:
+        self.var_pinned.set(bool(pinned))
+
+    def get_rule_type(self) -> str:
+        label = self.var_rule.get()
+        for rule_type, text in RULE_LABELS.items():
+            if text == label:
+                return rule_type
+        return DEFAULT_RULE_TYPE
+
     def set_folder(self, folder: str) -> None:
         self.var_folder.set(folder)
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import tkinter as tk
+from datetime import datetime
+from tkinter import ttk
+from typing import Callable, Iterable
+
+from ..history import HistoryEntry
+
+
+class HistoryView(ttk.Frame):
+    """
+    通知履歴タブ。検索条件の入力と結果の表示だけを行う（検索処理はコールバック）。
+    """
+
+    def __init__(
+        self,
+        master,
+        *,
+        on_search: Callable[[], None],
+        on_clear: Callable[[], None],
+    ):
+        super().__init__(master)
+
+        self.var_code = tk.StringVar()
+        self.var_folder = tk.StringVar()
+        self.var_since = tk.StringVar()
+        self.var_until = tk.StringVar()
+
+        cond = ttk.LabelFrame(self, text="検索条件", padding=10)
+        cond.pack(fill="x")
+
+        row1 = ttk.Frame(cond)
+        row1.pack(fill="x")
+        ttk.Label(row1, text="コード").pack(side="left")
+        ent_code = ttk.Entry(row1, width=10, textvariable=self.var_code)
+        ent_code.pack(side="left", padx=(8, 16))
+        ttk.Label(row1, text="フォルダ（前方一致）").pack(side="left")
+        ent_folder = ttk.Entry(row1, width=60, textvariable=self.var_folder)
+        ent_folder.pack(side="left", padx=(8, 0), fill="x", expand=True)
+
+        row2 = ttk.Frame(cond)
+        row2.pack(fill="x", pady=(8, 0))
+        ttk.Label(row2, text="初回検出日").pack(side="left")
+        ent_since = ttk.Entry(row2, width=12, textvariable=self.var_since)
+        ent_since.pack(side="left", padx=(8, 4))
+        ttk.Label(row2, text="〜").pack(side="left")
+        ent_until = ttk.Entry(row2, width=12, textvariable=self.var_until)
+        ent_until.pack(side="left", padx=(4, 8))
+        ttk.Label(row2, text="（YYYY-MM-DD、空欄は指定なし）").pack(side="left")
+        ttk.Button(row2, text="検索", command=on_search).pack(side="left", padx=(16, 0))
+        ttk.Button(row2, text="条件クリア", command=on_clear).pack(side="left", padx=(8, 0))
+
+        for ent in (ent_code, ent_folder, ent_since, ent_until):
+            ent.bind("<Return>", lambda _e: on_search())
+
+        body = ttk.Frame(self)
+        body.pack(fill="both", expand=True, pady=(10, 0))
+
+        cols = ("first_seen", "last_seen", "count", "code", "folder", "file")
+        self.tree = ttk.Treeview(body, columns=cols, show="headings", height=16)
+        self.tree.heading("first_seen", text="初回検出")
+        self.tree.heading("last_seen", text="最終検出")
+        self.tree.heading("count", text="回数")
+        self.tree.heading("code", text="コード")
+        self.tree.heading("folder", text="フォルダ")
+        self.tree.heading("file", text="ファイル")
+        self.tree.column("first_seen", width=150, anchor="w")
+        self.tree.column("last_seen", width=150, anchor="w")
+        self.tree.column("count", width=60, anchor="e")
+        self.tree.column("code", width=70, anchor="center")
+        self.tree.column("folder", width=360, anchor="w")
+        self.tree.column("file", width=260, anchor="w")
+        vsb = ttk.Scrollbar(body, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=vsb.set)
+        self.tree.pack(side="left", fill="both", expand=True)
+        vsb.pack(side="left", fill="y")
+
+        self.lbl_summary = ttk.Label(self, text="")
+        self.lbl_summary.pack(anchor="w", pady=(6, 0))
+
+    def clear_conditions(self) -> None:
+        for var in (self.var_code, self.var_folder, self.var_since, self.var_until):
+            var.set("")
+
+    def refresh(self, rows: Iterable[HistoryEntry], summary: str) -> None:
+        for iid in self.tree.get_children():
+            self.tree.delete(iid)
+        for e in rows:
+            self.tree.insert(
+                "",
+                "end",
+                values=(
+                    datetime.fromtimestamp(e.first_seen).isoformat(sep=" ", timespec="seconds"),
+                    datetime.fromtimestamp(e.last_seen).isoformat(sep=" ", timespec="seconds"),
+                    e.seen_count,
+                    e.code,
+                    e.folder,
+                    e.file,
+                ),
+            )
+        self.lbl_summary.configure(text=summary)
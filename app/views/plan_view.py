@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import tkinter as tk
+from tkinter import ttk
+from typing import Callable
+
+
+class PlanWindow:
+    """
+    走査コストの見積もり（planner.format_report）を出すウィンドウ。
+    見積もりは UI 側が別スレッドで行い、進捗と結果を set_progress / set_text で渡す。
+    """
+
+    def __init__(self, root: tk.Tk, on_close: Callable[[], None]):
+        self._on_close = on_close
+        w = tk.Toplevel(root)
+        w.title("走査コストの見積もり")
+        w.geometry("960x420")
+        w.protocol("WM_DELETE_WINDOW", self.close)
+
+        frame = ttk.Frame(w, padding=12)
+        frame.pack(fill="both", expand=True)
+        self._label = ttk.Label(frame, text="見積もり中…（各監視フォルダを2回一覧します）")
+        self._label.pack(anchor="w", pady=(0, 8))
+
+        self._text = tk.Text(frame, wrap="none", height=16)
+        self._text.configure(state="disabled")
+        self._text.pack(fill="both", expand=True)
+
+        btns = ttk.Frame(frame)
+        btns.pack(fill="x", pady=(10, 0))
+        ttk.Button(btns, text="閉じる", command=self.close).pack(side="right")
+        self._win = w
+
+    def alive(self) -> bool:
+        return self._win is not None
+
+    def set_progress(self, done: int, total: int) -> None:
+        if self._win is not None:
+            self._label.configure(text=f"見積もり中… {done}/{total}")
+
+    def set_text(self, title: str, text: str) -> None:
+        if self._win is None:
+            return
+        self._label.configure(text=title)
+        self._text.configure(state="normal")
+        self._text.delete("1.0", "end")
+        self._text.insert("1.0", text)
+        self._text.configure(state="disabled")
+
+    def close(self) -> None:
+        if self._win is None:
+            return
+        self._win.destroy()
+        self._win = None
+        self._on_close()
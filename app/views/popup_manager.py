@@ -1,10 +1,18 @@
 from __future__ import annotations
 
 import tkinter as tk
+from datetime import datetime
 from tkinter import ttk
 from typing import Dict, List, Optional
 
-from ..utils import now_iso
+from ..logs import get_logger
+from ..monitor import HitInfo
+from ..utils import format_size, now_iso
+
+_log = get_logger("popup")
+
+SORT_NEWEST = "新しい順"
+SORT_NAME = "名前順"
 
 
 class PopupManager:
@@ -19,28 +27,41 @@ class PopupManager:
         self._text: Optional[tk.Text] = None
         self._time_label: Optional[ttk.Label] = None
         self._timer_id: Optional[str] = None
-
-    def show_or_update(self, hits: Dict[str, List[str]], popup_persistent: bool, popup_seconds: int) -> None:
+        self._var_sort: Optional[tk.StringVar] = None
+        # 並べ替え時に再描画するため、表示中の内容を持っておく
+        self._hits: Dict[str, List[str]] = {}
+        self._info: Dict[str, Dict[str, HitInfo]] = {}
+
+    def show_or_update(
+        self,
+        hits: Dict[str, List[str]],
+        popup_persistent: bool,
+        popup_seconds: int,
+        info: Optional[Dict[str, Dict[str, HitInfo]]] = None,
+        note: str = "",
+    ) -> None:
+        """
+        info があればファイルごとにサイズ・更新日時・検出時刻を添える（エラー表示などは hits のみ）。
+        note は時刻の横に添える注記（前回終了時の結果など）。
+        """
         self._ensure_window()
         if not self._win or not self._text:
             return
 
-        body = self._format_hits_text(hits)
+        self._hits = hits
+        self._info = info or {}
         if self._time_label:
             try:
-                self._time_label.configure(text=now_iso())
+                self._time_label.configure(text=f"{now_iso()}  {note}" if note else now_iso())
             except Exception:
-                pass
+                _log.debug("popup_time_label_failed", exc_info=True)
 
-        self._text.configure(state="normal")
-        self._text.delete("1.0", "end")
-        self._text.insert("1.0", body)
-        self._text.configure(state="disabled")
+        self._render()
 
         try:
             self._win.lift()
         except Exception:
-            pass
+            _log.debug("popup_lift_failed", exc_info=True)
 
         self._reset_timer(popup_persistent, popup_seconds)
 
@@ -49,7 +70,7 @@ class PopupManager:
             if self._timer_id:
                 self.root.after_cancel(self._timer_id)
         except Exception:
-            pass
+            _log.debug("popup_timer_cancel_failed", exc_info=True)
         self._timer_id = None
 
         if self._win is not None:
@@ -57,32 +78,72 @@ class PopupManager:
                 if self._win.winfo_exists():
                     self._win.destroy()
             except Exception:
-                pass
+                _log.debug("popup_destroy_failed", exc_info=True)
         self._win = None
         self._text = None
         self._time_label = None
+        self._var_sort = None
+        self._hits = {}
+        self._info = {}
 
     # ---- internal ----
-    def _format_hits_text(self, hits: Dict[str, List[str]]) -> str:
+    def _render(self) -> None:
+        if not self._text:
+            return
+        newest = self._var_sort is not None and self._var_sort.get() == SORT_NEWEST
+        body = self._format_hits_text(self._hits, self._info, newest)
+        self._text.configure(state="normal")
+        self._text.delete("1.0", "end")
+        self._text.insert("1.0", body)
+        self._text.configure(state="disabled")
+
+    def _format_hits_text(
+        self, hits: Dict[str, List[str]], info: Dict[str, Dict[str, HitInfo]], newest: bool
+    ) -> str:
+        folders = list(hits.keys())
+        if newest and info:
+            # フォルダも、その中で一番新しいファイルの順に並べる
+            def latest(folder: str) -> float:
+                per_file = info.get(folder) or {}
+                return max((per_file[f].mtime for f in hits[folder] if f in per_file), default=0.0)
+
+            folders.sort(key=latest, reverse=True)
+
         lines: List[str] = []
-        for folder, files in hits.items():
+        for folder in folders:
+            files = list(hits[folder])
+            per_file = info.get(folder) or {}
+            if newest and per_file:
+                files.sort(key=lambda f: per_file[f].mtime if f in per_file else 0.0, reverse=True)
             lines.append(f"■ {folder}")
             for f in files:
-                lines.append(f"  - {f}")
+                meta = per_file.get(f)
+                lines.append(f"  - {f}" if meta is None else f"  - {f}  （{self._format_meta(meta)}）")
             lines.append("")
         return "\n".join(lines).rstrip()
 
+    @staticmethod
+    def _format_meta(meta: HitInfo) -> str:
+        parts = [format_size(meta.size)]
+        if meta.mtime:
+            parts.append("更新 " + datetime.fromtimestamp(meta.mtime).strftime("%m/%d %H:%M"))
+        if meta.first_seen:
+            parts.append("検出 " + datetime.fromtimestamp(meta.first_seen).strftime("%m/%d %H:%M"))
+        return " / ".join(parts)
+
     def _ensure_window(self) -> None:
         if self._win is not None:
             try:
                 if self._win.winfo_exists():
                     return
             except Exception:
-                pass
+                # 閉じられた直後などで Tk 側のウィンドウが無い。作り直す
+                _log.debug("popup_window_lost", exc_info=True)
             self._win = None
             self._text = None
             self._time_label = None
             self._timer_id = None
+            self._var_sort = None
 
         title = "担当コードファイル検出"
         w = tk.Toplevel(self.root)
@@ -107,8 +168,15 @@ class PopupManager:
         frame.pack(fill="both", expand=True)
 
         ttk.Label(frame, text=title, font=("", 14, "bold")).pack(anchor="w")
-        tl = ttk.Label(frame, text=now_iso(), foreground="#666")
-        tl.pack(anchor="w", pady=(2, 10))
+        head = ttk.Frame(frame)
+        head.pack(fill="x", pady=(2, 10))
+        tl = ttk.Label(head, text=now_iso(), foreground="#666")
+        tl.pack(side="left")
+        var_sort = tk.StringVar(value=SORT_NEWEST)
+        cb_sort = ttk.Combobox(head, width=8, state="readonly", values=(SORT_NEWEST, SORT_NAME), textvariable=var_sort)
+        cb_sort.pack(side="right")
+        cb_sort.bind("<<ComboboxSelected>>", lambda _e: self._render())
+        ttk.Label(head, text="並び順").pack(side="right", padx=(0, 6))
 
         txt = tk.Text(frame, wrap="word", height=12)
         txt.configure(state="disabled")
@@ -121,6 +189,7 @@ class PopupManager:
         self._win = w
         self._text = txt
         self._time_label = tl
+        self._var_sort = var_sort
 
     def _reset_timer(self, popup_persistent: bool, popup_seconds: int) -> None:
         if popup_persistent:
@@ -128,7 +197,7 @@ class PopupManager:
                 try:
                     self.root.after_cancel(self._timer_id)
                 except Exception:
-                    pass
+                    _log.debug("popup_timer_cancel_failed", exc_info=True)
                 self._timer_id = None
             return
 
@@ -137,7 +206,7 @@ class PopupManager:
             try:
                 self.root.after_cancel(self._timer_id)
             except Exception:
-                pass
+                _log.debug("popup_timer_cancel_failed", exc_info=True)
             self._timer_id = None
 
         def closer():
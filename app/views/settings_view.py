@@ -4,6 +4,8 @@ import tkinter as tk
 from tkinter import ttk
 from typing import Callable
 
+from ..config import FilterSettings
+
 
 class SettingsView(ttk.LabelFrame):
     """
@@ -19,7 +21,19 @@ class SettingsView(ttk.LabelFrame):
         popup_persistent: bool,
         popup_seconds: int,
         notify_folder_access_error: bool,
+        filters: FilterSettings,
+        profile_enabled: bool,
+        profile_cycles: int,
+        profile_tk_threshold_ms: int,
+        memory_budget_mb: int,
+        memory_tracemalloc: bool,
+        hub_address: str,
+        io_listings_per_second: float,
+        io_concurrent_per_share: int,
+        io_spread_cycles: bool,
+        scan_cycle_budget_seconds: int,
         on_save: Callable[[], None],
+        on_plan: Callable[[], None],
     ):
         super().__init__(master, text="監視の設定", padding=10)
 
@@ -28,6 +42,21 @@ class SettingsView(ttk.LabelFrame):
         self.var_popup_persistent = tk.BooleanVar(value=bool(popup_persistent))
         self.var_popup_sec = tk.StringVar(value=str(popup_seconds))
         self.var_notify_access_error = tk.BooleanVar(value=notify_folder_access_error)
+        self.var_allow_exts = tk.StringVar(value=", ".join(filters.allow_exts))
+        self.var_deny_exts = tk.StringVar(value=", ".join(filters.deny_exts))
+        self.var_ignore_globs = tk.StringVar(value=", ".join(filters.ignore_globs))
+        self.var_min_size = tk.StringVar(value=str(filters.min_size or 0))
+        self.var_max_size = tk.StringVar(value=str(filters.max_size or 0))
+        self.var_profile_enabled = tk.BooleanVar(value=bool(profile_enabled))
+        self.var_profile_cycles = tk.StringVar(value=str(profile_cycles))
+        self.var_profile_tk_ms = tk.StringVar(value=str(profile_tk_threshold_ms))
+        self.var_memory_budget = tk.StringVar(value=str(memory_budget_mb))
+        self.var_memory_tracemalloc = tk.BooleanVar(value=bool(memory_tracemalloc))
+        self.var_hub_address = tk.StringVar(value=hub_address)
+        self.var_io_rate = tk.StringVar(value=f"{io_listings_per_second:g}")
+        self.var_io_per_share = tk.StringVar(value=str(io_concurrent_per_share))
+        self.var_io_spread = tk.BooleanVar(value=bool(io_spread_cycles))
+        self.var_cycle_budget = tk.StringVar(value=str(scan_cycle_budget_seconds))
 
 
         row1 = ttk.Frame(self)
@@ -60,9 +89,68 @@ class SettingsView(ttk.LabelFrame):
             variable=self.var_notify_access_error,
         ).pack(side="left")
 
+        # 事前フィルタ（全監視対象に共通。空欄・0 は指定なし）
+        row_f1 = ttk.Frame(self)
+        row_f1.pack(fill="x", pady=(10, 0))
+        ttk.Label(row_f1, text="対象拡張子").pack(side="left")
+        ttk.Entry(row_f1, width=22, textvariable=self.var_allow_exts).pack(side="left", padx=(8, 12))
+        ttk.Label(row_f1, text="除外拡張子").pack(side="left")
+        ttk.Entry(row_f1, width=22, textvariable=self.var_deny_exts).pack(side="left", padx=(8, 12))
+        ttk.Label(row_f1, text="無視パターン").pack(side="left")
+        ttk.Entry(row_f1, width=28, textvariable=self.var_ignore_globs).pack(side="left", padx=(8, 0), fill="x", expand=True)
+
+        row_f2 = ttk.Frame(self)
+        row_f2.pack(fill="x", pady=(6, 0))
+        ttk.Label(row_f2, text="サイズ(バイト) 最小").pack(side="left")
+        ttk.Entry(row_f2, width=12, textvariable=self.var_min_size).pack(side="left", padx=(8, 12))
+        ttk.Label(row_f2, text="最大").pack(side="left")
+        ttk.Entry(row_f2, width=12, textvariable=self.var_max_size).pack(side="left", padx=(8, 12))
+        ttk.Label(row_f2, text="※ カンマ区切り（例: .tmp, .part / Thumbs.db）。空欄・0 は指定なし").pack(side="left")
+
+        # NAS への負荷を抑える（0 は無制限）
+        row_io = ttk.Frame(self)
+        row_io.pack(fill="x", pady=(10, 0))
+        ttk.Label(row_io, text="フォルダ一覧の上限(回/秒)").pack(side="left")
+        ttk.Entry(row_io, width=7, textvariable=self.var_io_rate).pack(side="left", padx=(8, 12))
+        ttk.Label(row_io, text="共有ごとの同時一覧数").pack(side="left")
+        ttk.Spinbox(row_io, from_=0, to=64, width=4, textvariable=self.var_io_per_share).pack(side="left", padx=(8, 12))
+        ttk.Checkbutton(row_io, text="周期の走査を間隔全体に分散する", variable=self.var_io_spread).pack(side="left")
+
+        row_b = ttk.Frame(self)
+        row_b.pack(fill="x", pady=(6, 0))
+        ttk.Label(row_b, text="1サイクルの走査時間の上限(秒)").pack(side="left")
+        ttk.Spinbox(row_b, from_=0, to=86400, width=6, textvariable=self.var_cycle_budget).pack(side="left", padx=(8, 12))
+        ttk.Label(row_b, text="※ 0 は無制限。超えた分は次のサイクルで続きから（優先して走査・最近ヒットしたフォルダが先）").pack(side="left")
+
+        row_p = ttk.Frame(self)
+        row_p.pack(fill="x", pady=(10, 0))
+        ttk.Checkbutton(row_p, text="プロファイルを取得する", variable=self.var_profile_enabled).pack(side="left")
+        ttk.Spinbox(row_p, from_=1, to=100, width=4, textvariable=self.var_profile_cycles).pack(side="left", padx=(8, 2))
+        ttk.Label(row_p, text="サイクル分").pack(side="left")
+        ttk.Label(row_p, text="UI遅延の記録閾値(ms)").pack(side="left", padx=(12, 0))
+        ttk.Spinbox(row_p, from_=10, to=10000, width=6, textvariable=self.var_profile_tk_ms).pack(side="left", padx=(8, 12))
+        ttk.Label(row_p, text="※ 設定ファイルと同じフォルダに .pstats / profile_tk.log を出力").pack(side="left")
+
+        row_m = ttk.Frame(self)
+        row_m.pack(fill="x", pady=(6, 0))
+        ttk.Label(row_m, text="メモリ増加の警告(MB)").pack(side="left")
+        ttk.Spinbox(row_m, from_=10, to=10000, width=6, textvariable=self.var_memory_budget).pack(side="left", padx=(8, 12))
+        ttk.Checkbutton(
+            row_m,
+            text="割り当て元も記録する（tracemalloc、やや重い）",
+            variable=self.var_memory_tracemalloc,
+        ).pack(side="left")
+
+        row_h = ttk.Frame(self)
+        row_h.pack(fill="x", pady=(10, 0))
+        ttk.Label(row_h, text="スキャンハブ(host:port)").pack(side="left")
+        ttk.Entry(row_h, width=28, textvariable=self.var_hub_address).pack(side="left", padx=(8, 12))
+        ttk.Label(row_h, text="※ 空欄ならこのPCで直接監視。変更は再起動後に反映").pack(side="left")
+
         row4 = ttk.Frame(self)
         row4.pack(fill="x", pady=(10, 0))
         ttk.Button(row4, text="設定を保存", command=on_save).pack(side="left")
+        ttk.Button(row4, text="走査コストを見積もる…", command=on_plan).pack(side="left", padx=(8, 0))
 
 
     def _toggle_popup_seconds_ui(self) -> None:
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import tkinter as tk
+from datetime import datetime
+from tkinter import ttk
+from typing import Callable, Dict, Iterable, List
+
+from ..latency import DIM_FOLDER, STAGE_ENQUEUED, STAGE_POPUP, LatencyRow
+from ..memwatch import MemorySample
+
+
+def _fmt_seconds(values: Dict[str, float], stage: str) -> str:
+    if stage not in values:
+        return "-"
+    sec = values[stage]
+    if sec < 60:
+        return f"{sec:.0f}秒"
+    if sec < 3600:
+        return f"{sec / 60:.1f}分"
+    return f"{sec / 3600:.1f}時間"
+
+
+class StatsView(ttk.Frame):
+    """
+    統計タブ。表示するデータは外から渡す（取得・保存の処理はコールバック）。
+    """
+
+    def __init__(
+        self,
+        master,
+        *,
+        on_sample_now: Callable[[], None],
+        on_dump: Callable[[], None],
+    ):
+        super().__init__(master)
+
+        lat = ttk.LabelFrame(self, text="通知遅延（ファイルが現れてから）", padding=10)
+        lat.pack(fill="both", expand=True, pady=(0, 10))
+        self.lbl_latency = ttk.Label(lat, text="")
+        self.lbl_latency.pack(anchor="w")
+        lat_body = ttk.Frame(lat)
+        lat_body.pack(fill="both", expand=True, pady=(6, 0))
+        lat_cols = ("dim", "key", "count", "queued_p50", "popup_p50", "popup_p95", "popup_max")
+        self.tree_latency = ttk.Treeview(lat_body, columns=lat_cols, show="headings", height=6)
+        for col, text, width, anchor in (
+            ("dim", "区分", 70, "w"),
+            ("key", "フォルダ / コード", 260, "w"),
+            ("count", "件数", 60, "e"),
+            ("queued_p50", "検出 p50", 80, "e"),
+            ("popup_p50", "通知 p50", 80, "e"),
+            ("popup_p95", "通知 p95", 80, "e"),
+            ("popup_max", "通知 最大", 80, "e"),
+        ):
+            self.tree_latency.heading(col, text=text)
+            self.tree_latency.column(col, width=width, anchor=anchor)
+        lat_vsb = ttk.Scrollbar(lat_body, orient="vertical", command=self.tree_latency.yview)
+        self.tree_latency.configure(yscrollcommand=lat_vsb.set)
+        self.tree_latency.pack(side="left", fill="both", expand=True)
+        lat_vsb.pack(side="left", fill="y")
+
+        mem = ttk.LabelFrame(self, text="メモリ推移（常駐プロセス）", padding=10)
+        mem.pack(fill="both", expand=True)
+
+        ops = ttk.Frame(mem)
+        ops.pack(fill="x")
+        ttk.Button(ops, text="今すぐ計測", command=on_sample_now).pack(side="left")
+        ttk.Button(ops, text="ダンプ出力", command=on_dump).pack(side="left", padx=(8, 0))
+        self.lbl_summary = ttk.Label(ops, text="")
+        self.lbl_summary.pack(side="left", padx=(14, 0))
+
+        body = ttk.Frame(mem)
+        body.pack(fill="both", expand=True, pady=(10, 0))
+
+        cols = ("time", "rss", "traced", "widgets")
+        self.tree = ttk.Treeview(body, columns=cols, show="headings", height=8)
+        self.tree.heading("time", text="時刻")
+        self.tree.heading("rss", text="RSS(MB)")
+        self.tree.heading("traced", text="tracemalloc(MB)")
+        self.tree.heading("widgets", text="ウィジェット数")
+        self.tree.column("time", width=180, anchor="w")
+        self.tree.column("rss", width=100, anchor="e")
+        self.tree.column("traced", width=120, anchor="e")
+        self.tree.column("widgets", width=110, anchor="e")
+        vsb = ttk.Scrollbar(body, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=vsb.set)
+        self.tree.pack(side="left", fill="both", expand=True)
+        vsb.pack(side="left", fill="y")
+
+        ttk.Label(mem, text="増加の大きい割り当て元（tracemalloc 有効時）").pack(anchor="w", pady=(10, 2))
+        self.txt_top = tk.Text(mem, height=8, wrap="none")
+        self.txt_top.configure(state="disabled")
+        self.txt_top.pack(fill="both", expand=True)
+
+    def refresh_memory(self, samples: Iterable[MemorySample], top_diffs: List[str], summary: str) -> None:
+        for iid in self.tree.get_children():
+            self.tree.delete(iid)
+        # 新しい順
+        for s in reversed(list(samples)):
+            self.tree.insert(
+                "",
+                "end",
+                values=(
+                    datetime.fromtimestamp(s.ts).isoformat(timespec="seconds"),
+                    f"{s.rss_bytes / 1048576:.1f}" if s.rss_bytes is not None else "-",
+                    f"{s.traced_bytes / 1048576:.1f}" if s.traced_bytes is not None else "-",
+                    s.widget_count,
+                ),
+            )
+        self.lbl_summary.configure(text=summary)
+
+        self.txt_top.configure(state="normal")
+        self.txt_top.delete("1.0", "end")
+        self.txt_top.insert("1.0", "\n".join(top_diffs))
+        self.txt_top.configure(state="disabled")
+
+    def refresh_latency(self, rows: Iterable[LatencyRow], summary: str) -> None:
+        """検出 = 走査結果が出た時点、通知 = ポップアップを出した時点（分位点は直近分から）"""
+        for iid in self.tree_latency.get_children():
+            self.tree_latency.delete(iid)
+        for r in rows:
+            self.tree_latency.insert(
+                "",
+                "end",
+                values=(
+                    "フォルダ" if r.dim == DIM_FOLDER else "コード",
+                    r.key or "(なし)",
+                    r.count,
+                    _fmt_seconds(r.p50, STAGE_ENQUEUED),
+                    _fmt_seconds(r.p50, STAGE_POPUP),
+                    _fmt_seconds(r.p95, STAGE_POPUP),
+                    _fmt_seconds(r.max, STAGE_POPUP),
+                ),
+            )
+        self.lbl_latency.configure(text=summary)
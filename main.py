@@ -1,8 +1,124 @@
-from app.ui import run_app
+import argparse
+import sys
+import time
 
+_T0 = time.perf_counter()
 
-def main() -> None:
-    run_app()
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="担当コードファイル検出")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="起動時間の内訳（import / 設定読み込み / UI構築 / 初回スキャン）を表示する",
+    )
+    parser.add_argument(
+        "--run-once",
+        action="store_true",
+        help="起動済みのプロセスがあれば、そちらで今すぐ1回実行させて終了する",
+    )
+    parser.add_argument(
+        "--scan",
+        default="",
+        metavar="FOLDER",
+        help="起動済みのプロセスで、このフォルダ（を含む監視フォルダ）だけをすぐ走査させて終了する",
+    )
+    parser.add_argument("--scan-file", default="", metavar="NAME", help="--scan と一緒に、書き込んだファイル名を伝える（ログ用）")
+    parser.add_argument(
+        "--hub",
+        action="store_true",
+        help="スキャンハブとして起動する（UIなし）。クライアントは設定の hub_address で接続する",
+    )
+    parser.add_argument(
+        "--hub-bind",
+        default="",
+        metavar="HOST:PORT",
+        help="ハブの待ち受けアドレス（既定 127.0.0.1:47810）",
+    )
+    parser.add_argument("--hub-token", default="", help="ハブの合言葉（クライアントの hub_token と合わせる）")
+    parser.add_argument("--hub-io-rate", type=float, default=0.0, metavar="N", help="ハブの一覧回数の上限（回/秒、0 は無制限）")
+    parser.add_argument(
+        "--hub-io-per-share", type=int, default=0, metavar="N", help="ハブの共有ごとの同時一覧数の上限（0 は無制限）"
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=0,
+        metavar="PORT",
+        help="ハブのメトリクス（Prometheus 形式、http://127.0.0.1:PORT/metrics）を公開する（0 は無効）",
+    )
+    # 走査プロセス（settings.scan_isolated）。凍結ビルドでは同じ exe をこの引数で起動する
+    parser.add_argument("--scanner", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+
+    if args.scanner:
+        from app.isolation import scanner_main
+
+        scanner_main()
+        return
+
+    if args.hub:
+        from app.config import config_path, load_config
+        from app.hub import ScanHub, parse_host_port
+        from app.logs import HUB_LOG_FILENAME, LogService
+
+        host, port = parse_host_port(args.hub_bind)
+        # ログのレベルは設定ファイル（あれば）に従う
+        st = load_config().settings
+        logs = LogService(config_path().parent, st.log_level, st.log_levels, HUB_LOG_FILENAME)
+        logs.start()
+        try:
+            ScanHub(
+                host,
+                port,
+                token=args.hub_token,
+                io_listings_per_second=args.hub_io_rate,
+                io_concurrent_per_share=args.hub_io_per_share,
+                metrics_port=args.metrics_port,
+            ).serve_forever()
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            sys.exit(2)
+        finally:
+            logs.stop()
+        return
+
+    profile = None
+    if args.profile_startup:
+        from app.profiling import StartupProfile
+
+        profile = StartupProfile(_T0)
+
+    # 多重起動防止：起動済みならコマンドを転送して終了（UIの import もしない）
+    from app.config import config_path
+    from app.instance import SingleInstance
+
+    instance = SingleInstance(config_path())
+    if args.scan:
+        # 外部のシステムから呼ぶ。監視が起動していなければ何もしない（終了コード 1）
+        if instance.acquire():
+            instance.release()
+            print("not_running", file=sys.stderr)
+            sys.exit(1)
+        reply = instance.forward("scan", folder=args.scan, file=args.scan_file) or {}
+        print(reply.get("status") or reply.get("error") or "no_reply")
+        sys.exit(0 if reply.get("ok") else 1)
+    if not instance.acquire():
+        instance.forward("run_once" if args.run_once else "show")
+        return
+
+    try:
+        from app.ui import run_app
+
+        if profile is not None:
+            profile.mark("import")
+        run_app(profile=profile, instance=instance)
+    finally:
+        instance.release()
 
 
 if __name__ == "__main__":